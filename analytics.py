@@ -0,0 +1,244 @@
+# Columnar analytics snapshot of survey responses.
+#
+# The whole "Survey Responses" sheet (or the local SQLite store) is read in one
+# call, parsed into typed NumPy columns and written as a compressed .npz file.
+# Aggregations then run against the arrays instead of the Sheets API.
+
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from constants import (
+    AGE_GROUPS, DURATIONS, ACCESSIBILITY_NEEDS, PRIORITY_OPTIONS, WALKING_OPTIONS, BREAK_OPTIONS, LIKERT_OPTIONS
+)
+from plan_format import PLAN_SOURCES, plan_source, plan_stop_names
+from storage import RESPONSE_COLUMNS, column_letter
+
+SNAPSHOT_VERSION = 2
+
+ACCESSIBILITY_FLAGS = ACCESSIBILITY_NEEDS + ["Not specified"]
+
+# "10:05 AM — [Meal Break] Food Court — 37 minutes" -> "Food Court"
+PLAN_STOP_LINE = re.compile(r"^\d{1,2}:\d{2} [AP]M — (?:\[[^\]]+\] )?(.+?) — \d+ minutes$")
+
+# Rows still missing feedback are re-read on refresh until they are this old
+SETTLE_PERIOD = timedelta(hours=24)
+
+_col = {name: i for i, name in enumerate(RESPONSE_COLUMNS)}
+RANK_SLICE = slice(_col["rank_thrill"], _col["rank_relaxation"] + 1)
+LIKERT_SLICE = slice(_col["q_spacing"], _col["q_energy_graph"] + 1)
+
+# Per-row arrays; plan_stops/plan_offsets and the *_labels arrays are handled separately
+ROW_FIELDS = [
+    "row", "unique_id", "timestamp", "age", "duration", "accessibility", "ranks", "priorities",
+    "wait_minutes", "walking", "break_time", "total_time_used", "leftover_time", "likert", "feedback",
+    "plan_source",
+]
+
+
+def parse_plan_stops(plan_text):
+    try:
+        stops = plan_stop_names(plan_text)
+    except ValueError:
+        return []
+    if stops is not None:
+        return stops
+    stops = []
+    for line in (plan_text or "").split("\n"):
+        match = PLAN_STOP_LINE.match(line.strip())
+        if match:
+            stops.append(match.group(1))
+    return stops
+
+
+def _plan_source_code(plan_text):
+    # -1 for plans stored as text, which predate the source being recorded
+    try:
+        return _code(plan_source(plan_text), PLAN_SOURCES)
+    except ValueError:
+        return -1
+
+
+def _code(value, categories):
+    return categories.index(value) if value in categories else -1
+
+
+def _bitmask(text, options):
+    return sum(1 << i for i, option in enumerate(options) if option in text)
+
+
+def _int(value, default):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def parse_timestamp(value):
+    try:
+        return np.datetime64(datetime.strptime(value, "%Y-%m-%d %H:%M:%S"), "s")
+    except (TypeError, ValueError):
+        return None
+
+
+def build_snapshot(rows, stop_names=None):
+    """Parse (row number, values) pairs into a dict of typed arrays.
+
+    Rows without an ID or a parseable timestamp (the header row) are skipped.
+    Passing the previous snapshot's stop_names keeps existing stop codes valid.
+    """
+    stop_names = [] if stop_names is None else [str(name) for name in stop_names]
+    stop_codes = {name: i for i, name in enumerate(stop_names)}
+    columns = {field: [] for field in ROW_FIELDS}
+    plan_offsets = [0]
+    plan_stops = []
+
+    for row_number, values in rows:
+        values = list(values) + [""] * (len(RESPONSE_COLUMNS) - len(values))
+        timestamp = parse_timestamp(values[_col["timestamp"]])
+        if not values[_col["unique_id"]] or timestamp is None:
+            continue
+
+        columns["row"].append(row_number)
+        columns["unique_id"].append(values[_col["unique_id"]])
+        columns["timestamp"].append(timestamp)
+        columns["age"].append(_code(values[_col["age"]], AGE_GROUPS))
+        columns["duration"].append(_code(values[_col["duration"]], DURATIONS))
+        columns["accessibility"].append(_bitmask(values[_col["accessibility"]], ACCESSIBILITY_FLAGS))
+        columns["ranks"].append([_int(v, 0) for v in values[RANK_SLICE]])
+        columns["priorities"].append(_bitmask(values[_col["priorities"]], PRIORITY_OPTIONS))
+        columns["wait_minutes"].append(_int(values[_col["wait_time"]], -1))
+        columns["walking"].append(_code(values[_col["walking"]], WALKING_OPTIONS))
+        columns["break_time"].append(_code(values[_col["break_time"]], BREAK_OPTIONS))
+        columns["total_time_used"].append(_float(values[_col["total_time_used"]]))
+        columns["leftover_time"].append(_float(values[_col["leftover_time"]]))
+        columns["likert"].append([_int(v, 0) for v in values[LIKERT_SLICE]])
+        columns["feedback"].append(values[_col["feedback"]])
+        columns["plan_source"].append(_plan_source_code(values[_col["plan_text"]]))
+
+        for stop in parse_plan_stops(values[_col["plan_text"]]):
+            if stop not in stop_codes:
+                stop_codes[stop] = len(stop_names)
+                stop_names.append(stop)
+            plan_stops.append(stop_codes[stop])
+        plan_offsets.append(len(plan_stops))
+
+    n = len(columns["row"])
+    return {
+        "row": np.array(columns["row"], dtype=np.int32),
+        "unique_id": np.array(columns["unique_id"], dtype=str),
+        "timestamp": np.array(columns["timestamp"], dtype="datetime64[s]"),
+        "age": np.array(columns["age"], dtype=np.int8),
+        "duration": np.array(columns["duration"], dtype=np.int8),
+        "accessibility": np.array(columns["accessibility"], dtype=np.uint8),
+        "ranks": np.array(columns["ranks"], dtype=np.int8).reshape(n, 7),
+        "priorities": np.array(columns["priorities"], dtype=np.uint8),
+        "wait_minutes": np.array(columns["wait_minutes"], dtype=np.int16),
+        "walking": np.array(columns["walking"], dtype=np.int8),
+        "break_time": np.array(columns["break_time"], dtype=np.int8),
+        "total_time_used": np.array(columns["total_time_used"], dtype=np.float32),
+        "leftover_time": np.array(columns["leftover_time"], dtype=np.float32),
+        "likert": np.array(columns["likert"], dtype=np.int8).reshape(n, 5),
+        "feedback": np.array(columns["feedback"], dtype=str),
+        "plan_source": np.array(columns["plan_source"], dtype=np.int8),
+        "plan_offsets": np.array(plan_offsets, dtype=np.int32),
+        "plan_stops": np.array(plan_stops, dtype=np.int16),
+        "stop_names": np.array(stop_names, dtype=str),
+        "age_labels": np.array(AGE_GROUPS),
+        "duration_labels": np.array(DURATIONS),
+        "accessibility_labels": np.array(ACCESSIBILITY_FLAGS),
+        "priority_labels": np.array(PRIORITY_OPTIONS),
+        "walking_labels": np.array(WALKING_OPTIONS),
+        "break_labels": np.array(BREAK_OPTIONS),
+        "likert_labels": np.array(LIKERT_OPTIONS),
+        "plan_source_labels": np.array(PLAN_SOURCES),
+    }
+
+
+def plan_stops_for(snapshot, index):
+    start, end = snapshot["plan_offsets"][index], snapshot["plan_offsets"][index + 1]
+    return [str(snapshot["stop_names"][code]) for code in snapshot["plan_stops"][start:end]]
+
+
+def _head(snapshot, count):
+    head = dict(snapshot)
+    for field in ROW_FIELDS:
+        head[field] = snapshot[field][:count]
+    head["plan_offsets"] = snapshot["plan_offsets"][:count + 1]
+    head["plan_stops"] = snapshot["plan_stops"][:snapshot["plan_offsets"][count]]
+    return head
+
+
+def _concat(head, tail):
+    merged = dict(tail)
+    for field in ROW_FIELDS:
+        merged[field] = np.concatenate([head[field], tail[field]])
+    merged["plan_offsets"] = np.concatenate([head["plan_offsets"], tail["plan_offsets"][1:] + head["plan_offsets"][-1]])
+    merged["plan_stops"] = np.concatenate([head["plan_stops"], tail["plan_stops"]])
+    return merged
+
+
+def refresh_start(snapshot, now=None):
+    """First row that has to be re-read: the oldest row still waiting on feedback, or the next new row."""
+    now = np.datetime64(now or datetime.now(), "s")
+    open_rows = (snapshot["likert"][:, 0] == 0) & (snapshot["timestamp"] > now - SETTLE_PERIOD)
+    if open_rows.any():
+        return int(snapshot["row"][np.argmax(open_rows)])
+    return int(snapshot["row"][-1]) + 1 if len(snapshot["row"]) else 1
+
+
+def refresh_snapshot(snapshot, fetch_rows, now=None):
+    """Re-read only rows from refresh_start() onwards; fetch_rows(first_row) returns (row number, values) pairs."""
+    first_row = refresh_start(snapshot, now)
+    keep = int(np.searchsorted(snapshot["row"], first_row))
+    head = _head(snapshot, keep)
+    tail = build_snapshot(fetch_rows(first_row), stop_names=head["stop_names"])
+    return _concat(head, tail)
+
+
+def fetch_sheet_rows(worksheet, first_row=1):
+    if first_row <= 1:
+        values = worksheet.get_all_values()
+    else:
+        values = worksheet.get_values(f"A{first_row}:{column_letter(len(RESPONSE_COLUMNS))}")
+    return [(first_row + i, row) for i, row in enumerate(values)]
+
+
+def fetch_store_rows(local_store, first_row=1):
+    return local_store.rows(first_row)
+
+
+def save_snapshot(snapshot, path):
+    np.savez_compressed(path, version=np.int32(SNAPSHOT_VERSION), **snapshot)
+
+
+def load_snapshot(path):
+    with np.load(path) as data:
+        if int(data["version"]) != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot {path} has version {int(data['version'])}, expected {SNAPSHOT_VERSION}")
+        return {key: data[key] for key in data.files if key != "version"}
+
+
+# Aggregations
+
+def likert_distribution_by_age(snapshot, question=3):
+    """Counts of each Likert answer (columns 1–5) per age group (rows) for one feedback question (0–4)."""
+    answers = snapshot["likert"][:, question]
+    ages = snapshot["age"]
+    mask = (answers > 0) & (ages >= 0)
+    index = ages[mask].astype(np.int64) * 5 + (answers[mask] - 1)
+    return np.bincount(index, minlength=len(AGE_GROUPS) * 5).reshape(len(AGE_GROUPS), 5)
+
+
+def most_planned_attractions(snapshot, top=10):
+    counts = np.bincount(snapshot["plan_stops"], minlength=len(snapshot["stop_names"]))
+    order = np.argsort(counts, kind="stable")[::-1][:top]
+    return [(str(snapshot["stop_names"][i]), int(counts[i])) for i in order if counts[i]]
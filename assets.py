@@ -0,0 +1,118 @@
+# Pre-sized, re-compressed page images shared by every session.
+#
+# st.image re-opens a file path on every rerun and, when the image is wider
+# than where it is shown, resizes and re-encodes it each time, and the media
+# URLs it serves carry no cache headers and change with every session. Each
+# image is instead encoded once per process at a few widths (a narrow phone
+# and its slot, at 1x and 2x) and written to static/img/ under a name holding
+# its content hash. Pages show it with an <img srcset> on Streamlit's static
+# file route (enableStaticServing in .streamlit/config.toml), so the browser
+# fetches the variant for its screen and the URL only changes when the image
+# does. Without a writable static/img/ the widest variant goes through st.image.
+
+import hashlib
+import io
+import logging
+import os
+import tempfile
+
+import streamlit as st
+from PIL import Image
+
+# name: (source file, display width in CSS px; None for the full content column)
+IMAGE_VARIANTS = {
+    "header": ("static/headerq.png", None),
+    "logo": ("Sheffield-Hallam-University.png", 250),
+    "map": ("static/map.jpg", None),
+}
+
+CONTENT_WIDTH = 730  # Streamlit's centred content column
+MOBILE_WIDTH = 360   # narrow phones
+IMAGE_DIR = "static/img"
+IMAGE_URL = "app/static/img"
+
+JPEG_QUALITY = 82
+
+logger = logging.getLogger(__name__)
+
+
+def _has_transparency(image):
+    return image.mode in ("RGBA", "LA") and image.getchannel("A").getextrema()[0] < 255
+
+
+def variant_widths(display_width, source_width):
+    """Pixel widths to encode: 1x and 2x of the slot, plus a phone-width variant for wide slots.
+
+    Widths above the source are capped at it; nothing is upscaled.
+    """
+    widths = {display_width, 2 * display_width}
+    if display_width > MOBILE_WIDTH:
+        widths.add(MOBILE_WIDTH)
+    return sorted({min(width, source_width) for width in widths})
+
+
+def _encode(image, width):
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if _has_transparency(image):
+        # Palette PNG keeps the alpha channel at a fraction of the RGBA size
+        image.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), "png"
+    image.convert("RGB").save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue(), "jpg"
+
+
+def _write(filename, data):
+    path = os.path.join(IMAGE_DIR, filename)
+    if not os.path.exists(path):
+        os.makedirs(IMAGE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=IMAGE_DIR)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+@st.cache_resource
+def load_image(name):
+    """Encode every width of an image once; returns (display width, [(width, filename, bytes)], served).
+
+    served is False when the files couldn't be written to IMAGE_DIR.
+    """
+    path, display_width = IMAGE_VARIANTS[name]
+    display_width = display_width or CONTENT_WIDTH
+    image = Image.open(path)
+    image.load()
+
+    variants = []
+    for width in variant_widths(display_width, image.width):
+        data, extension = _encode(image, width)
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        variants.append((width, f"{name}-{width}w-{digest}.{extension}", data))
+
+    served = True
+    try:
+        for _, filename, data in variants:
+            _write(filename, data)
+    except OSError as e:
+        logger.warning("Serving %s through st.image: can't write %s (%s)", name, IMAGE_DIR, e)
+        served = False
+    return display_width, variants, served
+
+
+def show_image(name, width=None, use_container_width=False):
+    display_width, variants, served = load_image(name)
+    if not served:
+        st.image(variants[-1][2], width=width, use_container_width=use_container_width)
+        return
+
+    srcset = ", ".join(f"{IMAGE_URL}/{filename} {w}w" for w, filename, _ in variants)
+    if use_container_width:
+        sizes, style = f"(max-width: {CONTENT_WIDTH}px) 100vw, {CONTENT_WIDTH}px", "width: 100%;"
+    else:
+        width = width or display_width
+        sizes, style = f"{width}px", f"width: {width}px; max-width: 100%;"
+    st.markdown(
+        f'<img src="{IMAGE_URL}/{variants[-1][1]}" srcset="{srcset}" sizes="{sizes}" style="{style}" alt="">',
+        unsafe_allow_html=True,
+    )
@@ -0,0 +1,155 @@
+# Bounded, content-addressed byte caches shared across sessions.
+#
+# Entries are evicted least-recently-used once the total size passes max_bytes.
+# With a spill directory, evicted entries are written to disk and read back on
+# a later miss, so they also survive a server restart. The directory is kept
+# under spill_max_bytes (it may be shared by several processes): once the
+# entries this process knows of pass it, the directory is rescanned and the
+# least recently used files are deleted.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(*parts):
+    """Stable SHA-256 over JSON-serialisable parts."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class BytesLRUCache:
+    def __init__(self, max_bytes, spill_dir=None, suffix=".bin", spill_max_bytes=None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.spill_size = 0
+        self.suffix = suffix
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_evictions = 0
+        self.lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self._prune_spill()
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key + self.suffix)
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.spill_dir:
+            try:
+                with open(self._spill_path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                try:
+                    os.utime(self._spill_path(key))  # recently used, so pruned last
+                except OSError:
+                    pass
+                with self.lock:
+                    self.disk_hits += 1
+                self.put(key, data)
+                return data
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            self._spill(key, data)
+            return
+        evicted = []
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                old_key, old_data = self.entries.popitem(last=False)
+                self.size -= len(old_data)
+                self.evictions += 1
+                evicted.append((old_key, old_data))
+        for old_key, old_data in evicted:
+            self._spill(old_key, old_data)
+
+    def _spill(self, key, data):
+        if not self.spill_dir or os.path.exists(self._spill_path(key)):
+            return
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._spill_path(key))
+        with self.lock:
+            self.spill_size += len(data)
+            over = self.spill_max_bytes is not None and self.spill_size > self.spill_max_bytes
+        if over:
+            self._prune_spill()
+
+    def _prune_spill(self):
+        """Delete the least recently used spilled entries until the directory fits spill_max_bytes."""
+        files = []
+        now = time.time()
+        for entry in os.scandir(self.spill_dir):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(self.suffix):
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+            elif now - stat.st_mtime > 3600:
+                # Temp file of a write that never finished
+                _remove(entry.path)
+
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        if self.spill_max_bytes is not None:
+            for _, size, path in sorted(files):
+                if total <= self.spill_max_bytes:
+                    break
+                _remove(path)
+                total -= size
+                removed += 1
+        with self.lock:
+            self.spill_size = total
+            self.spill_evictions += removed
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_bytes": self.spill_size,
+                "spill_evictions": self.spill_evictions,
+            }
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
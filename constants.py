@@ -1,3 +1,7 @@
+# Served from static/ by Streamlit (enableStaticServing in .streamlit/config.toml),
+# so pages link to it instead of inlining the PDF as base64 on every render
+PIS_LINK = '<a href="app/static/PISPCF.pdf" download="PISPCF.pdf">Participant Information Sheet (PDF)</a>'
+
 INFO_SHEET = """
 **Title of Project:** *The Search of Advanced AI-Powered Service Robots for Amusement Parks*
 
@@ -74,3 +78,35 @@ CONSENT_TEXT = """
 5.	I wish to participate in the study under the conditions set out in the Information Sheet.
 6.	I consent to the information collected for the purposes of this research study, once anonymised (so that I cannot be identified), to be used for any other research purposes.
     """
+
+# Questionnaire answer options (pages/1_questionnaire.py)
+
+AGE_GROUPS = ["Under 12", "13–17", "18–30", "31–45", "46–60", "60+"]
+
+DURATIONS = ["<2 hrs", "2–4 hrs", "4–6 hrs", "All day"]
+
+ACCESSIBILITY_NEEDS = ["Physical", "Sensory", "Cognitive", "Prefer not to say"]
+
+PREFERENCE_CATEGORIES = [
+    "Thrill rides",
+    "Family rides",
+    "Water rides",
+    "Live shows",
+    "Food & Dining",
+    "Shopping",
+    "Relaxation areas"
+]
+
+PRIORITY_OPTIONS = [
+    "Enjoying high-intensity rides",
+    "Visiting family-friendly attractions together",
+    "Seeing as many attractions as possible",
+    "Staying comfortable throughout the visit",
+    "Having regular food and rest breaks"
+]
+
+WALKING_OPTIONS = ["Very short distances", "Moderate walking", "Don’t mind walking"]
+
+BREAK_OPTIONS = ["After 1 hour", "After 2 hours", "After every big ride", "Flexible"]
+
+LIKERT_OPTIONS = ["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"]
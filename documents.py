@@ -0,0 +1,301 @@
+# Participant document generation: the tour summary PDF merged with the consent form.
+
+import io
+import logging
+import os
+import threading
+from datetime import datetime
+
+import streamlit as st
+import PyPDF2
+from reportlab.lib.colors import HexColor, black
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from cache import BytesLRUCache, content_key
+from plan_format import plan_lines, render_html
+from telemetry import count
+
+CONSENT_PDF_PATH = "PISPCF.pdf"
+
+# "reportlab" draws the summary directly; "xhtml2pdf" renders the HTML version
+PDF_ENGINES = ("reportlab", "xhtml2pdf")
+DEFAULT_PDF_ENGINE = os.environ.get("PDF_ENGINE", "reportlab")
+
+FONT_REGULAR = "DejaVuSans"
+FONT_BOLD = "DejaVuSans-Bold"
+ACCENT_COLOR = HexColor("#990033")
+MUTED_COLOR = HexColor("#555555")
+RULE_COLOR = HexColor("#dddddd")
+PAGE_MARGIN = 50
+
+# Rendered final documents, keyed by their content; DOCUMENT_CACHE_DIR enables spilling to disk
+DOCUMENT_CACHE_MB = float(os.environ.get("DOCUMENT_CACHE_MB", "64"))
+DOCUMENT_CACHE_DIR = os.environ.get("DOCUMENT_CACHE_DIR")
+DOCUMENT_CACHE_DIR_MB = float(os.environ.get("DOCUMENT_CACHE_DIR_MB", "512"))
+
+logger = logging.getLogger(__name__)
+
+LIKERT_LABELS = {
+    "1": "Strongly Disagree",
+    "2": "Disagree",
+    "3": "Neutral",
+    "4": "Agree",
+    "5": "Strongly Agree"
+}
+
+_consent_lock = threading.Lock()
+
+
+@st.cache_resource
+def load_consent_pdf():
+    """Read and parse the consent PDF once per process; returns (bytes, reader)."""
+    with open(CONSENT_PDF_PATH, "rb") as f:
+        data = f.read()
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    # One throwaway clone resolves every object the merge touches, so later
+    # merges only copy already-parsed objects
+    warm_up = PyPDF2.PdfWriter()
+    warm_up.append(reader)
+    warm_up.write(io.BytesIO())
+    return data, reader
+
+
+def embeddable_font(path):
+    """DejaVu without hinting, layout tables and extended name records.
+
+    reportlab already subsets fonts to the glyphs each document uses, but it
+    copies the name and hinting tables whole, which are most of an embedded
+    subset. Falls back to the original file when fontTools is not installed.
+    """
+    try:
+        from fontTools import subset
+    except ImportError:
+        return path
+    options = subset.Options()
+    options.hinting = False
+    options.layout_features = []
+    options.name_IDs = [1, 2, 3, 4, 6]
+    options.name_languages = [0x409]
+    options.glyph_names = False
+    options.drop_tables += ["GDEF", "GPOS", "GSUB", "MATH", "FFTM"]
+    font = subset.load_font(path, options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=font.getBestCmap().keys())
+    subsetter.subset(font)
+    font_buffer = io.BytesIO()
+    font.save(font_buffer)
+    font_buffer.seek(0)
+    return font_buffer
+
+
+@st.cache_resource
+def register_fonts():
+    pdfmetrics.registerFont(TTFont(FONT_REGULAR, embeddable_font("DejaVuSans.ttf")))
+    pdfmetrics.registerFont(TTFont(FONT_BOLD, embeddable_font("DejaVuSans-Bold.ttf")))
+    pdfmetrics.registerFontFamily(FONT_REGULAR, normal=FONT_REGULAR, bold=FONT_BOLD)
+    return FONT_REGULAR, FONT_BOLD
+
+
+def feedback_fields(q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph):
+    return [
+        ("1. Activity Spacing:", LIKERT_LABELS.get(q_spacing, q_spacing)),
+        ("2. Attraction Variety:", LIKERT_LABELS.get(q_variety, q_variety)),
+        ("3. Meal/Rest Timing:", LIKERT_LABELS.get(q_meal_timing, q_meal_timing)),
+        ("4. Overall Satisfaction:", LIKERT_LABELS.get(q_overall, q_overall)),
+        ("5. Energy Graph Helpfulness:", LIKERT_LABELS.get(q_energy_graph, q_energy_graph)),
+    ]
+
+
+@st.cache_resource
+def get_document_cache():
+    return BytesLRUCache(
+        int(DOCUMENT_CACHE_MB * 1024 * 1024), spill_dir=DOCUMENT_CACHE_DIR, suffix=".pdf",
+        spill_max_bytes=int(DOCUMENT_CACHE_DIR_MB * 1024 * 1024),
+    )
+
+
+def document_key(row, consent, engine=None):
+    # The unique ID is printed on the summary, so it is part of the content too
+    return content_key(row[1], row[16:25], bool(consent), engine or DEFAULT_PDF_ENGINE)
+
+
+def cached_final_document(row, consent, engine=None):
+    """final_document_from_row, served from the document cache when the same content was rendered before."""
+    cache = get_document_cache()
+    key = document_key(row, consent, engine)
+    pdf_bytes = cache.get(key)
+    if pdf_bytes is None:
+        pdf_bytes = final_document_from_row(row, consent, engine=engine)
+        cache.put(key, pdf_bytes)
+    return pdf_bytes
+
+
+def final_document_from_row(row, consent, engine=None):
+    """Render the summary for a stored response row and merge it with the consent form; returns PDF bytes."""
+    unique_id = row[1]
+    plan_text, total_time_used, leftover_time = row[16:19]  # Columns Q–S
+    q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph, feedback = row[19:25]  # Columns T–Y
+    summary = generate_pdf(
+        unique_id, plan_text, total_time_used, leftover_time,
+        q_spacing, q_variety, q_meal_timing, q_overall,
+        q_energy_graph, feedback, consent, engine=engine
+    )
+    return merge_with_consent(summary)
+
+
+def generate_pdf(unique_id, plan_text, total_time_used, leftover_time, q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph, feedback, consent, engine=None):
+    engine = engine or DEFAULT_PDF_ENGINE
+    if engine not in PDF_ENGINES:
+        raise ValueError(f"Unknown PDF engine: {engine!r} (expected one of {PDF_ENGINES})")
+
+    args = (unique_id, plan_text, total_time_used, leftover_time, q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph, feedback, consent)
+    if engine == "reportlab":
+        try:
+            return generate_pdf_reportlab(*args)
+        except Exception as e:
+            logger.warning("reportlab PDF failed, using xhtml2pdf: %s", e)
+            count("pdf_reportlab_fallbacks")
+    return generate_pdf_html(*args)
+
+
+def generate_pdf_reportlab(unique_id, plan_text, total_time_used, leftover_time, q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph, feedback, consent):
+    regular, bold = register_fonts()
+    pdf_buffer = io.BytesIO()
+    pdf = canvas.Canvas(pdf_buffer, pagesize=A4, pageCompression=1)
+    page_width, page_height = A4
+    text_width = page_width - 2 * PAGE_MARGIN
+    y = page_height - PAGE_MARGIN
+
+    def ensure_space(needed):
+        nonlocal y
+        if y - needed < PAGE_MARGIN:
+            pdf.showPage()
+            y = page_height - PAGE_MARGIN
+
+    def paragraph(text, font=regular, size=10, color=black, indent=0, label=None, gap=4):
+        # Optional bold label followed by wrapped text with a hanging indent
+        nonlocal y
+        label_width = pdfmetrics.stringWidth(label + " ", bold, size) if label else 0
+        lines = simpleSplit(str(text), font, size, text_width - indent - label_width) or [""]
+        for i, line in enumerate(lines):
+            ensure_space(size + gap)
+            y -= size
+            if label and i == 0:
+                pdf.setFont(bold, size)
+                pdf.setFillColor(black)
+                pdf.drawString(PAGE_MARGIN + indent, y, label)
+            pdf.setFont(font, size)
+            pdf.setFillColor(color)
+            pdf.drawString(PAGE_MARGIN + indent + label_width, y, line)
+            y -= gap
+
+    def heading(text):
+        nonlocal y
+        ensure_space(40)
+        y -= 16
+        paragraph(text, font=bold, size=12, color=ACCENT_COLOR, gap=2)
+        pdf.setStrokeColor(RULE_COLOR)
+        pdf.setLineWidth(1)
+        pdf.line(PAGE_MARGIN, y, page_width - PAGE_MARGIN, y)
+        y -= 6
+
+    pdf.setTitle("Amusement Park Tour Summary")
+    pdf.setFont(bold, 14)
+    pdf.setFillColor(ACCENT_COLOR)
+    y -= 14
+    pdf.drawCentredString(page_width / 2, y, "Amusement Park Tour Summary")
+    y -= 16
+
+    paragraph(unique_id, font=bold, label="Please Use this Unique ID To Activate the Guide Robot:")
+    if consent:
+        paragraph("Consent confirmed by participant.", color=MUTED_COLOR)
+
+    heading("Tour Plan Summary")
+    for style, line in plan_lines(plan_text):
+        if style == "endpoint":
+            paragraph(line, font=bold)
+        elif style == "detail":
+            paragraph(line, color=MUTED_COLOR, indent=10)
+        else:
+            paragraph(line)
+
+    paragraph(f"{total_time_used} minutes", label="Total Time Used:")
+    paragraph(f"{leftover_time} minutes", label="Leftover Time:")
+
+    heading("Participant Feedback")
+    for label, answer in feedback_fields(q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph):
+        paragraph(answer, label=label)
+    paragraph(feedback, label="Comments:")
+
+    y -= 26
+    paragraph(f"Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", size=8, color=MUTED_COLOR)
+
+    pdf.showPage()
+    pdf.save()
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def generate_pdf_html(unique_id, plan_text, total_time_used, leftover_time, q_spacing, q_variety, q_meal_timing, q_overall, q_energy_graph, feedback, consent):
+    html_content = f"""
+    <html>
+    <head>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 30px; font-size: 10pt; }}
+        h1 {{ text-align: center; color: #990033; font-size: 14pt; margin-bottom: 12px; }}
+        h2 {{ color: #990033; border-bottom: 1px solid #ddd; padding-bottom: 2px; font-size: 12pt; margin-top: 20px; }}
+        p {{ margin: 4px 0; }}
+    </style>
+    </head>
+    <body>
+
+    <h1>Amusement Park Tour Summary</h1>
+    <p><i>Please Use this Unique ID To Activate the Guide Robot:</i> <b>{unique_id}</b></p>
+
+    {"<p><i>Consent confirmed by participant.</i></p>" if consent else ""}
+
+    <h2>Tour Plan Summary</h2>
+    """
+
+    html_content += render_html(plan_text)
+
+    html_content += f"""
+    <p><b>Total Time Used:</b> {total_time_used} minutes</p>
+    <p><b>Leftover Time:</b> {leftover_time} minutes</p>
+
+    <h2>Participant Feedback</h2>
+    <p><b>1. Activity Spacing:</b> {LIKERT_LABELS.get(q_spacing, q_spacing)}</p>
+    <p><b>2. Attraction Variety:</b> {LIKERT_LABELS.get(q_variety, q_variety)}</p>
+    <p><b>3. Meal/Rest Timing:</b> {LIKERT_LABELS.get(q_meal_timing, q_meal_timing)}</p>
+    <p><b>4. Overall Satisfaction:</b> {LIKERT_LABELS.get(q_overall, q_overall)}</p>
+    <p><b>5. Energy Graph Helpfulness:</b> {LIKERT_LABELS.get(q_energy_graph, q_energy_graph)}</p>
+    <p><b>Comments:</b> {feedback}</p>
+
+    <p style="margin-top: 30px; font-size: 8pt;"><i>Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</i></p>
+
+    </body></html>
+    """
+
+    # xhtml2pdf takes ~300 ms to import and is only needed by this engine
+    from xhtml2pdf import pisa
+
+    pdf_buffer = io.BytesIO()
+    pisa.CreatePDF(io.StringIO(html_content), dest=pdf_buffer)
+    pdf_buffer.seek(0)
+    return pdf_buffer
+
+
+def merge_with_consent(generated_buffer):
+    """Append the generated summary pages to the cached consent form; returns PDF bytes."""
+    _, consent = load_consent_pdf()
+    writer = PyPDF2.PdfWriter()
+    with _consent_lock:
+        writer.append(consent)
+    writer.append(PyPDF2.PdfReader(generated_buffer))
+    final_pdf = io.BytesIO()
+    writer.write(final_pdf)
+    return final_pdf.getvalue()
@@ -0,0 +1,298 @@
+# Energy level graph for the tour plan page.
+#
+# The default renderer sends only the sampled energy series and stop markers
+# to the browser as a Vega-Lite (Altair) chart; the matplotlib renderer draws
+# the same graph on the server and is kept as a fallback. Its PNGs are cached
+# per process by plot content, and each figure is closed once encoded. Renders
+# are timed as the energy_chart.render span; cache hits and misses are counted
+# and the cache size and open figures are gauges on /metrics.
+
+import io
+import logging
+import os
+
+import numpy as np
+import streamlit as st
+
+from cache import BytesLRUCache, content_key
+from telemetry import count, set_gauge, span
+
+# "altair" (client-side) or "matplotlib" (server-side PNG)
+ENERGY_CHART_ENGINE = os.environ.get("ENERGY_CHART_ENGINE", "altair")
+
+# Rendered matplotlib PNGs kept per process, keyed by the plotted series
+ENERGY_CHART_CACHE_MB = float(os.environ.get("ENERGY_CHART_CACHE_MB", "16"))
+
+# Most points sent to either renderer; shorter timelines are sent as they are
+ENERGY_CHART_POINTS = 400
+
+# Same options st.pyplot uses, so cached PNGs look identical
+SAVEFIG_OPTIONS = {"format": "png", "bbox_inches": "tight", "dpi": 200}
+
+ENERGY_BANDS = [
+    (80, 100, "green", "High Energy (80–100%)"),
+    (50, 80, "yellow", "Moderate Energy (50–80%)"),
+    (0, 50, "red", "Low Energy (<50%)"),
+]
+STOP_KINDS = {"food": "Meal Stop", "relaxation": "Rest Stop"}
+
+logger = logging.getLogger(__name__)
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of n_out points that keep the series' shape.
+
+    The first and last points are always kept; each bucket in between keeps the
+    point forming the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample_energy(time_timeline, energy_timeline, stop_label_points, max_points=ENERGY_CHART_POINTS):
+    """Thin the energy series to at most ~max_points without losing its shape.
+
+    The last sample of every stop, the lowest and highest points are always kept;
+    LTTB runs between those anchors with a share of the budget proportional to each
+    stretch's length.
+    """
+    x = np.asarray(time_timeline, dtype=np.float64)
+    y = np.asarray(energy_timeline, dtype=np.float64)
+    n = len(x)
+    if n <= max_points:
+        return x, y
+
+    stop_ends = np.array([t for t, _, _, _ in stop_label_points], dtype=np.float64)
+    # Samples are taken before the minute is counted, so a stop ending at t has its last sample before t
+    boundaries = np.searchsorted(x, stop_ends, side="left") - 1
+    anchors = np.unique(np.concatenate([[0, n - 1, np.argmin(y), np.argmax(y)], boundaries.clip(0, n - 1)]))
+
+    budget = max(max_points - len(anchors), 0)
+    keep = [anchors]
+    for start, end in zip(anchors[:-1], anchors[1:]):
+        inner = end - start - 1
+        if inner <= 0:
+            continue
+        share = int(round(budget * inner / (n - len(anchors))))
+        if share:
+            # LTTB over [start, end] keeps both anchors, so ask for share + 2 points
+            keep.append(start + lttb_indices(x[start:end + 1], y[start:end + 1], share + 2))
+    indices = np.unique(np.concatenate(keep))
+    return x[indices], y[indices]
+
+
+def energy_chart_altair(time_timeline, energy_timeline, stop_label_points):
+    import altair as alt
+
+    series = alt.Data(values=[
+        {"minute": float(t), "energy": round(float(e), 2)} for t, e in zip(time_timeline, energy_timeline)
+    ])
+    last_time = time_timeline[-1]
+    stops = []
+    for i, (time_point, energy_level, stop_name, zone) in enumerate(
+        [(time_timeline[0], 100, "Entrance", None)] + list(stop_label_points)
+    ):
+        if time_point > last_time + 5:
+            continue
+        stops.append({
+            "minute": float(min(time_point, last_time)),
+            "energy": round(float(energy_level), 1),
+            "stop": stop_name,
+            "label": f"{stop_name[:12]}…" if len(stop_name) > 15 else stop_name,
+            "kind": "Entrance" if i == 0 else STOP_KINDS.get(zone, "Ride"),
+            # Alternate label heights so neighbouring labels do not overlap
+            "label_energy": round(float(energy_level), 1) + (8 if i % 2 == 0 else 16),
+        })
+    stop_data = alt.Data(values=stops)
+    bands = alt.Data(values=[{"low": low, "high": high, "band": label} for low, high, _, label in ENERGY_BANDS])
+
+    x = alt.X("minute:Q", title="Minutes Elapsed")
+    y = alt.Y("energy:Q", title="Energy Level (%)", scale=alt.Scale(domain=[-10, 110]))
+
+    band_layer = alt.Chart(bands).mark_rect(opacity=0.1).encode(
+        y=alt.Y("low:Q", scale=alt.Scale(domain=[-10, 110])),
+        y2="high:Q",
+        color=alt.Color(
+            "band:N",
+            scale=alt.Scale(domain=[b[3] for b in ENERGY_BANDS], range=[b[2] for b in ENERGY_BANDS]),
+            legend=None,
+        ),
+    )
+    line_layer = alt.Chart(series).mark_line(color="#2E86AB", strokeWidth=1.5).encode(x=x, y=y)
+    point_layer = alt.Chart(stop_data).mark_point(filled=True, size=60).encode(
+        x=x,
+        y=y,
+        shape=alt.Shape("kind:N", title=None, scale=alt.Scale(
+            domain=["Entrance", "Ride", "Meal Stop", "Rest Stop"],
+            range=["circle", "circle", "square", "diamond"],
+        )),
+        color=alt.Color("kind:N", title=None, scale=alt.Scale(
+            domain=["Entrance", "Ride", "Meal Stop", "Rest Stop"],
+            range=["green", "blue", "green", "darkgreen"],
+        )),
+        tooltip=["stop:N", alt.Tooltip("minute:Q", title="Minute"), alt.Tooltip("energy:Q", title="Energy %")],
+    )
+    label_layer = alt.Chart(stop_data).transform_calculate(
+        text="datum.label + ' ' + floor(datum.energy) + '%'"
+    ).mark_text(fontSize=9).encode(x=x, y=alt.Y("label_energy:Q", scale=alt.Scale(domain=[-10, 110])), text="text:N")
+
+    return (band_layer + line_layer + point_layer + label_layer).properties(
+        title="Visitor Energy Level Throughout the Day", height=450
+    )
+
+
+def energy_figure(time_timeline, energy_timeline, stop_label_points):
+    """The original server-side rendering: a 12x8 matplotlib figure."""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    # Main energy line
+    ax.plot(time_timeline, energy_timeline, color='#2E86AB', linewidth=1.5)
+    ax.grid(True, linestyle='--', alpha=0.5)
+    ax.set_facecolor('#f9f9f9')
+
+    # Energy bands
+    ax.axhspan(80, 100, color='green', alpha=0.1, label='High Energy (80–100%)')
+    ax.axhspan(50, 80, color='yellow', alpha=0.1, label='Moderate Energy (50–80%)')
+    ax.axhspan(0, 50, color='red', alpha=0.1, label='Low Energy (<50%)')
+
+    # Entrance marker
+    ax.scatter(time_timeline[0], 100, color='green', marker='o', s=60, zorder=3)
+    ax.annotate("Entrance\n100%", (time_timeline[0], 100),
+                textcoords="offset points", xytext=(0, 10),
+                ha='center', fontsize=8)
+
+    # Stop markers with labels
+    last_time_point = None
+    short_stem_len = 20
+    long_stem_len = 15
+    alternate_counter = 0
+    last_stem_end_y = None
+    MIN_VERTICAL_GAP = 20
+    
+    for i, (time_point, energy_level, stop_name, zone) in enumerate(stop_label_points):
+        if time_point > time_timeline[-1] + 5:
+            continue
+    
+        if time_point > time_timeline[-1]:
+            time_point = time_timeline[-1]
+    
+        label_text = f"{stop_name[:12]}…" if len(stop_name) > 15 else stop_name
+        label_text += f"\n{int(energy_level)}%"
+    
+        if zone == "food":
+            marker_style, color = 's', 'green'
+        elif zone == "relaxation":
+            marker_style, color = 'D', 'darkgreen'
+        else:
+            marker_style, color = 'o', 'blue'
+    
+        direction = 1
+        stem_length = short_stem_len if (alternate_counter % 2 == 0) else long_stem_len
+    
+        predicted_end_y = energy_level + direction * stem_length
+    
+        if last_stem_end_y is not None and abs(predicted_end_y - last_stem_end_y) < MIN_VERTICAL_GAP:
+            direction = -1
+            predicted_end_y = energy_level + direction * stem_length
+    
+        ax.scatter(time_point, energy_level, marker=marker_style, color=color, s=60, zorder=3)
+    
+        ax.plot([time_point, time_point], [energy_level, predicted_end_y], color=color, linestyle='--', linewidth=1)
+    
+        ax.annotate(
+            label_text,
+            (time_point, predicted_end_y),
+            textcoords="offset points",
+            xytext=(0, 0),
+            ha='center',
+            fontsize=8
+        )
+    
+        last_stem_end_y = predicted_end_y
+        alternate_counter += 1
+
+    ax.scatter([], [], marker='o', color='blue', label='Ride')
+    ax.scatter([], [], marker='s', color='green', label='Meal Stop')
+    ax.scatter([], [], marker='D', color='darkgreen', label='Rest Stop')
+    ax.legend()
+
+    ax.set_title("Visitor Energy Level Throughout the Day", fontsize=16, weight='bold')
+    ax.set_xlabel("Minutes Elapsed", fontsize=12)
+    ax.set_ylabel("Energy Level (%)", fontsize=12)
+    ax.set_ylim(-10, 110)
+    fig.tight_layout()
+
+    return fig
+
+
+@st.cache_resource
+def get_energy_chart_cache():
+    return BytesLRUCache(int(ENERGY_CHART_CACHE_MB * 1024 * 1024))
+
+
+def energy_chart_key(time_timeline, energy_timeline, stop_label_points):
+    # The series and stop markers are derived from final_plan and energy_settings,
+    # so hashing what is plotted covers both
+    return content_key(
+        [float(t) for t in time_timeline],
+        [round(float(e), 4) for e in energy_timeline],
+        [(float(t), round(float(e), 4), name, zone) for t, e, name, zone in stop_label_points],
+    )
+
+
+def energy_png(time_timeline, energy_timeline, stop_label_points):
+    """The matplotlib figure as PNG bytes, rendered once per distinct plan."""
+    cache = get_energy_chart_cache()
+    key = energy_chart_key(time_timeline, energy_timeline, stop_label_points)
+    png = cache.get(key)
+    if png is not None:
+        count("energy_chart_cache_hits")
+        return png
+
+    import matplotlib.pyplot as plt
+
+    count("energy_chart_cache_misses")
+    with span("energy_chart.render"):
+        fig = energy_figure(time_timeline, energy_timeline, stop_label_points)
+        try:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, **SAVEFIG_OPTIONS)
+            png = buffer.getvalue()
+        finally:
+            # pyplot keeps every figure alive until it is closed
+            plt.close(fig)
+    cache.put(key, png)
+    set_gauge("energy_chart_cache_bytes", cache.stats()["bytes"])
+    set_gauge("energy_chart_open_figures", len(plt.get_fignums()))
+    return png
+
+
+def show_energy_chart(time_timeline, energy_timeline, stop_label_points, engine=None):
+    engine = engine or ENERGY_CHART_ENGINE
+    if engine == "altair":
+        try:
+            st.altair_chart(
+                energy_chart_altair(time_timeline, energy_timeline, stop_label_points),
+                use_container_width=True,
+            )
+            return
+        except Exception as e:
+            logger.warning("Altair energy chart failed, using matplotlib: %s", e)
+            count("energy_chart_altair_fallbacks")
+    st.image(energy_png(time_timeline, energy_timeline, stop_label_points), use_container_width=True)
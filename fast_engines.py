@@ -0,0 +1,234 @@
+# Faster stand-ins for the planner's scikit-fuzzy simulations and greedy routing.
+#
+# FastSimulation evaluates a ctrl.ControlSystem with plain numpy, following
+# scikit-fuzzy's Mamdani steps (min for AND, max for OR and accumulation,
+# centroid over the cut-upsampled universe), and mimics ControlSystemSimulation
+# closely enough to be swapped in: input[...] = value, compute(), output, and
+# the same carried-over output when a repeated input fires no rule.
+# The distance-matrix routes pick the same stops as planner.reorder_by_distance
+# and planner.greedy_route, ties included.
+#
+# Neither is used unless selected (PLANNER_FUZZY_ENGINE=numpy for the fuzzy
+# side); scripts/diff_engines.py checks both against the reference.
+
+import math
+from functools import lru_cache
+
+import numpy as np
+from skfuzzy.control.antecedent_consequent import accumulation_max
+from skfuzzy.control.term import Term, TermAggregate
+
+FLUSH_AFTER_RUN = 1000  # ControlSystemSimulation's default
+
+
+def _compile_antecedent(term):
+    if isinstance(term, TermAggregate):
+        return (term.kind, _compile_antecedent(term.term1), term.term2 and _compile_antecedent(term.term2))
+    if isinstance(term, Term):
+        return ("term", term.parent.label, term.label)
+    raise TypeError(f"Unsupported rule antecedent: {term!r}")
+
+
+class CompiledControlSystem:
+    """The variables and rules of a ctrl.ControlSystem as plain arrays and tuples."""
+
+    def __init__(self, control_system):
+        self.antecedents = {
+            var.label: (var.universe.astype(float), {t.label: t.mf.astype(float) for t in var.terms.values()})
+            for var in control_system.antecedents
+        }
+        self.consequents = {}
+        for var in control_system.consequents:
+            if var.defuzzify_method != "centroid" or var.accumulation_method not in (accumulation_max, np.fmax):
+                raise ValueError(f"{var.label}: only centroid defuzzification with max accumulation is supported")
+            self.consequents[var.label] = (
+                var.universe.astype(float), {t.label: t.mf.astype(float) for t in var.terms.values()}
+            )
+
+        self.rules = []
+        for rule in control_system.rules:
+            if rule.and_func is not np.fmin or rule.or_func is not np.fmax:
+                raise ValueError(f"{rule}: only min/max aggregation is supported")
+            consequents = [(c.term.parent.label, c.term.label, c.weight) for c in rule.consequent]
+            self.rules.append((_compile_antecedent(rule.antecedent), consequents))
+
+    def _firing(self, node, memberships):
+        kind = node[0]
+        if kind == "term":
+            return memberships[node[1]][node[2]]
+        if kind == "and":
+            return np.fmin(self._firing(node[1], memberships), self._firing(node[2], memberships))
+        if kind == "or":
+            return np.fmax(self._firing(node[1], memberships), self._firing(node[2], memberships))
+        return 1.0 - self._firing(node[1], memberships)
+
+    def evaluate(self, inputs):
+        """Crisp outputs for one set of inputs; outputs no rule gave any area are left out."""
+        memberships = {}
+        for label, (universe, terms) in self.antecedents.items():
+            value = np.fmax(np.fmin(inputs[label], universe.max()), universe.min())
+            memberships[label] = {term: np.interp(value, universe, mf) for term, mf in terms.items()}
+
+        cuts = {}
+        for antecedent, consequents in self.rules:
+            firing = self._firing(antecedent, memberships)
+            for var, term, weight in consequents:
+                activation = firing * weight
+                previous = cuts.get((var, term))
+                cuts[(var, term)] = activation if previous is None else np.fmax(activation, previous)
+
+        outputs = {}
+        for label, (universe, terms) in self.consequents.items():
+            active = [(terms[term], cut) for (var, term), cut in cuts.items() if var == label]
+            if active:
+                value = _defuzz_centroid(universe, active)
+                if value is not None:
+                    outputs[label] = value
+        return outputs
+
+    def evaluate_grid(self, axes):
+        """Outputs over the product of [(input label, values), ...]: {output: array}, NaN where nothing fired.
+
+        Same arithmetic as evaluate(), elementwise over the grid; each distinct set of
+        cut levels is defuzzified once.
+        """
+        shape = [len(values) for _, values in axes]
+        memberships = {}
+        for i, (label, values) in enumerate(axes):
+            universe, terms = self.antecedents[label]
+            value = np.fmax(np.fmin(np.asarray(values, dtype=float), universe.max()), universe.min())
+            axis_shape = [1] * len(axes)
+            axis_shape[i] = len(values)
+            memberships[label] = {term: np.interp(value, universe, mf).reshape(axis_shape) for term, mf in terms.items()}
+
+        cuts = {}
+        for antecedent, consequents in self.rules:
+            firing = self._firing(antecedent, memberships)
+            for var, term, weight in consequents:
+                activation = firing * weight
+                previous = cuts.get((var, term))
+                cuts[(var, term)] = activation if previous is None else np.fmax(activation, previous)
+
+        outputs = {}
+        for label, (universe, terms) in self.consequents.items():
+            active = [(term, np.broadcast_to(cut, shape).ravel()) for (var, term), cut in cuts.items() if var == label]
+            result = np.full(int(np.prod(shape)), np.nan)
+            if active:
+                levels, inverse = np.unique(np.stack([cut for _, cut in active], axis=1), axis=0, return_inverse=True)
+                for row, level in enumerate(levels):
+                    value = _defuzz_centroid(universe, [(terms[term], cut) for (term, _), cut in zip(active, level)])
+                    if value is not None:
+                        result[inverse.ravel() == row] = value
+            outputs[label] = result.reshape(shape)
+        return outputs
+
+
+def _cut_points(x, xmf, y):
+    # skfuzzy.fuzzymath.fuzzy_ops._interp_universe_fast: where the mf crosses level y
+    idx = np.where(np.diff(xmf > y if y == 0.0 else xmf >= y))[0]
+    return x[idx] + (y - xmf[idx]) * (x[idx + 1] - x[idx]) / (xmf[idx + 1] - xmf[idx])
+
+
+def _defuzz_centroid(universe, active):
+    x = np.union1d(universe, np.concatenate([_cut_points(universe, mf, cut) for mf, cut in active]))
+    mfx = np.zeros_like(x)
+    for mf, cut in active:
+        np.maximum(mfx, np.minimum(cut, np.interp(x, universe, mf)), mfx)
+    if mfx.sum() == 0:
+        return None
+
+    # skfuzzy.defuzzify.centroid, one trapezoid per segment
+    x1, x2, y1, y2 = x[:-1], x[1:], mfx[:-1], mfx[1:]
+    width = x2 - x1
+    used = ~(((y1 == 0.0) & (y2 == 0.0)) | (x1 == x2))
+    rising = (y1 == 0.0) & (y2 != 0.0)
+    falling = (y2 == 0.0) & (y1 != 0.0)
+    height_sum = np.where(y1 + y2 == 0.0, 1.0, y1 + y2)
+    moment = np.select(
+        [y1 == y2, rising, falling],
+        [0.5 * (x1 + x2), 2.0 / 3.0 * width + x1, 1.0 / 3.0 * width + x1],
+        2.0 / 3.0 * width * (y2 + 0.5 * y1) / height_sum + x1,
+    )
+    area = np.select([y1 == y2, rising, falling], [width * y1, 0.5 * width * y2, 0.5 * width * y1], 0.5 * width * (y1 + y2))
+    moment, area = moment[used], area[used]
+    return float(np.sum(moment * area) / np.fmax(np.sum(area), np.finfo(float).eps))
+
+
+@lru_cache(maxsize=None)
+def compiled_system(control_system):
+    return CompiledControlSystem(control_system)
+
+
+class FastSimulation:
+    """Drop-in for ctrl.ControlSystemSimulation backed by a CompiledControlSystem."""
+
+    def __init__(self, control_system, cache=True, system=None):
+        # system: anything with evaluate(inputs), e.g. fuzzy_tables.TabulatedSystem
+        self.system = system or compiled_system(control_system)
+        self.input = {}
+        self.output = {}
+        self.cache = cache
+        self._calculated = {}
+        self._run = 0
+
+    def compute(self):
+        key = tuple(sorted(self.input.items()))
+        if self.cache and key in self._calculated:
+            # Like skfuzzy, a repeated input only refreshes the outputs it produced
+            self.output.update(self._calculated[key])
+            return
+
+        outputs = self.system.evaluate(self.input)
+        self.output = dict(outputs)
+        if self.cache:
+            self._calculated[key] = outputs
+        self._run += 1
+        if self._run % FLUSH_AFTER_RUN == 0:
+            self._calculated.clear()
+
+
+# Routing over a precomputed distance matrix
+
+class DistanceMatrix:
+    def __init__(self, coordinates):
+        self.names = list(coordinates)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.points = [coordinates[name] for name in self.names]
+        # Same arithmetic as planner.calculate_distance, so ties resolve identically
+        self.matrix = np.array([[self._distance(a, b) for b in self.points] for a in self.points])
+        self.rows = self.matrix.tolist()
+
+    @staticmethod
+    def _distance(point_a, point_b):
+        return math.hypot(point_b[0] - point_a[0], point_b[1] - point_a[1])
+
+    def row(self, location):
+        """Distances from an attraction name or an (x, y) point to every attraction."""
+        if isinstance(location, str):
+            return self.rows[self.index[location]]
+        return [self._distance(location, point) for point in self.points]
+
+
+def _greedy(matrix, current, remaining):
+    indices = [matrix.index[name] for name in remaining]
+    distances = matrix.row(current)
+    route = []
+    while indices:
+        # min() keeps the first of equal distances, as the reference does over the same order
+        pick = min(indices, key=distances.__getitem__)
+        indices.remove(pick)
+        route.append(matrix.names[pick])
+        distances = matrix.rows[pick]
+    return route
+
+
+def reorder_by_distance_matrix(matrix, route, start_location=(0, 0)):
+    return _greedy(matrix, start_location, [r for r in route if r in matrix.index])
+
+
+def greedy_route_matrix(matrix, attractions, start_with=None):
+    pool = attractions.copy()
+    if start_with and start_with in pool:
+        pool.remove(start_with)
+        return [start_with] + _greedy(matrix, start_with, pool)
+    return _greedy(matrix, (0, 0), pool)
@@ -0,0 +1,272 @@
+# Precomputed lookup tables for the planner's fuzzy systems, built offline and
+# memory-mapped at run time.
+#
+# Every input the planner feeds a controller comes from a short list of values
+# (questionnaire answers through planner's maps, zone intensities, whole walking
+# minutes, age factors). scripts/build_fuzzy_tables.py evaluates each control
+# system over the product of those values with fast_engines' compiled evaluator
+# and publishes the tables under FUZZY_TABLES_DIR/<version>/. The manifest
+# header records, per table, its input axes, the universes and the rule-set hash.
+# The version is derived from the rule sets and axes, so a process finds its
+# tables without building anything and a change to the fuzzy rules or park data
+# simply misses them. Each build keeps the FUZZY_TABLES_KEEP newest versions, so
+# processes still running the previous rules find theirs until they restart.
+#
+# PLANNER_FUZZY_ENGINE=table reads outputs from the tables and evaluates any
+# input outside them (or everything, when no tables are built) with the numpy
+# engine, so plans are the same as with PLANNER_FUZZY_ENGINE=numpy.
+#
+# A version directory is built under a temporary name and renamed into place,
+# so a process never maps a half-written table.
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import time
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+
+from fast_engines import compiled_system
+from telemetry import count
+
+FUZZY_TABLES_DIR = os.environ.get("FUZZY_TABLES_DIR", "fuzzy_tables")
+FUZZY_TABLES_KEEP = 2
+TABLE_FORMAT = 1
+MANIFEST = "manifest.json"
+
+logger = logging.getLogger(__name__)
+
+
+def array_digest(array):
+    """Content hash of an array (dtype, shape and bytes)."""
+    array = np.ascontiguousarray(array)
+    h = hashlib.sha256(f"{array.dtype.str}{array.shape}".encode())
+    h.update(array.tobytes())
+    return h.hexdigest()[:16]
+
+
+def control_systems():
+    """Every fuzzy control system the planner uses, by name."""
+    import planner
+    from warmup import PREFERENCE_ZONES
+
+    systems = {f"weight_{zone}": planner.weight_simulation(zone, "skfuzzy").ctrl for zone in PREFERENCE_ZONES}
+    systems.update({
+        "energy_loss": planner.energy_loss_ctrl,
+        "food_interval": planner.food_interval_ctrl,
+        "wet_time_position": planner.wet_time_ctrl,
+    })
+    return systems
+
+
+def operating_points():
+    """Every value the planner can give each fuzzy input label."""
+    import planner
+
+    return {
+        "preference": range(1, 8),  # 8 - rank
+        "accessibility": planner.accessibility_factors.values(),
+        "wait_tolerance": list(planner.wait_map.values()) + [0.5],
+        "walking": list(planner.walking_map.values()) + [0.5],
+        "priority_thrill": [0.0, 1.0],
+        "priority_food": [0.0, 1.0],
+        "priority_comfort": [0.0, 1.0],
+        "comfort_priority": [0.0, 1.0],
+        "intensity": list(planner.zone_intensity.values()) + [0.5, 1.0],
+        "zone_repeat_count": range(0, 4),
+        "walk_time": range(0, 16),
+        "age_sensitivity": [settings["loss_factor"] for settings in planner.age_energy_scaling.values()],
+        "wet_ride_pref": planner.wet_ride_pref.universe,
+    }
+
+
+def table_axes(control_system, points=None):
+    """(label, sorted values) for each input of the system, in label order."""
+    points = points or operating_points()
+    return [
+        (var.label, sorted({float(value) for value in points[var.label]}))
+        for var in sorted(control_system.antecedents, key=lambda var: var.label)
+    ]
+
+
+def rule_set_hash(control_system):
+    """Hash of the variables, membership functions and rules of a control system."""
+    compiled = compiled_system(control_system)
+    h = hashlib.sha256()
+    for group in (compiled.antecedents, compiled.consequents):
+        for label in sorted(group):
+            universe, terms = group[label]
+            h.update(f"{label}:{array_digest(universe)}".encode())
+            for term in sorted(terms):
+                h.update(f"{term}:{array_digest(terms[term])}".encode())
+    h.update(repr(compiled.rules).encode())
+    return h.hexdigest()[:16]
+
+
+def table_key(control_system, axes):
+    return hashlib.sha256(
+        json.dumps([TABLE_FORMAT, rule_set_hash(control_system), axes]).encode()
+    ).hexdigest()[:16]
+
+
+def tables_version(systems=None):
+    systems = systems or control_systems()
+    keys = sorted(table_key(cs, table_axes(cs)) for cs in systems.values())
+    return hashlib.sha256(",".join(keys).encode()).hexdigest()[:16]
+
+
+def build_table(control_system, axes):
+    """Outputs over the product of the axes, shape axes + (outputs,); NaN where nothing fired."""
+    compiled = compiled_system(control_system)
+    outputs = sorted(compiled.consequents)
+    grids = compiled.evaluate_grid(axes)
+    return np.stack([grids[output] for output in outputs], axis=-1), outputs
+
+
+def build_tables(systems=None, root=FUZZY_TABLES_DIR):
+    """Build every table and publish them; returns (version, header)."""
+    systems = systems or control_systems()
+    arrays, header = {}, {"format": TABLE_FORMAT, "tables": {}}
+    for name, control_system in systems.items():
+        start = time.perf_counter()
+        axes = table_axes(control_system)
+        key = table_key(control_system, axes)
+        if key in arrays:
+            # Zones without their own reinforcement rules share a rule set
+            header["tables"][key]["systems"].append(name)
+            continue
+        table, outputs = build_table(control_system, axes)
+        arrays[key] = table
+        compiled = compiled_system(control_system)
+        header["tables"][key] = {
+            "systems": [name],
+            "rule_set_hash": rule_set_hash(control_system),
+            "axes": axes,
+            "outputs": outputs,
+            "universes": {
+                label: [float(universe.min()), float(universe.max()), len(universe)]
+                for label, (universe, _) in sorted({**compiled.antecedents, **compiled.consequents}.items())
+            },
+            "build_seconds": round(time.perf_counter() - start, 3),
+        }
+    version = publish(arrays, root, tables_version(systems), header)
+    prune(root, FUZZY_TABLES_KEEP, protect=[version])
+    return version, header
+
+
+def publish(arrays, root, version, header):
+    """Write the tables as version unless it exists; returns the version."""
+    final_dir = os.path.join(root, version)
+    if not os.path.exists(os.path.join(final_dir, MANIFEST)):
+        os.makedirs(root, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=root, prefix=".build-")
+        manifest = {"version": version, "header": header, "arrays": {}}
+        for i, (key, values) in enumerate(sorted(arrays.items())):
+            filename = f"{i:04d}.npy"
+            np.save(os.path.join(build_dir, filename), values, allow_pickle=False)
+            manifest["arrays"][key] = filename
+        with open(os.path.join(build_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        try:
+            os.rename(build_dir, final_dir)
+        except OSError:
+            # Another build published the same version first; its copy is identical
+            shutil.rmtree(build_dir, ignore_errors=True)
+    return version
+
+
+def prune(root, keep, protect=()):
+    """Remove all but the keep most recently published versions (and any in protect); returns the removed versions."""
+    versions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name, MANIFEST)
+        if os.path.exists(path):
+            versions.append((os.path.getmtime(path), name))
+        elif name.startswith(".build-") and time.time() - os.path.getmtime(os.path.join(root, name)) > 3600:
+            # Left behind by a build that died half-way
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    removed = [name for _, name in sorted(versions, reverse=True)[keep:] if name not in set(protect)]
+    for name in removed:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    return removed
+
+
+class FuzzyTables:
+    def __init__(self, version, arrays, header):
+        self.version = version
+        self.arrays = arrays
+        self.header = header
+
+    @classmethod
+    def attach(cls, version, root=FUZZY_TABLES_DIR):
+        """Map every table of a published version read-only."""
+        directory = os.path.join(root, version)
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        # Plain ndarray views of the mappings: np.memmap's subclass hooks cost more than a lookup
+        arrays = {
+            key: np.load(os.path.join(directory, filename), mmap_mode="r", allow_pickle=False).view(np.ndarray)
+            for key, filename in manifest["arrays"].items()
+        }
+        return cls(manifest["version"], arrays, manifest["header"])
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def __contains__(self, key):
+        return key in self.arrays
+
+    def nbytes(self):
+        return sum(values.nbytes for values in self.arrays.values())
+
+
+@st.cache_resource
+def get_fuzzy_tables():
+    """The published tables for the current rule sets, memory-mapped; None when they are not built."""
+    version = tables_version()
+    try:
+        return FuzzyTables.attach(version, FUZZY_TABLES_DIR)
+    except FileNotFoundError:
+        logger.warning(
+            "No fuzzy tables for version %s in %s; using the numpy engine (run python -m scripts.build_fuzzy_tables)",
+            version, FUZZY_TABLES_DIR,
+        )
+        return None
+
+
+class TabulatedSystem:
+    """A compiled control system whose outputs are read from a lookup table where it has one."""
+
+    def __init__(self, control_system, tables):
+        self.compiled = compiled_system(control_system)
+        self.table = None
+        axes = table_axes(control_system)
+        key = table_key(control_system, axes)
+        if tables is not None and key in tables:
+            self.table = tables[key]
+            self.outputs = tables.header["tables"][key]["outputs"]
+            self.indices = [(label, {value: i for i, value in enumerate(values)}) for label, values in axes]
+
+    def evaluate(self, inputs):
+        if self.table is None:
+            return self.compiled.evaluate(inputs)
+        index = []
+        for label, positions in self.indices:
+            i = positions.get(inputs[label])
+            if i is None:
+                count("fuzzy_table_misses")
+                return self.compiled.evaluate(inputs)
+            index.append(i)
+        row = self.table[tuple(index)]
+        return {output: float(value) for output, value in zip(self.outputs, row) if not math.isnan(value)}
+
+
+@lru_cache(maxsize=None)
+def tabulated_system(control_system):
+    return TabulatedSystem(control_system, get_fuzzy_tables())
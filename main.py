@@ -1,44 +1,19 @@
 import streamlit as st
 import uuid
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import time
 from gspread.exceptions import APIError
-import base64
+from storage import get_response_store
+from constants import PIS_LINK
+from assets import show_image
+from warmup import start_warmup
+from telemetry import begin_request, finish_request
+from profiling import profile_page
 
-@st.cache_resource
-def get_questionnaire_worksheet():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds_dict = st.secrets["gcp_service_account"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
+profile_page(__file__, "consent")
+begin_request("consent")
 
-    retries = 5
-    for attempt in range(retries):
-        try:
-            sheet = client.open("Survey Responses").worksheet("Sheet1")
-            return sheet
-        except APIError as e:
-            if "Visibility check was unavailable" in str(e):
-                st.warning(f"Google API 503 error, retrying... ({attempt+1}/{retries})")
-                time.sleep(3)
-            else:
-                raise e
-
-    st.error("Failed after multiple retries.")
-    st.stop()
-
-#  Load PIS file for download
-@st.cache_resource
-def load_pis_file():
-    with open("PISPCF.pdf", "rb") as f:
-        return f.read()
-
-pis_data = load_pis_file()
-
-b64_pdf = base64.b64encode(pis_data).decode('utf-8')
-pdf_link = f'<a href="data:application/pdf;base64,{b64_pdf}" download="PISPCF.pdf">Participant Information Sheet (PDF)</a>'
+pdf_link = PIS_LINK
 
 #  Generate unique ID
 def generate_unique_id():
@@ -48,7 +23,11 @@ def generate_unique_id():
 
 st.set_page_config(page_title="Participant Information & Consent")
 
-st.image("static/headerq.png", use_container_width=True)
+# Warm the planner and document caches in the background while this visitor reads
+# the information sheet (a no-op once started, e.g. by scripts/serve.py)
+start_warmup()
+
+show_image("header", use_container_width=True)
 
 #  Project Intro 
 st.markdown(f"""
@@ -115,9 +94,15 @@ if start_clicked:
         st.session_state["consent_agreed"] = True
 
         #  Save timestamp & ID into Google Sheet as first row
-        row = [timestamp, unique_id] + [""] * 16  # total 18 columns
-        get_questionnaire_worksheet().append_row(row)
+        try:
+            get_response_store().append_consent(timestamp, unique_id)
+        except APIError:
+            st.error("Failed after multiple retries.")
+            st.stop()
 
         st.success("Consent recorded. Loading questionnaire...")
         time.sleep(0.7)
+        finish_request(unique_id=unique_id)
         st.switch_page("pages/1_questionnaire.py")
+
+finish_request()
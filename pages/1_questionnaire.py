@@ -1,10 +1,17 @@
 import streamlit as st
 from datetime import datetime
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import time
 from streamlit_sortables import sort_items
-import base64
+from storage import get_response_store
+from assets import show_image
+from telemetry import begin_request, finish_request
+from profiling import profile_page
+from constants import (
+    PIS_LINK, AGE_GROUPS, DURATIONS, PREFERENCE_CATEGORIES, PRIORITY_OPTIONS, WALKING_OPTIONS, BREAK_OPTIONS
+)
+
+profile_page(__file__, "questionnaire")
+begin_request("questionnaire")
 
 st.set_page_config(page_title="Visitor Questionnaire")
 
@@ -13,37 +20,10 @@ if "consent_submitted" not in st.session_state or not st.session_state.consent_s
     st.warning("⚠️ You must submit the consent form first.")
     st.stop()
 
-st.image("Sheffield-Hallam-University.png", width=250)
+show_image("logo", width=250)
 st.title("Visitor Questionnaire")
 
-@st.cache_resource
-def get_questionnaire_worksheet():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds_dict = st.secrets["gcp_service_account"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-
-    retries = 5
-    for attempt in range(retries):
-        try:
-            sheet = client.open("Survey Responses").worksheet("Sheet1")
-            return sheet
-        except Exception as e:
-            st.warning(f"Google API error: retrying ({attempt+1}/5)...")
-            time.sleep(3)
-    st.error("Failed to connect after multiple retries.")
-    st.stop()
-
-# Load PIS file for download
-@st.cache_resource
-def load_pis_file():
-    with open("PISPCF.pdf", "rb") as f:
-        return f.read()
-
-pis_data = load_pis_file()
-
-b64_pdf = base64.b64encode(pis_data).decode('utf-8')
-pdf_link = f'<a href="data:application/pdf;base64,{b64_pdf}" download="PISPCF.pdf">Participant Information Sheet (PDF)</a>'
+pdf_link = PIS_LINK
 
 st.markdown("""
 <div style="font-size: 16px; line-height: 1.6;">
@@ -51,7 +31,7 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-st.image("static/map.jpg", use_container_width=True)
+show_image("map", use_container_width=True)
 
 st.markdown("""
     <style>
@@ -67,7 +47,7 @@ st.markdown("""
 with st.form("questionnaire_form"):
 
     st.markdown('<div class="question-label">1. What is your age group?</div>', unsafe_allow_html=True)
-    age = st.selectbox("", ["Under 12", "13–17", "18–30", "31–45", "46–60", "60+"], key="age")
+    age = st.selectbox("", AGE_GROUPS, key="age")
 
     st.markdown('<div class="question-label">2. Do you have any accessibility needs?</div><br>', unsafe_allow_html=True)
     accessibility_required = st.radio("", ["Yes", "No"], key="accessibility_radio")
@@ -100,33 +80,19 @@ with st.form("questionnaire_form"):
     st.markdown('<div class="question-label">3. How long do you plan to stay in the park today?</div>', unsafe_allow_html=True)
     duration = st.selectbox(
         label="",
-        options=["<2 hrs", "2–4 hrs", "4–6 hrs", "All day"],
+        options=DURATIONS,
         key="duration"
     )
 
     st.markdown('<div class="question-label">4. Rank your preferences (drag to reorder)</div>', unsafe_allow_html=True)
-    initial_preferences = [
-        "Thrill rides",
-        "Family rides",
-        "Water rides",
-        "Live shows",
-        "Food & Dining",
-        "Shopping",
-        "Relaxation areas"
-    ]
+    initial_preferences = list(PREFERENCE_CATEGORIES)
     sorted_preferences = sort_items(initial_preferences, direction="vertical", key="preferences_sort")
 
     st.markdown('<div class="question-label">5. What are your top visit priorities? (Select up to 3)</div>', unsafe_allow_html=True)
 
     top_priorities = st.multiselect(
         label="",
-        options=[
-            "Enjoying high-intensity rides",
-            "Visiting family-friendly attractions together",
-            "Seeing as many attractions as possible",
-            "Staying comfortable throughout the visit",
-            "Having regular food and rest breaks"
-        ],
+        options=PRIORITY_OPTIONS,
         key="priorities"
     )
 
@@ -153,14 +119,14 @@ with st.form("questionnaire_form"):
     st.markdown('<div class="question-label">7. How far are you willing to walk between attractions?</div>', unsafe_allow_html=True)
     walking = st.radio(
         label="",
-        options=["Very short distances", "Moderate walking", "Don’t mind walking"],
+        options=WALKING_OPTIONS,
         key="walking"
     )
 
     st.markdown('<div class="question-label">8. When do you prefer to take breaks?</div>', unsafe_allow_html=True)
     break_time = st.radio(
         label="",
-        options=["After 1 hour", "After 2 hours", "After every big ride", "Flexible"],
+        options=BREAK_OPTIONS,
         key="break_time"
     )
     st.markdown(f"""
@@ -199,11 +165,7 @@ if submit:
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     unique_id = st.session_state.get("unique_id", "unknown")
 
-    sheet = get_questionnaire_worksheet()
-    cell = sheet.find(unique_id, in_column=2)
-    row_num = cell.row
-
-    update_values = [
+    update_values = (
         [age, duration, accessibility_cleaned]
         + [
             sorted_preferences.index("Thrill rides") + 1,
@@ -215,10 +177,13 @@ if submit:
             sorted_preferences.index("Relaxation areas") + 1,
         ]
         + [", ".join(top_priorities), wait_time, walking, break_time]
-    ]
+    )
 
-    sheet.update(f"C{row_num}:P{row_num}", update_values)
+    get_response_store().update_questionnaire(unique_id, update_values)
 
     st.success("Submitted! Redirecting to your personalized tour plan...")
     time.sleep(1.5)
+    finish_request(unique_id=unique_id)
     st.switch_page("pages/2_tour_plan.py")
+
+finish_request()
@@ -1,42 +1,21 @@
 # 1. Imports and Setup
 
 import streamlit as st
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
+import logging
 import time
-import math
-import numpy as np
-import skfuzzy as fuzz
-from skfuzzy import control as ctrl
 from datetime import timedelta, datetime
 
-from functools import lru_cache
+from storage import get_response_store
+from assets import show_image
+from telemetry import begin_request, count, section, finish_request
+from profiling import profile_page
 
-@lru_cache(maxsize=None)
-def get_fuzzy_weight(preference, accessibility, wait_tol, walking, priority_thrill, priority_food, priority_comfort, intensity, repeat_count):
-    weight_sim.input['preference'] = preference
-    weight_sim.input['accessibility'] = accessibility
-    weight_sim.input['wait_tolerance'] = wait_tol
-    weight_sim.input['walking'] = walking
-    weight_sim.input['priority_thrill'] = priority_thrill
-    weight_sim.input['priority_food'] = priority_food
-    weight_sim.input['priority_comfort'] = priority_comfort
-    weight_sim.input['intensity'] = intensity
-    weight_sim.input['zone_repeat_count'] = repeat_count
-    weight_sim.compute()
-    return weight_sim.output['weight']
-
-@st.cache_resource
-def get_consent_worksheet():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    creds_dict = st.secrets["gcp_service_account"]
-    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-    client = gspread.authorize(creds)
-    sheet = client.open("Survey Responses").worksheet("Sheet1")
-    return sheet
+profile_page(__file__, "tour_plan")
+begin_request("tour_plan")
+section("1_setup")
 
 st.set_page_config(page_title="Personalized Tour Plan")
-st.image("Sheffield-Hallam-University.png", width=250)
+show_image("logo", width=250)
 st.title("Your Personalized Tour Plan")
 
 # 2. Load questionnaire data from session
@@ -45,982 +24,27 @@ if "questionnaire" not in st.session_state:
     st.warning("❗ Please complete the questionnaire first.")
     st.stop()
 
-data = st.session_state["questionnaire"]
-
-preference_ranks = {
-    "thrill": data["thrill"], "family": data["family"], "water": data["water"],
-    "entertainment": data["entertainment"], "food": data["food"],
-    "shopping": data["shopping"], "relaxation": data["relaxation"]
-}
-preferences = {k: 8 - v for k, v in preference_ranks.items()}
-priorities = data["priorities"]
-walking_pref = data["walking"]
-break_pref = data["break"]
-
-# Visit duration
-duration_map = {"<2 hrs": 90, "2–4 hrs": 180, "4–6 hrs": 300, "All day": 420}
-visit_duration = duration_map.get(data["duration"], 180)
-
-# 3. Define zones and coordinates
-
-SCALE_FACTOR_METERS_PER_UNIT = 2.0  # Each grid unit is 2 meters
-
-zones = {
-    "thrill": ["Roller Coaster", "Drop Tower", "Haunted Mine Train", "Spinning Vortex", "Freefall Cannon"],
-    "water": ["Water Slide", "Lazy River", "Log Flume", "Splash Battle", "Wave Pool"],
-    "family": ["Bumper Cars", "Mini Ferris Wheel", "Animal Safari Ride", "Ball Pit Dome", "Train Adventure"],
-    "entertainment": ["Live Stage", "Street Parade", "Magic Show", "Circus Tent", "Musical Fountain"],
-    "food": ["Food Court", "Snack Bar", "Ice Cream Kiosk", "Pizza Plaza", "Smoothie Station"],
-    "shopping": ["Souvenir Shop", "Candy Store", "Photo Booth", "Gift Emporium", "Toy World"],
-    "relaxation": ["Relaxation Garden", "Shaded Benches", "Quiet Lake View", "Zen Courtyard", "Sky Deck"]
-}
-
-zone_coordinates = {
-    "thrill": (100, 400), "water": (400, 400), "family": (100, 100),
-    "entertainment": (400, 100), "food": (250, 250), "shopping": (300, 300), "relaxation": (200, 200)
-}
-
-attraction_coordinates = {}
-for zone, attractions in zones.items():
-    for idx, attraction in enumerate(attractions):
-        angle = idx * (2 * np.pi / len(attractions))  # even angle distribution
-        radius = 80  # increase for more spacing
-        offset_x = int(radius * np.cos(angle))
-        offset_y = int(radius * np.sin(angle))
-        zone_x, zone_y = zone_coordinates[zone]
-        attraction_coordinates[attraction] = (zone_x + offset_x, zone_y + offset_y)
-
-change_location = "Shower & Changing Room"
-change_coordinates = (450, 250)  
-attraction_coordinates[change_location] = change_coordinates
-
-# 4. Ride durations, wait times, and accessibility levels
-
-accessibility_factors = {
-    "thrill": 0.7, "water": 0.8, "family": 1.0,
-    "entertainment": 0.9, "food": 1.0, "shopping": 1.0, "relaxation": 1.0
-}
-
-
-CLOTHING_CHANGE_DURATION = 10 
-
-attraction_durations = {
-    # Thrill (longer ride time)
-    "Roller Coaster": 5, "Drop Tower": 3, "Haunted Mine Train": 4, "Spinning Vortex": 4, "Freefall Cannon": 3,
-
-    # Water (medium–long experience)
-    "Water Slide": 4, "Lazy River": 10, "Log Flume": 6, "Splash Battle": 5, "Wave Pool": 10,
-
-    # Family (shorter ride time)
-    "Bumper Cars": 3, "Mini Ferris Wheel": 4, "Animal Safari Ride": 6, "Ball Pit Dome": 6, "Train Adventure": 8,
-
-    # Entertainment (long shows)
-    "Live Stage": 20, "Street Parade": 15, "Magic Show": 25, "Circus Tent": 25, "Musical Fountain": 15,
-
-    # Food (time to eat)
-    "Food Court": 25, "Snack Bar": 15, "Ice Cream Kiosk": 10, "Pizza Plaza": 20, "Smoothie Station": 10,
-
-    # Shopping (quick)
-    "Souvenir Shop": 10, "Candy Store": 8, "Photo Booth": 5, "Gift Emporium": 10, "Toy World": 10,
-
-    # Relaxation (fixed)
-    "Relaxation Garden": 15, "Shaded Benches": 10, "Quiet Lake View": 10, "Zen Courtyard": 10, "Sky Deck": 10
-}
-
-attraction_wait_times = {
-    # Thrill (very popular)
-    "Roller Coaster": 30, "Drop Tower": 25, "Haunted Mine Train": 20, "Spinning Vortex": 18, "Freefall Cannon": 20,
-
-    # Water (popular on hot days)
-    "Water Slide": 15, "Lazy River": 10, "Log Flume": 20, "Splash Battle": 12, "Wave Pool": 15,
-
-    # Family (shorter queues)
-    "Bumper Cars": 5, "Mini Ferris Wheel": 5, "Animal Safari Ride": 8, "Ball Pit Dome": 6, "Train Adventure": 8,
-
-    # Entertainment (seating based, fixed wait)
-    "Live Stage": 10, "Street Parade": 5, "Magic Show": 10, "Circus Tent": 10, "Musical Fountain": 5,
-
-    # Food (variable)
-    "Food Court": 10, "Snack Bar": 5, "Ice Cream Kiosk": 4, "Pizza Plaza": 8, "Smoothie Station": 4,
-
-    # Shopping (minimal)
-    "Souvenir Shop": 3, "Candy Store": 2, "Photo Booth": 1, "Gift Emporium": 3, "Toy World": 3,
-
-    # Relaxation (no wait)
-    "Relaxation Garden": 0, "Shaded Benches": 0, "Quiet Lake View": 0, "Zen Courtyard": 0, "Sky Deck": 0
-}
-
-# Intensity used later for energy logic and pacing
-zone_intensity = {
-    "thrill": 0.95,         # High energy demand (e.g. roller coasters)
-    "water": 0.75,          # Swimming or flume-based attractions
-    "family": 0.55,         # Interactive but moderate exertion
-    "entertainment": 0.35,  # Low exertion, seated shows
-    "food": 0.15,           # Resting and eating
-    "shopping": 0.25,       # Low walking activity
-    "relaxation": 0.1       # Passive resting (benches, gardens)
-}
-
-wet_ride_names = {"Water Slide", "Wave Pool", "Splash Battle"}
-
-# 5A. Fuzzy inputs (user traits and ride traits)
-
-preference_input     = ctrl.Antecedent(np.arange(0, 11, 1), 'preference')        # 0–10: how much user likes the zone
-accessibility_input  = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'accessibility') # 0–1: ease of access
-wait_tolerance       = ctrl.Antecedent(np.arange(0, 1.1, 0.1), 'wait_tolerance')  # 0–1: patience for waiting
-walking_input        = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'walking')       # 0–1: walking comfort
-
-priority_thrill      = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_thrill')
-priority_food        = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_food')
-priority_comfort     = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_comfort')
-
-intensity_input      = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'intensity')
-
-weight_output        = ctrl.Consequent(np.arange(0, 11, 1), 'weight')
-
-zone_repeat_count = ctrl.Antecedent(np.arange(0, 4, 1), 'zone_repeat_count') 
-
-food_interval = ctrl.Consequent(np.arange(60, 241, 1), 'food_interval')
-
-
-# 5B. Membership functions
-
-# Preference score from 0–10
-preference_input['low'] = fuzz.trimf(preference_input.universe, [0, 0, 5])
-preference_input['medium'] = fuzz.trimf(preference_input.universe, [2, 5, 8])
-preference_input['high'] = fuzz.trimf(preference_input.universe, [5, 10, 10])
-
-# Accessibility of the zone (0 = difficult, 1 = easy)
-accessibility_input['poor'] = fuzz.trimf(accessibility_input.universe, [0.0, 0.0, 0.5])
-accessibility_input['moderate'] = fuzz.trimf(accessibility_input.universe, [0.2, 0.5, 0.8])
-accessibility_input['good'] = fuzz.trimf(accessibility_input.universe, [0.5, 1.0, 1.0])
-
-# User’s wait tolerance
-wait_tolerance['low'] = fuzz.trimf(wait_tolerance.universe, [0.0, 0.0, 0.4])
-wait_tolerance['medium'] = fuzz.trimf(wait_tolerance.universe, [0.2, 0.5, 0.8])
-wait_tolerance['high'] = fuzz.trimf(wait_tolerance.universe, [0.6, 1.0, 1.0])
-
-# User’s walking tolerance
-walking_input['short'] = fuzz.trimf(walking_input.universe, [0.0, 0.0, 0.4])
-walking_input['medium'] = fuzz.trimf(walking_input.universe, [0.2, 0.5, 0.8])
-walking_input['long'] = fuzz.trimf(walking_input.universe, [0.6, 1.0, 1.0])
-
-# User priorities: thrill, food, comfort
-for priority in [priority_thrill, priority_food, priority_comfort]:
-    priority['no'] = fuzz.trimf(priority.universe, [0, 0, 1])
-    priority['yes'] = fuzz.trimf(priority.universe, [0, 1, 1])
-
-# Ride intensity (by zone)
-intensity_input['low'] = fuzz.trimf(intensity_input.universe, [0.0, 0.0, 0.4])
-intensity_input['medium'] = fuzz.trimf(intensity_input.universe, [0.3, 0.5, 0.7])
-intensity_input['high'] = fuzz.trimf(intensity_input.universe, [0.6, 1.0, 1.0])
-
-# Final weight score for each zone (0–10)
-weight_output['low'] = fuzz.trimf(weight_output.universe, [0, 0, 4])
-weight_output['medium'] = fuzz.trimf(weight_output.universe, [3, 5, 7])
-weight_output['high'] = fuzz.trimf(weight_output.universe, [6, 10, 10])
-
-food_interval['short'] = fuzz.trimf(food_interval.universe, [60, 90, 120])
-food_interval['medium'] = fuzz.trimf(food_interval.universe, [100, 135, 170])
-food_interval['long'] = fuzz.trimf(food_interval.universe, [160, 240, 240])
-
-zone_repeat_count['none'] = fuzz.trimf(zone_repeat_count.universe, [0, 0, 1])
-zone_repeat_count['few'] = fuzz.trimf(zone_repeat_count.universe, [0, 1, 2])
-zone_repeat_count['many'] = fuzz.trimf(zone_repeat_count.universe, [1, 3, 3])
-
-# 5C. Fuzzy Rules: Inputs → Weight Output
-
-top_zone = max(preferences, key=preferences.get)
-
-rules = []
-
-
-# I. Core Logic: Preference × Accessibility
-rules += [
-    ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high']),
-    ctrl.Rule(preference_input['high'] & accessibility_input['moderate'], weight_output['medium']),
-    ctrl.Rule(preference_input['high'] & accessibility_input['poor'], weight_output['medium']),
-
-    ctrl.Rule(preference_input['medium'] & accessibility_input['good'], weight_output['medium']),
-    ctrl.Rule(preference_input['medium'] & accessibility_input['moderate'], weight_output['medium']),
-    ctrl.Rule(preference_input['medium'] & accessibility_input['poor'], weight_output['low']),
-
-    ctrl.Rule(preference_input['low'], weight_output['low']),
-]
-
-# II. User Profile Traits: Walk & Wait Tolerance
-rules += [
-    ctrl.Rule(wait_tolerance['low'], weight_output['low']),
-    ctrl.Rule(wait_tolerance['high'], weight_output['high']),
-    ctrl.Rule(walking_input['short'], weight_output['low']),
-    ctrl.Rule(walking_input['long'], weight_output['high']),
-]
-
-# III. User Declared Priorities
-rules += [
-    ctrl.Rule(priority_thrill['yes'], weight_output['high']),
-    ctrl.Rule(priority_food['yes'], weight_output['medium']),
-    ctrl.Rule(priority_comfort['yes'], weight_output['medium']),
-]
-
-# IV. Intensity Adjustment
-rules += [
-    ctrl.Rule(intensity_input['high'] & preference_input['high'], weight_output['medium']),
-    ctrl.Rule(intensity_input['high'] & preference_input['low'], weight_output['low']),
-    ctrl.Rule(intensity_input['low'], weight_output['medium']),
-]
-
-rules += [
-    ctrl.Rule(zone_repeat_count['many'], weight_output['low']),
-    ctrl.Rule(zone_repeat_count['few'], weight_output['medium']),
-    ctrl.Rule(zone_repeat_count['none'], weight_output['high']),
-]
-
-# V. Top-Zone Reinforcement
-
-reinforcement_rules = []
-if top_zone == "thrill":
-    reinforcement_rules += [
-        ctrl.Rule(preference_input['high'] & priority_thrill['yes'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & wait_tolerance['medium'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & walking_input['medium'], weight_output['high'])
-    ]
-elif top_zone == "family":
-    reinforcement_rules += [
-        ctrl.Rule(preference_input['high'] & walking_input['short'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
-    ]
-elif top_zone == "water":
-    reinforcement_rules += [
-        ctrl.Rule(preference_input['high'] & wait_tolerance['high'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & walking_input['medium'], weight_output['high'])
-    ]
-elif top_zone == "entertainment":
-    reinforcement_rules += [
-        ctrl.Rule(preference_input['high'] & wait_tolerance['medium'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
-    ]
-elif top_zone == "shopping":
-    reinforcement_rules += [
-        ctrl.Rule(preference_input['high'] & walking_input['short'], weight_output['high']),
-        ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
-    ]
-
-rules += reinforcement_rules
-
-# 5D. Fuzzy Subsystem: Food Interval Estimation
-
-food_interval_rules = [
-    ctrl.Rule(preference_input['high'] & priority_food['yes'], food_interval['short']),
-    ctrl.Rule(preference_input['medium'] & priority_food['yes'], food_interval['medium']),
-    ctrl.Rule(preference_input['low'] | priority_food['no'], food_interval['long']),
-]
-
-food_interval_ctrl = ctrl.ControlSystem(food_interval_rules)
-food_interval_sim = ctrl.ControlSystemSimulation(food_interval_ctrl)
-
-# 5E. Fuzzy Rules: Energy Loss Estimation
-
-# Input: Ride intensity, walking time, age sensitivity
-intensity_input_energy = ctrl.Antecedent(np.arange(0, 1.1, 0.1), 'intensity')
-walk_time_input = ctrl.Antecedent(np.arange(0, 16, 1), 'walk_time')  # up to 15 minutes walk
-age_sensitivity_input = ctrl.Antecedent(np.arange(0.8, 1.4, 0.1), 'age_sensitivity')
-
-# Output: Energy lost per stop
-energy_loss_output = ctrl.Consequent(np.arange(0, 21, 1), 'energy_loss')  # 0–20 points per stop
-
-# Membership functions
-intensity_input_energy['low'] = fuzz.trimf(intensity_input_energy.universe, [0.0, 0.0, 0.4])
-intensity_input_energy['medium'] = fuzz.trimf(intensity_input_energy.universe, [0.3, 0.5, 0.7])
-intensity_input_energy['high'] = fuzz.trimf(intensity_input_energy.universe, [0.6, 1.0, 1.0])
-
-walk_time_input['short'] = fuzz.trimf(walk_time_input.universe, [0, 0, 5])
-walk_time_input['medium'] = fuzz.trimf(walk_time_input.universe, [3, 7, 11])
-walk_time_input['long'] = fuzz.trimf(walk_time_input.universe, [10, 15, 15])
-
-age_sensitivity_input['low'] = fuzz.trimf(age_sensitivity_input.universe, [0.8, 0.8, 1.0])
-age_sensitivity_input['medium'] = fuzz.trimf(age_sensitivity_input.universe, [0.9, 1.1, 1.2])
-age_sensitivity_input['high'] = fuzz.trimf(age_sensitivity_input.universe, [1.1, 1.3, 1.4])
-
-energy_loss_output['low'] = fuzz.trimf(energy_loss_output.universe, [0, 0, 8])
-energy_loss_output['medium'] = fuzz.trimf(energy_loss_output.universe, [5, 10, 15])
-energy_loss_output['high'] = fuzz.trimf(energy_loss_output.universe, [12, 20, 20])
-
-# Rules
-energy_loss_rules = [
-    ctrl.Rule(intensity_input_energy['high'] & walk_time_input['long'] & age_sensitivity_input['high'], energy_loss_output['high']),
-    ctrl.Rule(intensity_input_energy['high'] & walk_time_input['medium'], energy_loss_output['medium']),
-    ctrl.Rule(intensity_input_energy['medium'] & walk_time_input['medium'], energy_loss_output['medium']),
-    ctrl.Rule(intensity_input_energy['low'] & walk_time_input['short'], energy_loss_output['low']),
-    ctrl.Rule(age_sensitivity_input['low'] & intensity_input_energy['low'], energy_loss_output['low']),
-    ctrl.Rule(intensity_input_energy['medium'] & walk_time_input['long'], energy_loss_output['high']),
-    ctrl.Rule(walk_time_input['long'] & age_sensitivity_input['high'], energy_loss_output['high']),
-    ctrl.Rule(intensity_input_energy['high'] & age_sensitivity_input['low'], energy_loss_output['medium']),
-]
-
-energy_loss_ctrl = ctrl.ControlSystem(energy_loss_rules)
-energy_loss_sim = ctrl.ControlSystemSimulation(energy_loss_ctrl)
-
-
-# 5F. Fuzzy Controller Setup and User Mappings
-
-weight_ctrl = ctrl.ControlSystem(rules)
-weight_sim = ctrl.ControlSystemSimulation(weight_ctrl)
-
-# Priority flags
-priority_thrill_val = 1.0 if "Enjoying high-intensity rides" in priorities else 0.0
-priority_food_val = 1.0 if "Having regular food and rest breaks" in priorities else 0.0
-priority_comfort_val = 1.0 if "Staying comfortable throughout the visit" in priorities else 0.0
-
-# Map walking preference to value
-walking_map = {
-    "Very short distances": 0.0,
-    "Moderate walking": 0.5,
-    "Don’t mind walking": 1.0
-}
-walking_val = walking_map.get(walking_pref, 0.5)
-
-# Map wait tolerance to value
-wait_map = {
-    "<10 min": 0.0,
-    "10–20 min": 0.3,
-    "20–30 min": 0.6,
-    "30+ min": 1.0
-}
-wait_val = wait_map.get(data["wait_time"], 0.5)
-
-age_energy_scaling = {
-    "Child":        {"loss_factor": 0.8, "rest_boost": 35, "food_boost": 20},
-    "Teen":         {"loss_factor": 1.0, "rest_boost": 30, "food_boost": 18},
-    "Young Adult":  {"loss_factor": 1.2, "rest_boost": 25, "food_boost": 15},
-    "Middle-aged":  {"loss_factor": 1.0, "rest_boost": 30, "food_boost": 18},
-    "Older Adult":  {"loss_factor": 1.3, "rest_boost": 40, "food_boost": 25},
-    "Adult":        {"loss_factor": 1.1, "rest_boost": 30, "food_boost": 18}, 
-}
-
-raw_age = data.get("age", "Adult")
-
-age_group_map = {
-    "Under 12": "Child",
-    "13–17": "Teen",
-    "18–30": "Young Adult",
-    "31–45": "Middle-aged",
-    "46–60": "Middle-aged",
-    "60+":    "Older Adult"
-}
-
-user_age_group = age_group_map.get(raw_age, "Adult")
-energy_settings = age_energy_scaling[user_age_group]
-
-def compute_energy_loss(intensity, walk_time, age_factor):
-    try:
-        # Clamp to valid fuzzy input ranges
-        intensity = min(max(intensity, 0.0), 1.0)
-        walk_time = min(max(walk_time, 0), 15)
-        age_factor = min(max(age_factor, 0.8), 1.4)
-
-        energy_loss_sim.input['intensity'] = intensity
-        energy_loss_sim.input['walk_time'] = walk_time
-        energy_loss_sim.input['age_sensitivity'] = age_factor
-        energy_loss_sim.compute()
-
-        return energy_loss_sim.output['energy_loss']
-    except Exception as e:
-        print(f" Energy loss fallback due to: {e}")
-        return 8  # Safe default
-
-# 6. Fuzzy Weight Evaluation and Zone Scoring
-
-zone_weights = {}
-
-for zone in zones:
-    pref = preferences[zone]
-    acc = accessibility_factors[zone]
-    intensity = zone_intensity[zone]
-
-    repeat_count = 0  # Fallback for now unless using real sequencing context
-
-    weight_sim.input['preference'] = pref
-    weight_sim.input['accessibility'] = acc
-    weight_sim.input['wait_tolerance'] = wait_val
-    weight_sim.input['walking'] = walking_val
-    weight_sim.input['priority_thrill'] = 1.0 if zone == "thrill" and priority_thrill_val else 0.0
-    weight_sim.input['priority_food'] = 1.0 if zone == "food" and priority_food_val else 0.0
-    weight_sim.input['priority_comfort'] = 1.0 if zone == "relaxation" and priority_comfort_val else 0.0
-    weight_sim.input['intensity'] = intensity
-    weight_sim.input['zone_repeat_count'] = repeat_count
-
-    weight_sim.compute()
-    zone_weights[zone] = weight_sim.output['weight']
-        
-for zone in ["food", "relaxation"]:
-    if zone in zone_weights:
-        zone_weights[zone] = min(zone_weights[zone], 4.5)  # limit to moderate level
-
-total_weight = sum(zone_weights.values())
-if total_weight > 0:
-    normalized_weights = {z: w / total_weight for z, w in zone_weights.items()}
-else:
-    normalized_weights = {z: 1 / len(zone_weights) for z in zone_weights} 
-
-# Remove intense rides for children
-if data["age"] == "Under 12":
-    intense_rides = {"Roller Coaster", "Drop Tower", "Freefall Cannon", "Spinning Vortex"}
-    for ride in intense_rides:
-        for zone_list in zones.values():
-            if ride in zone_list:
-                zone_list.remove(ride)
-
-# 7. Attraction Scoring Based on Zone Weights + Rhythm
-
-
-WAIT_PENALTY_FACTOR = 0.02     
-INTENSITY_COMFORT_FACTOR = 0.2
-
-attraction_scores = {}
-recent_zones = []
-
-if 'wet_time_pct' not in globals() or wet_time_pct is None:
-    wet_time_pct = 50
-    
-for zone in ["thrill", "water", "family", "entertainment", "shopping"]:
-    attractions = zones[zone]
-    for attraction in attractions:
-        wait_time = attraction_wait_times.get(attraction, 0)
-        duration = attraction_durations.get(attraction, 5)
-        intensity = zone_intensity.get(zone, 0.5)
-        acc = accessibility_factors.get(zone, 1.0)
-        pref = preferences.get(zone, 5)
-        user_pref = pref / 10.0
-        is_wet = attraction in wet_ride_names
-
-        wet_time_threshold = wet_time_pct
-        comfort_penalty = 1.0
-        if is_wet and priority_comfort_val and wet_time_threshold < 35:
-            comfort_penalty = 0.7
-
-        repeat_count = recent_zones.count(zone)
-        repeat_count = min(repeat_count, 3)
-
-        fuzzy_weight = get_fuzzy_weight(
-            pref, acc, wait_val, walking_val,
-            1.0 if zone == "thrill" and priority_thrill_val else 0.0,
-            1.0 if zone == "food" and priority_food_val else 0.0,
-            1.0 if zone == "relaxation" and priority_comfort_val else 0.0,
-            intensity, repeat_count
-        )
-
-        score = (
-            fuzzy_weight *
-            user_pref *
-            (1 - WAIT_PENALTY_FACTOR * wait_time) *
-            (1 + INTENSITY_COMFORT_FACTOR * (1 - intensity)) *
-            comfort_penalty
-        )
-
-        attraction_scores[attraction] = score
-        recent_zones.append(zone)
-        if len(recent_zones) > 4:
-            recent_zones.pop(0)
-
-sorted_attractions = sorted(
-    attraction_scores, 
-    key=lambda a: attraction_scores[a], 
-    reverse=True
+# Heavy imports are deferred until the session check passes, so redirected
+# visitors never pay for loading scikit-fuzzy
+from planner import (
+    zones, attraction_durations, attraction_wait_times, attraction_coordinates,
+    calculate_distance, SCALE_FACTOR_METERS_PER_UNIT, CLOTHING_CHANGE_DURATION
 )
+from energy_chart import downsample_energy, show_energy_chart
+from plan_pool import plan_visit
+from plan_format import PlanStop, encode_plan, render_text, stop_lines
 
-initial_attractions = [
-    a for a in sorted_attractions
-    if not any(a in zones[z] for z in ["food", "relaxation"])
-]
-
-
-# 8. Smart Initial Attraction Selection with Rhythm
-
-initial_attractions = []
-time_budget = visit_duration + 15
-current_time_used = 0
-recent_zones = []
-
-# Sort attractions by fuzzy-enhanced score (high to low)
-ranked_attractions = sorted(attraction_scores, key=lambda a: attraction_scores[a], reverse=True)
-
-for attraction in ranked_attractions:
-    zone = next((z for z, a_list in zones.items() if attraction in a_list), None)
-    if not zone:
-        continue
-
-    ride_time = attraction_durations.get(attraction, 0)
-    wait_time = attraction_wait_times.get(attraction, 0)
-    time_required = ride_time + wait_time
-
-    if current_time_used + time_required > time_budget:
-        continue
-
-    if recent_zones[-2:] == [zone, zone]:
-        continue
-
-    initial_attractions.append(attraction)
-    current_time_used += time_required
-    recent_zones.append(zone)
-
-    if len(recent_zones) > 4:
-        recent_zones.pop(0)
-
-
-# 9. Route Optimization and Wet Ride Scheduling
-
-
-def nearest_relaxation_spot(from_attraction):
-    last_loc = attraction_coordinates[from_attraction]
-    return min(
-        zones["relaxation"],
-        key=lambda spot: calculate_distance(last_loc, attraction_coordinates[spot])
-    )
-
-# 9A. Route Distance Functions
-
-def calculate_distance(point_a, point_b):
-    if isinstance(point_a, str):
-        point_a = attraction_coordinates[point_a]
-    if isinstance(point_b, str):
-        point_b = attraction_coordinates[point_b]
-    x1, y1 = point_a
-    x2, y2 = point_b
-    return math.hypot(x2 - x1, y2 - y1)
-
-def reorder_by_distance(route, start_location=(0, 0)):
-    reordered = []
-    current = start_location
-    remaining = [r for r in route if r in attraction_coordinates]
-
-    while remaining:
-        next_stop = min(remaining, key=lambda r: calculate_distance(current, attraction_coordinates[r]))
-        reordered.append(next_stop)
-        current = attraction_coordinates[next_stop]
-        remaining.remove(next_stop)
-
-    return reordered
-
-def greedy_route(attractions, start_with=None):
-    route = []
-    pool = attractions.copy()
-
-    if start_with and start_with in pool:
-        route.append(start_with)
-        current = attraction_coordinates[start_with]
-        pool.remove(start_with)
-    else:
-        current = (0, 0)  # Default: Entrance
-
-    while pool:
-        next_attraction = min(pool, key=lambda a: calculate_distance(current, attraction_coordinates[a]))
-        route.append(next_attraction)
-        current = attraction_coordinates[next_attraction]
-        pool.remove(next_attraction)
-
-    return route
-    
-first_preference_zone = max(preferences, key=preferences.get)
-first_pref_attraction = None
-
-for a in zones[first_preference_zone]:
-    if a in initial_attractions:
-        first_pref_attraction = a
-        break
-
-# 9B. Wet Ride Timing: Fuzzy Control Setup (robust to missing outputs)
-
-
-wet_ride_pref = ctrl.Antecedent(np.arange(0, 11, 1), 'wet_ride_pref')  
-comfort_priority = ctrl.Antecedent(np.arange(0, 2, 1), 'comfort_priority') 
-
-wet_time_position = ctrl.Consequent(np.arange(0, 101, 1), 'wet_time_position')  
-
-wet_ride_pref['low'] = fuzz.trimf(wet_ride_pref.universe, [0, 0, 5])
-wet_ride_pref['medium'] = fuzz.trimf(wet_ride_pref.universe, [3, 5, 7])
-wet_ride_pref['high'] = fuzz.trimf(wet_ride_pref.universe, [5, 10, 10])
-
-comfort_priority['no'] = fuzz.trimf(comfort_priority.universe, [0, 0, 1])
-comfort_priority['yes'] = fuzz.trimf(comfort_priority.universe, [0, 1, 1])
-
-wet_time_position['early'] = fuzz.trimf(wet_time_position.universe, [0, 0, 30])
-wet_time_position['mid']   = fuzz.trimf(wet_time_position.universe, [25, 50, 75])
-wet_time_position['late']  = fuzz.trimf(wet_time_position.universe, [70, 100, 100])
-
-wet_ride_rules = [
-    ctrl.Rule(wet_ride_pref['high'] & comfort_priority['no'], wet_time_position['early']),
-    ctrl.Rule(wet_ride_pref['medium'],                         wet_time_position['mid']),
-    ctrl.Rule(comfort_priority['yes'],                         wet_time_position['late']),
-]
-
-wet_time_ctrl = ctrl.ControlSystem(wet_ride_rules)
-wet_time_sim = ctrl.ControlSystemSimulation(wet_time_ctrl)
-
-def safe_compute_wet_time_pct(wet_pref_val: float, comfort_flag: bool, default_pct: float = 50.0) -> float:
-
-    try:
-        wet_val = float(np.clip(wet_pref_val, wet_ride_pref.universe.min(), wet_ride_pref.universe.max()))
-        comfort_val = 1.0 if comfort_flag else 0.0
-
-        wet_time_sim.input['wet_ride_pref'] = wet_val
-        wet_time_sim.input['comfort_priority'] = comfort_val
-        wet_time_sim.compute()
-
-        pct = float(wet_time_sim.output.get('wet_time_position', default_pct))
-        if math.isnan(pct):
-            return default_pct
-        return float(np.clip(pct, 0.0, 100.0))
-    except Exception as e:
-
-        return default_pct
-
-wet_pref_val = preferences.get("water", 5)
-wet_time_pct = safe_compute_wet_time_pct(wet_pref_val, bool(priority_comfort_val))
-
-
-def schedule_wet_rides_midday(route, wet_rides, zones):
-
-    wet_block = [a for a in route if a in wet_rides]
-    dry_block = [a for a in route if a not in wet_rides and not a.startswith("[Clothing Change]")]
-
-    if not wet_block:
-        return route
-
-    # Insert clothing change after wet rides
-    change_stop = "[Clothing Change] Shower & Changing Room"
-    if change_stop not in wet_block and change_stop not in dry_block:
-        wet_block.append(change_stop)
-
-    # Insert wet block into middle of dry block
-    insert_pos = int((wet_time_pct / 100) * len(dry_block))
-    insert_pos = min(max(1, insert_pos), len(dry_block)-1)
-    merged = dry_block[:insert_pos] + wet_block + dry_block[insert_pos:]
-
-    last_wet_idx = merged.index(wet_block[-1])
-    after_wet = merged[last_wet_idx + 1:]
-
-    fillers = [a for a in after_wet if any(a in zones[z] for z in ["family", "entertainment"])]
-    filler_count = 2 if len(fillers) >= 2 else 1 if fillers else 0
-    selected_fillers = fillers[:filler_count]
-
-    merged = [a for a in merged if a not in selected_fillers]
-
-    insert_pos = merged.index(wet_block[-1]) + 1
-    merged = merged[:insert_pos] + selected_fillers + merged[insert_pos:]
-
-    return merged
-    
-# 10. Food Timing Estimation (Fuzzy)
-
-
-food_pref = preferences["food"]
-
-food_interval_sim.input['preference'] = food_pref
-food_interval_sim.input['priority_food'] = priority_food_val
-food_interval_sim.compute()
-
-preferred_food_gap = int(np.clip(food_interval_sim.output['food_interval'], 60, 240))  # cap between 1h and 4h
-
-
-# 11. Final Route Cleanup (No Consecutive Breaks)
-
-
-def no_consecutive_food_or_break(route, zones):
-
-    def is_soft(stop):
-        zone = next((z for z, a in zones.items() if stop in a), None)
-        return zone in {"food", "relaxation"}
-
-    result = []
-    i = 0
-    while i < len(route):
-        current_stop = route[i]
-        result.append(current_stop)
-
-        # Check next stop
-        if i + 1 < len(route):
-            next_stop = route[i + 1]
-
-            if is_soft(current_stop) and is_soft(next_stop):
-                # Look ahead for next non-soft to swap
-                swap_idx = i + 2
-                while swap_idx < len(route):
-                    if not is_soft(route[swap_idx]):
-                        # Swap next_stop with this
-                        route[i + 1], route[swap_idx] = route[swap_idx], route[i + 1]
-                        break
-                    swap_idx += 1
-
-        i += 1
-
-    return route
-    
-# 12. Break and Meal Insertion Logic
-
-def reorder_medium_intensity(route):
-    medium_stops = []
-    other_stops = []
-
-    for stop in route:
-        zone = next((z for z, a in zones.items() if stop in a), None)
-        if zone is None:
-            other_stops.append(stop)
-            continue
-
-        intensity = zone_intensity.get(zone, 0)
-        if 0.3 <= intensity <= 0.7:
-            medium_stops.append(stop)
-        else:
-            other_stops.append(stop)
-
-    reordered = []
-    m_idx = 0
-    for i, stop in enumerate(other_stops):
-        reordered.append(stop)
-        if i % 2 == 1 and m_idx < len(medium_stops):
-            reordered.append(medium_stops[m_idx])
-            m_idx += 1
-    reordered += medium_stops[m_idx:]
-    return reordered
-
-
-
-walking_speed = 67  # meters/min
-
-def insert_breaks(route):
-    updated = []
-    elapsed_since_break = 0
-    elapsed_since_food = 0
-    meal_activity_counter = 0
-    last_break_time = -999
-    last_meal_time = -999
-    total_elapsed_time = 0
-    energy_level = 100
-    current_location = (0, 0)
-
-    used_break_spots = set()
-    used_food_spots = set()
-    meal_break_count = 0
-    max_meals = 2
-
-    MIN_FOOD_GAP_MINUTES = 180
-    MIN_FOOD_GAP_ACTIVITIES = 3
-    MIN_BREAK_FOOD_SPACING = 30
-    WALKING_SPEED = 50
-
-    start_time_clock = datetime.strptime("10:00", "%H:%M")
-
-    activities_since_last_meal = 0
-
-    wet_start = None
-    wet_end = None
-    for i, stop in enumerate(route):
-        if stop in wet_ride_names or stop.startswith("[Clothing Change]"):
-            if wet_start is None:
-                wet_start = i
-            wet_end = i
-
-    for i, stop in enumerate(route):
-        in_wet_block = wet_start is not None and wet_start <= i <= wet_end
-        updated.append(stop)
-
-        zone = next((z for z, a in zones.items() if stop in a), None)
-        if zone is None:
-            continue
-
-        duration = attraction_durations.get(stop, 5)
-        wait = attraction_wait_times.get(stop, 0)
-        walk_dist_units = calculate_distance(current_location, attraction_coordinates[stop])
-        walk_dist_meters = walk_dist_units * SCALE_FACTOR_METERS_PER_UNIT
-        walk_time = max(2, round(walk_dist_meters / WALKING_SPEED))
-
-        total_this_stop = duration + wait + walk_time
-        current_clock = start_time_clock + timedelta(minutes=total_elapsed_time)
-
-        total_elapsed_time += total_this_stop
-        elapsed_since_break += total_this_stop
-        elapsed_since_food += total_this_stop
-        meal_activity_counter += 1
-
-        is_soft = zone in ["food", "relaxation"]
-        if not is_soft:
-            activities_since_last_meal += 1
-
-        intensity_val = zone_intensity.get(zone, 1.0)
-        age_sens = energy_settings['loss_factor']
-        energy_loss = compute_energy_loss(intensity_val, walk_time, age_sens)
-        energy_level = max(0, energy_level - energy_loss)
-
-        if in_wet_block:
-            current_location = attraction_coordinates[stop]
-            continue
-
-        # REST INSERTION - Flexible 
-        if (
-            break_pref == "Flexible"
-            and energy_level < 20
-            and elapsed_since_break > 10
-            and (total_elapsed_time - last_break_time) > MIN_BREAK_FOOD_SPACING
-            and zone not in ["relaxation", "food"]
-        ):
-            relax_options = [s for s in zones["relaxation"] if s not in used_break_spots and s not in updated]
-            if relax_options:
-                best_relax = min(relax_options, key=lambda s: calculate_distance(attraction_coordinates[stop], attraction_coordinates[s]))
-                updated.append(best_relax)
-                used_break_spots.add(best_relax)
-                elapsed_since_break = 0
-                energy_level = min(100, energy_level + energy_settings['rest_boost'])
-                last_break_time = total_elapsed_time
-                activities_since_last_meal = 0
-
-
-        # REST INSERTION - Scheduled 
-        needs_break = (
-            (break_pref == "After 1 hour" and elapsed_since_break >= 60) or
-            (break_pref == "After 2 hours" and elapsed_since_break >= 120) or
-            (break_pref == "After every big ride" and stop in {"Roller Coaster", "Drop Tower", "Log Flume", "Water Slide"})
-        )
-
-        if (
-            needs_break
-            and energy_level >= 20
-            and (total_elapsed_time - last_break_time) > MIN_BREAK_FOOD_SPACING
-            and zone not in ["relaxation", "food"]
-            and activities_since_last_meal >= 2
-        ):
-            relax_options = [s for s in zones["relaxation"] if s not in used_break_spots and s not in updated]
-            if relax_options:
-                best_relax = min(relax_options, key=lambda s: calculate_distance(attraction_coordinates[stop], attraction_coordinates[s]))
-                updated.append(best_relax)
-                used_break_spots.add(best_relax)
-                elapsed_since_break = 0
-                energy_level = min(100, energy_level + energy_settings['rest_boost'])
-                last_break_time = total_elapsed_time
-                activities_since_last_meal = 0
-
-        # MEAL INSERTION
-        can_add_meal_now = (elapsed_since_food >= MIN_FOOD_GAP_MINUTES)
-        min_elapsed_to_allow_meal = 120
-        can_schedule_meal_time = total_elapsed_time >= min_elapsed_to_allow_meal
-
-        if (
-            can_schedule_meal_time
-            and can_add_meal_now
-            and meal_activity_counter >= MIN_FOOD_GAP_ACTIVITIES
-            and meal_break_count < max_meals
-            and zone not in ["relaxation", "food"]
-            and (last_break_time == -999 or total_elapsed_time - last_break_time >= MIN_BREAK_FOOD_SPACING)
-            and (last_meal_time == -999 or total_elapsed_time - last_meal_time >= MIN_BREAK_FOOD_SPACING)
-        ):
-            food_options = [f for f in zones["food"] if f not in used_food_spots and f not in updated]
-            if food_options:
-                best_food = min(food_options, key=lambda f: calculate_distance(attraction_coordinates[stop], attraction_coordinates[f]))
-                updated.append(best_food)
-                used_food_spots.add(best_food)
-                elapsed_since_food = 0
-                meal_activity_counter = 0
-                meal_break_count += 1
-                last_meal_time = total_elapsed_time
-                energy_level = min(100, energy_level + energy_settings['food_boost'])
-                activities_since_last_meal = 0
-
-        current_location = attraction_coordinates[stop]
-
-    while updated:
-        zone = next((z for z, a in zones.items() if updated[-1] in a), None)
-        if zone in ["food", "relaxation"]:
-            updated.pop()
-        else:
-            break
-    
-    return updated
-
-    
-def move_meals_after_two_hours(route, min_elapsed=120):
-
-    meals_to_shift = []
-    before_limit = []
-    after_limit = []
-
-    total_time = 0
-    previous_location = (0, 0)
-
-    for stop in route:
-        if stop.startswith("[Clothing Change]"):
-            total_time += CLOTHING_CHANGE_DURATION
-            target_list = after_limit if total_time >= min_elapsed else before_limit
-            target_list.append(stop)
-            continue
-
-        zone = next((z for z, a in zones.items() if stop in a), None)
-        if zone is None:
-            total_time += 5
-            target_list = after_limit if total_time >= min_elapsed else before_limit
-            target_list.append(stop)
-            continue
-
-        duration = attraction_durations.get(stop, 5)
-        wait = attraction_wait_times.get(stop, 0)
-        walk_dist_units = calculate_distance(previous_location, attraction_coordinates[stop])
-        walk_dist_meters = walk_dist_units * SCALE_FACTOR_METERS_PER_UNIT
-        walk_time = max(2, round(walk_dist_meters / 50))
-
-        total_this_stop = duration + wait + walk_time
-
-        if zone == "food":
-            # Always shift meals out
-            meals_to_shift.append(stop)
-        else:
-            if total_time >= min_elapsed:
-                after_limit.append(stop)
-            else:
-                before_limit.append(stop)
-
-        total_time += total_this_stop
-        previous_location = attraction_coordinates[stop]
-
-    final_route = before_limit
-    final_route.extend(meals_to_shift)
-    final_route.extend(after_limit)
-
-    return final_route
-    
-
-def enforce_max_two_meals(route):
-    cleaned = []
-    food_count = 0
-    food_seen = set()
-
-    for stop in route:
-        zone = next((z for z, a in zones.items() if stop in a), None)
-        if zone == "food":
-            if stop not in food_seen and food_count < 2:
-                cleaned.append(stop)
-                food_seen.add(stop)
-                food_count += 1
-            # else skip duplicate
-        else:
-            cleaned.append(stop)
-    return cleaned
-
+data = st.session_state["questionnaire"]
 
-# 13. Final Route Optimization and Tweaks
+# 3. Plan the visit (planner.py)
 
-def remove_trailing_breaks(route):
-    while route:
-        zone = next((z for z, a in zones.items() if route[-1] in a), None)
-        if zone in ["food", "relaxation"]:
-            route.pop()
-        else:
-            break
-    return route
-    
+section("3_planning")
+plan, fallback = plan_visit(data)
+if fallback == "default":
+    st.info("ℹ️ We're planning a lot of visits right now, so this is our suggested plan for your favourite zone.")
+final_plan = plan["final_plan"]
+visit_duration = plan["visit_duration"]
 
-optimized_initial = reorder_by_distance(
-    initial_attractions,
-    start_location=attraction_coordinates[first_pref_attraction] if first_pref_attraction else (0, 0)
-)
 def show_breaks_debug(stage, route, zones):
     food_stops = [s for s in route if any(s in zones[z] for z in ["food"])]
     rest_stops = [s for s in route if any(s in zones[z] for z in ["relaxation"])]
@@ -1034,67 +58,16 @@ def show_breaks_debug(stage, route, zones):
         zone = next((z for z, a in zones.items() if stop in a), "Unknown")
         st.markdown(f"{i}. {stop} *(Zone: {zone})*")
 
-first_preference_zone = max(preferences, key=preferences.get)
-first_pref_attraction = next(
-    (a for a in zones[first_preference_zone] if a in initial_attractions),
-    None
-)
-
-optimized_initial = reorder_by_distance(
-    initial_attractions,
-    start_location=attraction_coordinates[first_pref_attraction] if first_pref_attraction else (0, 0)
-)
-
-wet_scheduled = schedule_wet_rides_midday(optimized_initial, wet_ride_names, zones)
-
-# Insert breaks and meals
-full_allocated_plan = insert_breaks(wet_scheduled)
-full_allocated_plan = list(dict.fromkeys(full_allocated_plan))  # Remove exact duplicates
-#show_breaks_debug("After insert_breaks", full_allocated_plan, zones)
-
-# Trim plan to fit within visit duration
-trimmed_plan = []
-time_used = 0
-previous_location = (0, 0)
-
-for stop in full_allocated_plan:
-    if stop.startswith("[Clothing Change]"):
-        stop_time = CLOTHING_CHANGE_DURATION
-    else:
-        ride_time = attraction_durations.get(stop, 5)
-        wait_time = attraction_wait_times.get(stop, 0)
-
-        if stop in attraction_coordinates:
-            walk_units = calculate_distance(previous_location, attraction_coordinates[stop])
-            previous_location = attraction_coordinates[stop]
-        else:
-            walk_units = 0  # Default to 0 if unknown
-
-        walk_meters = walk_units * SCALE_FACTOR_METERS_PER_UNIT
-        walk_time = max(1, round(walk_meters / walking_speed))
-        stop_time = ride_time + wait_time + walk_time
-
-    if time_used + stop_time > visit_duration + 15:
-        break
-
-    trimmed_plan.append(stop)
-    time_used += stop_time
-
-
-final_plan = remove_trailing_breaks(trimmed_plan)
-
-
 # 15. Final Schedule Display with Times
 
-CLOTHING_CHANGE_DURATION = 10  # minutes
-
+section("15_schedule_display")
 zone_emojis = {
     "thrill": "🎢", "water": "💦", "family": "👨‍👩‍👧‍👦",
     "entertainment": "🎭", "food": "🍔", "shopping": "🛍️",
     "relaxation": "🌳", "change": "👕"
 }
 
-plan_text_lines = []
+plan_stops = []
 total_time_used = 0
 entrance_location = (250, 250)
 previous_location = entrance_location
@@ -1106,18 +79,15 @@ show_details_block = st.checkbox("Show detailed time breakdown", value=False)
 
 with st.expander("The Fun Starts Here", expanded=True):
     st.markdown("🏁 **Entrance**")
-    plan_text_lines.append("Entrance")
 
     for stop in final_plan:
         if stop.startswith("[Clothing Change]"):
             display_name = "👕 [Clothing Change] Shower & Changing Room"
-            save_name = stop
             formatted_time = (start_time + timedelta(minutes=total_time_used)).strftime("%I:%M %p")
             st.markdown(f"**{formatted_time} — {display_name} — {CLOTHING_CHANGE_DURATION} minutes**")
             if show_details_block:
                 st.markdown("• Includes: 10m clothing change time")
-            plan_text_lines.append(f"{formatted_time} — {save_name} — {CLOTHING_CHANGE_DURATION} minutes")
-            plan_text_lines.append("Includes: 10m clothing change time")
+            plan_stops.append(PlanStop(stop.removeprefix("[Clothing Change] "), "change", total_time_used, CLOTHING_CHANGE_DURATION, 0, 0))
             total_time_used += CLOTHING_CHANGE_DURATION
             st.markdown("---")
             continue
@@ -1144,15 +114,15 @@ with st.expander("The Fun Starts Here", expanded=True):
         # Special formatting
         if zone == "relaxation":
             display_name = f"🌿 [Rest Stop] {stop}"
-            save_name = f"[Rest Stop] {stop}"
+            kind = "rest"
             st.markdown("---")
         elif zone == "food":
             display_name = f"🍽️ [Meal Break] {stop}"
-            save_name = f"[Meal Break] {stop}"
+            kind = "meal"
             st.markdown("---")
         else:
             display_name = f"{emoji} {stop}"
-            save_name = stop
+            kind = "ride"
 
         display_line = f"**{formatted_time} — {display_name} — {total_duration} minutes**"
         st.markdown(display_line)
@@ -1169,106 +139,47 @@ with st.expander("The Fun Starts Here", expanded=True):
         if zone in ["relaxation", "food"]:
             st.markdown("---")
 
-        plan_text_lines.append(f"{formatted_time} — {save_name} — {total_duration} minutes")
-        plan_text_lines.append(f"Includes: {ride_time}m ride, {wait_time}m wait, {walk_time}m walk")
+        plan_stops.append(PlanStop(stop, kind, total_time_used, ride_time, wait_time, walk_time))
 
         total_time_used += total_duration
         previous_location = attraction_loc
 
     st.markdown("🏁 **Exit**")
-    plan_text_lines.append("Exit")
 
 # 16. Saving to Session and Google Sheet
 
+section("16_save")
 leftover_time = visit_duration - total_time_used
 st.info(f"Total Used: {int(total_time_used)} mins | Leftover: {int(leftover_time)} mins")
 
-# Save Plan
-final_clean_plan = "\n".join(plan_text_lines)
-st.session_state.tour_plan = final_clean_plan
+# Save Plan (the sheet gets the compact encoding, see plan_format.py); a
+# suggested plan served instead of the participant's own is marked as such
+start_minutes = start_time.hour * 60 + start_time.minute
+plan_source = "default" if fallback == "default" else "planned"
+try:
+    final_clean_plan = encode_plan(plan_stops, start_minutes, source=plan_source)
+except ValueError as e:
+    logging.getLogger("tour_plan").warning("Saving the plan as text (plan source: %s): %s", plan_source, e)
+    count("plan_encoding_fallbacks")
+    final_clean_plan = "\n".join(
+        ["Entrance"] + [line for s in plan_stops for line in stop_lines(s, start_minutes)] + ["Exit"]
+    )
+st.session_state.tour_plan = render_text(final_clean_plan)
 
 # Save to Sheet
 uid = st.session_state.get("unique_id")
-sheet = get_consent_worksheet()
-cell = sheet.find(uid, in_column=2)
-if cell:
-    row_num = cell.row
-    sheet.update_cell(row_num, 17, final_clean_plan)
-    sheet.update_cell(row_num, 18, str(int(total_time_used)))
-    sheet.update_cell(row_num, 19, str(int(leftover_time)))
-else:
+store = get_response_store()
+if not store.write_plan(uid, final_clean_plan, str(int(total_time_used)), str(int(leftover_time))):
     st.warning("⚠️ Could not save tour plan. User ID not found in the sheet.")
 
-import matplotlib.pyplot as plt
-
 # 13. Energy Simulation for final_plan
 
-energy = 100
-energy_timeline = [energy]
-time_timeline = [0]
-stop_label_points = []
-
-elapsed_time = 0
-previous_location = (0, 0)
-
-energy_plan_used = final_plan
-
-# Settings
-SAMPLING_INTERVAL = 5
-
-for stop in energy_plan_used:
-    zone = next((z for z, a in zones.items() if stop in a), None)
-    if zone is None:
-        continue
-
-    intensity = zone_intensity.get(zone, 1.0)
-    duration = attraction_durations.get(stop, 5)
-    wait = attraction_wait_times.get(stop, 0)
-    walk_units = calculate_distance(previous_location, attraction_coordinates[stop])
-    walk_meters = walk_units * SCALE_FACTOR_METERS_PER_UNIT
-    walk_time = max(1, round(walk_meters / walking_speed))
-    total_this_stop = duration + wait + walk_time
-
-    adjusted_rest_boost = energy_settings['rest_boost'] * (2 - energy_settings['loss_factor'])
-    adjusted_food_boost = energy_settings['food_boost'] * (2 - energy_settings['loss_factor'])
-
-    if zone in ["relaxation", "food"]:
-        boost = adjusted_rest_boost if zone == "relaxation" else adjusted_food_boost
-        for minute in range(duration):
-            energy += boost / duration
-            energy = min(100, energy)
-            if minute % SAMPLING_INTERVAL == 0 or minute == duration - 1:
-                energy_timeline.append(energy)
-                time_timeline.append(elapsed_time)
-            elapsed_time += 1
-    else:
-        energy_loss = compute_energy_loss(intensity, walk_time, energy_settings['loss_factor'])
-        loss_per_minute = energy_loss / max(1, total_this_stop)
-        for minute in range(total_this_stop):
-            energy -= loss_per_minute
-            if intensity < 0.3:
-                energy += (adjusted_rest_boost * 0.2) / total_this_stop
-            energy = max(0, min(100, energy))
-            if minute % SAMPLING_INTERVAL == 0 or minute == total_this_stop - 1:
-                energy_timeline.append(energy)
-                time_timeline.append(elapsed_time)
-            elapsed_time += 1
-
-    previous_location = attraction_coordinates[stop]
-    stop_label_points.append((elapsed_time, energy, stop, zone))
-
-if energy_plan_used:
-    last_stop = energy_plan_used[-1]
-    last_zone = next((z for z, a in zones.items() if last_stop in a), None)
-    if not stop_label_points or stop_label_points[-1][2] != last_stop:
-        stop_label_points.append((elapsed_time, energy, last_stop, last_zone))
+time_timeline, energy_timeline, stop_label_points = plan["time_timeline"], plan["energy_timeline"], plan["stop_label_points"]
 
 # 14. Energy Visualization (Line Plot)
 
-if len(energy_timeline) > 800:
-    SAMPLING_RATE = len(energy_timeline) // 400
-    energy_timeline = energy_timeline[::SAMPLING_RATE]
-    time_timeline = time_timeline[::SAMPLING_RATE]
+section("14_energy_graph")
+time_timeline, energy_timeline = downsample_energy(time_timeline, energy_timeline, stop_label_points)
 
 st.markdown("---")
 st.markdown("### 📈 Energy Level Graph")
@@ -1282,90 +193,12 @@ This graph shows how your estimated energy level changes throughout the day base
 show_energy_plot = st.checkbox("Show energy level graph", value=True)
 
 if show_energy_plot:
-    fig, ax = plt.subplots(figsize=(12, 8))
-
-    # Main energy line
-    ax.plot(time_timeline, energy_timeline, color='#2E86AB', linewidth=1.5)
-    ax.grid(True, linestyle='--', alpha=0.5)
-    ax.set_facecolor('#f9f9f9')
-
-    # Energy bands
-    ax.axhspan(80, 100, color='green', alpha=0.1, label='High Energy (80–100%)')
-    ax.axhspan(50, 80, color='yellow', alpha=0.1, label='Moderate Energy (50–80%)')
-    ax.axhspan(0, 50, color='red', alpha=0.1, label='Low Energy (<50%)')
-
-    # Entrance marker
-    ax.scatter(time_timeline[0], 100, color='green', marker='o', s=60, zorder=3)
-    ax.annotate("Entrance\n100%", (time_timeline[0], 100),
-                textcoords="offset points", xytext=(0, 10),
-                ha='center', fontsize=8)
-
-    # Stop markers with labels
-    last_time_point = None
-    short_stem_len = 20
-    long_stem_len = 15
-    alternate_counter = 0
-    last_stem_end_y = None
-    MIN_VERTICAL_GAP = 20
-    
-    for i, (time_point, energy_level, stop_name, zone) in enumerate(stop_label_points):
-        if time_point > time_timeline[-1] + 5:
-            continue
-    
-        if time_point > time_timeline[-1]:
-            time_point = time_timeline[-1]
-    
-        label_text = f"{stop_name[:12]}…" if len(stop_name) > 15 else stop_name
-        label_text += f"\n{int(energy_level)}%"
-    
-        if zone == "food":
-            marker_style, color = 's', 'green'
-        elif zone == "relaxation":
-            marker_style, color = 'D', 'darkgreen'
-        else:
-            marker_style, color = 'o', 'blue'
-    
-        direction = 1
-        stem_length = short_stem_len if (alternate_counter % 2 == 0) else long_stem_len
-    
-        predicted_end_y = energy_level + direction * stem_length
-    
-        if last_stem_end_y is not None and abs(predicted_end_y - last_stem_end_y) < MIN_VERTICAL_GAP:
-            direction = -1
-            predicted_end_y = energy_level + direction * stem_length
-    
-        ax.scatter(time_point, energy_level, marker=marker_style, color=color, s=60, zorder=3)
-    
-        ax.plot([time_point, time_point], [energy_level, predicted_end_y], color=color, linestyle='--', linewidth=1)
-    
-        ax.annotate(
-            label_text,
-            (time_point, predicted_end_y),
-            textcoords="offset points",
-            xytext=(0, 0),
-            ha='center',
-            fontsize=8
-        )
-    
-        last_stem_end_y = predicted_end_y
-        alternate_counter += 1
-
-    ax.scatter([], [], marker='o', color='blue', label='Ride')
-    ax.scatter([], [], marker='s', color='green', label='Meal Stop')
-    ax.scatter([], [], marker='D', color='darkgreen', label='Rest Stop')
-    ax.legend()
-
-    ax.set_title("Visitor Energy Level Throughout the Day", fontsize=16, weight='bold')
-    ax.set_xlabel("Minutes Elapsed", fontsize=12)
-    ax.set_ylabel("Energy Level (%)", fontsize=12)
-    ax.set_ylim(-10, 110)
-    fig.tight_layout()
-
-    st.pyplot(fig)
+    show_energy_chart(time_timeline, energy_timeline, stop_label_points)
     
 
 #  Plan Feedback Section
 
+section("feedback_form")
 st.markdown("---")
 st.subheader("⭐ Plan Feedback")
 
@@ -1460,15 +293,22 @@ feedback = st.text_area(
 
 if st.button("Submit Feedback"):
     try:
-        sheet.update_cell(row_num, 20, str(likert_mapping[st.session_state["spacing"]]))
-        sheet.update_cell(row_num, 21, str(likert_mapping[st.session_state["variety"]]))
-        sheet.update_cell(row_num, 22, str(likert_mapping[st.session_state["meal_timing"]]))
-        sheet.update_cell(row_num, 23, str(likert_mapping[st.session_state["overall"]]))
-        sheet.update_cell(row_num, 24, str(likert_mapping[st.session_state["energy_graph"]]))
-        sheet.update_cell(row_num, 25, feedback)
+        saved = store.write_feedback(uid, [
+            str(likert_mapping[st.session_state["spacing"]]),
+            str(likert_mapping[st.session_state["variety"]]),
+            str(likert_mapping[st.session_state["meal_timing"]]),
+            str(likert_mapping[st.session_state["overall"]]),
+            str(likert_mapping[st.session_state["energy_graph"]]),
+            feedback,
+        ])
+        if not saved:
+            raise LookupError(f"User ID {uid} not found in the sheet")
 
         st.success(" Feedback saved!")
         time.sleep(1)
+        finish_request(unique_id=uid)
         st.switch_page("pages/3_final_download.py")
     except Exception as e:
         st.error(f"Error saving feedback: {e}")
+
+finish_request(unique_id=uid)
@@ -0,0 +1,187 @@
+# Compact structured encoding of a tour plan for column 17 (plan_text).
+#
+# A plan is stored as "plan:" followed by URL-safe base64 of a small binary
+# record instead of human-readable lines:
+#
+#   header  >BHBB   schema version, start of the visit (minutes after midnight), source, stop count
+#   stop    >BBHBBB stop ID, kind, start offset (minutes), ride, wait and walk minutes
+#
+# The source says whether the plan came from the participant's own answers or
+# is the suggested plan served while the planner was overloaded (plan_pool.py),
+# so analyses can tell the two apart.
+#
+# Stop IDs index PLAN_STOP_IDS, kinds STOP_KINDS and sources PLAN_SOURCES. The
+# lists are part of the schema: new attractions are appended, never inserted,
+# and anything else needs a new PLAN_SCHEMA_VERSION. A typical plan is about
+# 110 characters against about 900 bytes of text, which also keeps what the
+# guide robot fetches small.
+#
+# Rows written before this format keep their text; plan_lines() and
+# parse_plan_stops() accept both, and the text and HTML renderers reproduce the
+# old lines exactly.
+
+import base64
+import binascii
+import logging
+import struct
+from typing import NamedTuple
+
+PLAN_SCHEMA_VERSION = 1
+PLAN_PREFIX = "plan:"
+DEFAULT_START_MINUTES = 10 * 60  # 10:00 AM
+
+STOP_KINDS = ("ride", "meal", "rest", "change")
+PLAN_SOURCES = ("planned", "default")
+
+PLAN_STOP_IDS = (
+    "Roller Coaster", "Drop Tower", "Haunted Mine Train", "Spinning Vortex", "Freefall Cannon",
+    "Water Slide", "Lazy River", "Log Flume", "Splash Battle", "Wave Pool",
+    "Bumper Cars", "Mini Ferris Wheel", "Animal Safari Ride", "Ball Pit Dome", "Train Adventure",
+    "Live Stage", "Street Parade", "Magic Show", "Circus Tent", "Musical Fountain",
+    "Food Court", "Snack Bar", "Ice Cream Kiosk", "Pizza Plaza", "Smoothie Station",
+    "Souvenir Shop", "Candy Store", "Photo Booth", "Gift Emporium", "Toy World",
+    "Relaxation Garden", "Shaded Benches", "Quiet Lake View", "Zen Courtyard", "Sky Deck",
+    "Shower & Changing Room",
+)
+
+_HEADER = struct.Struct(">BHBB")
+_STOP = struct.Struct(">BBHBBB")
+_stop_ids = {name: i for i, name in enumerate(PLAN_STOP_IDS)}
+_kind_ids = {kind: i for i, kind in enumerate(STOP_KINDS)}
+_source_ids = {source: i for i, source in enumerate(PLAN_SOURCES)}
+
+logger = logging.getLogger(__name__)
+
+# Name prefixes used by the text rendering, by kind
+_KIND_LABELS = {"ride": "", "meal": "[Meal Break] ", "rest": "[Rest Stop] ", "change": "[Clothing Change] "}
+
+
+class PlanStop(NamedTuple):
+    name: str
+    kind: str
+    offset: int  # minutes after the start of the visit
+    ride: int
+    wait: int
+    walk: int
+
+    @property
+    def duration(self):
+        return self.ride + self.wait + self.walk
+
+
+def encode_plan(stops, start_minutes=DEFAULT_START_MINUTES, source="planned"):
+    """Pack PlanStops into the column 17 string; raises ValueError for stops or values the schema can't hold."""
+    try:
+        header = _HEADER.pack(PLAN_SCHEMA_VERSION, start_minutes, _source_ids[source], len(stops))
+        record = header + b"".join(
+            _STOP.pack(_stop_ids[stop.name], _kind_ids[stop.kind], stop.offset, stop.ride, stop.wait, stop.walk)
+            for stop in stops
+        )
+    except (KeyError, struct.error) as e:
+        raise ValueError(f"Plan can't be encoded: {e!r}") from e
+    return PLAN_PREFIX + base64.urlsafe_b64encode(record).decode("ascii")
+
+
+def is_encoded_plan(value):
+    return isinstance(value, str) and value.startswith(PLAN_PREFIX)
+
+
+def _decode(value):
+    if not is_encoded_plan(value):
+        raise ValueError("Not an encoded plan")
+    try:
+        record = base64.urlsafe_b64decode(value[len(PLAN_PREFIX):])
+        version, start_minutes, source, count = _HEADER.unpack_from(record)
+        if version != PLAN_SCHEMA_VERSION:
+            raise ValueError(f"Unsupported plan schema version {version}")
+        if len(record) != _HEADER.size + count * _STOP.size:
+            raise ValueError("Truncated plan record")
+        stops = [
+            PlanStop(PLAN_STOP_IDS[stop_id], STOP_KINDS[kind], offset, ride, wait, walk)
+            for stop_id, kind, offset, ride, wait, walk in _STOP.iter_unpack(record[_HEADER.size:])
+        ]
+        return start_minutes, PLAN_SOURCES[source], stops
+    except (binascii.Error, struct.error, IndexError) as e:
+        raise ValueError(f"Malformed plan record: {e!r}") from e
+
+
+def decode_plan(value):
+    """(start_minutes, [PlanStop]) for an encoded plan; raises ValueError for anything else."""
+    start_minutes, _, stops = _decode(value)
+    return start_minutes, stops
+
+
+def plan_source(value):
+    """Source of a stored plan (one of PLAN_SOURCES); None for legacy text plans, which don't record it."""
+    if not is_encoded_plan(value):
+        return None
+    return _decode(value)[1]
+
+
+def format_clock(minutes):
+    """12-hour clock time for minutes after midnight, e.g. 605 -> "10:05 AM"."""
+    hours, minutes = divmod(int(minutes) % (24 * 60), 60)
+    return f"{(hours - 1) % 12 + 1:02d}:{minutes:02d} {'AM' if hours < 12 else 'PM'}"
+
+
+def stop_lines(stop, start_minutes=DEFAULT_START_MINUTES):
+    """The stop and detail lines of one stop, as in the original text plans."""
+    time_label = format_clock(start_minutes + stop.offset)
+    line = f"{time_label} — {_KIND_LABELS[stop.kind]}{stop.name} — {stop.duration} minutes"
+    if stop.kind == "change":
+        return line, f"Includes: {stop.ride}m clothing change time"
+    return line, f"Includes: {stop.ride}m ride, {stop.wait}m wait, {stop.walk}m walk"
+
+
+def plan_lines(value):
+    """(style, text) for each line of a stored plan, encoded or legacy text.
+
+    style is "endpoint" (Entrance/Exit), "stop" or "detail"; the PDF and HTML
+    renderers only decide how each style looks.
+    """
+    if not is_encoded_plan(value):
+        lines = []
+        for line in (value or "").split("\n"):
+            line = line.strip()
+            if line.lower() in ["entrance", "exit"]:
+                lines.append(("endpoint", line))
+            elif line.lower().startswith("includes:"):
+                lines.append(("detail", line))
+            else:
+                lines.append(("stop", line))
+        return lines
+
+    try:
+        start_minutes, stops = decode_plan(value)
+    except ValueError as e:
+        logger.warning("Showing a stored plan as it is: %s", e)
+        return [("stop", value)]
+    lines = [("endpoint", "Entrance")]
+    for stop in stops:
+        line, detail = stop_lines(stop, start_minutes)
+        lines += [("stop", line), ("detail", detail)]
+    lines.append(("endpoint", "Exit"))
+    return lines
+
+
+def render_text(value):
+    return "\n".join(text for _, text in plan_lines(value))
+
+
+def render_html(value):
+    html = ""
+    for style, text in plan_lines(value):
+        if style == "endpoint":
+            html += f"<p><b>{text}</b></p>"
+        elif style == "detail":
+            html += f"<p style='margin-left: 10px; font-style: italic;'>{text}</p>"
+        else:
+            html += f"<p>{text}</p>"
+    return html
+
+
+def plan_stop_names(value):
+    """Attraction names of a stored plan in visit order; None for legacy text plans."""
+    if not is_encoded_plan(value):
+        return None
+    return [stop.name for stop in decode_plan(value)[1]]
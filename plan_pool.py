@@ -0,0 +1,245 @@
+# Tour planning in a bounded pool of warm worker processes.
+#
+# Answers covered by the precomputed plan table (plan_table.py) are served from
+# it; the pool only plans the rest.
+#
+# The planner is pure Python and holds the GIL for its whole run, so a burst of
+# visitors on the tour-plan page would otherwise queue behind each other on the
+# server's script threads. plan_visit() hands the work to PLANNER_WORKERS
+# processes (0 plans inline, as before) and waits at most PLAN_DEADLINE_SECONDS.
+# Answers seen before are served from the pool's memory. Once PLAN_QUEUE_LIMIT
+# plans are in flight, when the deadline passes or when the planner fails, the
+# visitor gets the default plan for visitors with the same favourite zone, and
+# the page records that in the stored plan (see plan_format.PLAN_SOURCES).
+# Only a broken pool (a worker died) is restarted.
+#
+# Queue depth, timeouts and fallbacks are exported through telemetry (see
+# scripts/serve.py /metrics).
+
+import logging
+import os
+import sys
+import threading
+import time
+import types
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from functools import lru_cache
+from multiprocessing import get_context, util
+
+import streamlit as st
+
+from cache import content_key
+from telemetry import count, record, set_gauge
+
+PLANNER_WORKERS = int(os.environ.get("PLANNER_WORKERS", "2"))
+PLAN_DEADLINE_SECONDS = float(os.environ.get("PLAN_DEADLINE_SECONDS", "10"))
+PLAN_QUEUE_LIMIT = int(os.environ.get("PLAN_QUEUE_LIMIT", str(4 * max(PLANNER_WORKERS, 1))))
+PLAN_CACHE_SIZE = 512
+
+logger = logging.getLogger(__name__)
+
+
+# Worker side
+
+def _init_worker():
+    import planner
+    from warmup import PREFERENCE_ZONES
+
+    for zone in PREFERENCE_ZONES:
+        planner.weight_simulation(zone)
+
+
+def _ready():
+    return os.getpid()
+
+
+def _plan_in_worker(data):
+    from planner import plan_tour
+
+    timings = {}
+    start = time.perf_counter()
+    plan = plan_tour(data, timings=timings)
+    return plan, timings, time.perf_counter() - start
+
+
+@contextmanager
+def _clean_main():
+    # Streamlit installs each page as __main__, and a spawned process re-runs
+    # __main__ before it starts working; give the workers an empty one instead
+    main = sys.modules.get("__main__")
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+# Server side
+
+class PlanPool:
+    def __init__(self, workers=PLANNER_WORKERS, queue_limit=PLAN_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.lock = threading.Lock()
+        self.restart_lock = threading.Lock()
+        self.in_flight = 0
+        self.plans = OrderedDict()
+        self.executor = None
+        if workers > 0:
+            self._start()
+        # Idle workers wait on the call queue forever, so a process that never
+        # shuts the pool down can't exit. multiprocessing's finalizers run at
+        # interpreter exit and also when the pool lives in a multiprocessing
+        # worker (which exits without running atexit hooks).
+        util.Finalize(None, self.close, exitpriority=10)
+
+    def _start(self):
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=get_context("spawn"), initializer=_init_worker
+        )
+        # Workers are started on submit; start all of them now, while __main__ is safe to spawn from
+        with _clean_main():
+            futures = [executor.submit(_ready) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        with self.lock:
+            self.executor = executor
+        set_gauge("plan_pool_workers", self.workers)
+
+    def _restart(self, broken):
+        """Replace a broken executor, once however many sessions saw it break."""
+        with self.restart_lock:
+            with self.lock:
+                if self.executor is not broken:
+                    return  # already restarted (or closed) by another session
+                self.executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+            count("plan_pool_restarts")
+            self._start()
+
+    def close(self):
+        with self.restart_lock:
+            with self.lock:
+                executor, self.executor = self.executor, None
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    def _done(self, future):
+        with self.lock:
+            self.in_flight -= 1
+            set_gauge("plan_pool_queue_depth", self.in_flight)
+
+    def cached(self, key):
+        with self.lock:
+            plan = self.plans.get(key)
+            if plan is not None:
+                self.plans.move_to_end(key)
+            return plan
+
+    def remember(self, key, plan):
+        with self.lock:
+            self.plans[key] = plan
+            self.plans.move_to_end(key)
+            while len(self.plans) > PLAN_CACHE_SIZE:
+                self.plans.popitem(last=False)
+
+    def submit(self, data, deadline=PLAN_DEADLINE_SECONDS):
+        """Plan in a worker; returns (plan, None) or (None, reason) when the pool cannot answer in time."""
+        with self.lock:
+            if self.executor is None:
+                return None, "no workers"
+            if self.in_flight >= self.queue_limit:
+                count("plan_pool_rejected")
+                return None, f"{self.in_flight} plans already queued"
+            self.in_flight += 1
+            set_gauge("plan_pool_queue_depth", self.in_flight)
+            executor = self.executor
+
+        start = time.perf_counter()
+        try:
+            future = executor.submit(_plan_in_worker, data)
+        except BrokenProcessPool as e:
+            self._done(None)
+            self._restart(executor)
+            return None, f"{type(e).__name__}: {e}"
+        except RuntimeError as e:
+            # The pool was shut down (closing) after we took it
+            self._done(None)
+            return None, f"{type(e).__name__}: {e}"
+        future.add_done_callback(self._done)
+        count("plan_pool_submitted")
+
+        try:
+            plan, timings, compute_seconds = future.result(timeout=deadline)
+        except TimeoutError:
+            future.cancel()
+            count("plan_pool_timeouts")
+            return None, f"no plan within {deadline:g}s"
+        except BrokenProcessPool as e:
+            # A worker died; every plan queued on this executor fails with it
+            self._restart(executor)
+            return None, f"{type(e).__name__}: {e}"
+        except CancelledError:
+            return None, "plan cancelled"
+        except Exception as e:
+            # The planner raised for these answers; the workers are fine
+            count("plan_pool_errors")
+            return None, f"{type(e).__name__}: {e}"
+
+        total = time.perf_counter() - start
+        record("plan_pool.request", total)
+        record("plan_pool.queue", max(total - compute_seconds, 0.0))
+        for stage, seconds in timings.items():
+            record(f"planner.{stage}", seconds)
+        return plan, None
+
+
+@st.cache_resource
+def get_plan_pool():
+    return PlanPool()
+
+
+@lru_cache(maxsize=None)
+def default_plan(top_zone):
+    """Plan for the representative visitor whose favourite zone is top_zone."""
+    from planner import plan_tour
+    from warmup import representative_profiles
+
+    profile = next(p for p in representative_profiles() if p[top_zone] == 1)
+    return plan_tour(profile)
+
+
+def plan_visit(data):
+    """plan_tour() for one set of answers, through the worker pool.
+
+    Returns (plan, fallback) where fallback is None or "default".
+    """
+    from plan_table import table_plan
+    from planner import plan_tour, visitor_profile
+
+    plan = table_plan(data)
+    if plan is not None:
+        return plan, None
+
+    if PLANNER_WORKERS <= 0:
+        return plan_tour(data), None
+
+    pool = get_plan_pool()
+    key = content_key(data)
+    # Plans are deterministic, so answers seen before are served from memory
+    plan = pool.cached(key)
+    if plan is not None:
+        count("plan_pool_cache_hits")
+        return plan, None
+
+    plan, error = pool.submit(data)
+    if plan is not None:
+        pool.remember(key, plan)
+        return plan, None
+
+    logger.warning("Serving the suggested plan: %s", error)
+    count("plan_pool_fallbacks_default")
+    return default_plan(visitor_profile(data)["top_zone"]), "default"
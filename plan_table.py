@@ -0,0 +1,361 @@
+# Precomputed plans for every questionnaire answer set, memory-mapped.
+#
+# Only part of the questionnaire reaches the planner: the age's energy settings
+# (13–17, 31–45 and 46–60 plan alike), the visit length, the ranking of the
+# seven zones, three of the priorities, the wait, walking and break answers;
+# accessibility is not used. The product of those is
+# 4 × 4 × 8 × 4 × 3 × 4 × 5,040 = 30,965,760 distinct plans. profile_index() numbers them with a mixed-radix index (the ranking by
+# its Lehmer code), a minimal perfect hash that needs no stored keys.
+#
+# scripts/build_plan_table.py fills PLAN_TABLE_DIR/<version>/plans.npy, one
+# fixed-width uint16 row per index:
+#   row[0]   0 = not built yet, 0xFFFF = left to the live planner, else stops + 1
+#   row[1:]  (stop id << 10) | energy-loss code, stop ids into the manifest's
+#            stop names; the i-th code is the i-th energy-loss output that
+#            simulate_energy() read (0 = no output, 1023 = unused slot)
+# Energy losses are stored rather than recomputed because the energy simulation
+# carries state over from break insertion. A table lookup decodes the stops and
+# replays simulate_energy() with the stored outputs, so the energy graph is the
+# one the planner drew when the table was built. Rows are written as they are
+# planned, so a partly built table already serves what it has.
+#
+# The version covers planner.py, the answer options and the fuzzy rule sets; a
+# change to any of them leaves the old table unused until it is rebuilt.
+
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+import streamlit as st
+
+from constants import AGE_GROUPS, BREAK_OPTIONS
+from telemetry import count
+
+PLAN_TABLE_DIR = os.environ.get("PLAN_TABLE_DIR", "plan_table")
+PLAN_TABLE_FORMAT = 1
+PLAN_TABLE_STOPS = 24
+
+NOT_BUILT = 0
+LIVE_ONLY = 0xFFFF
+LOSS_MISSING = 0
+LOSS_UNUSED = 1023
+
+RANKED_ZONES = ["thrill", "family", "water", "entertainment", "food", "shopping", "relaxation"]
+# The only priorities visitor_profile() reads
+PRIORITY_FLAGS = [
+    "Enjoying high-intensity rides",
+    "Having regular food and rest breaks",
+    "Staying comfortable throughout the visit",
+]
+
+logger = logging.getLogger(__name__)
+
+
+# Profile index
+
+def age_classes():
+    """AGE_GROUPS grouped by what the planner does with them, in questionnaire order."""
+    import planner
+
+    classes = {}
+    for age in AGE_GROUPS:
+        group = planner.age_group_map.get(age, "Adult")
+        key = (json.dumps(planner.age_energy_scaling[group], sort_keys=True), age == "Under 12")
+        classes.setdefault(key, []).append(age)
+    return list(classes.values())
+
+
+@lru_cache(maxsize=1)
+def answer_options():
+    """(questionnaire key, options) per index dimension; the ranking is the last and fastest-varying."""
+    import planner
+
+    return [
+        ("age", age_classes()),
+        ("duration", list(planner.duration_map)),
+        ("priorities", list(range(2 ** len(PRIORITY_FLAGS)))),
+        ("wait_time", list(planner.wait_map)),
+        ("walking", list(planner.walking_map)),
+        ("break", BREAK_OPTIONS),
+        ("ranking", list(range(math.factorial(len(RANKED_ZONES))))),
+    ]
+
+
+def table_size():
+    return math.prod(len(options) for _, options in answer_options())
+
+
+def _permutation_rank(ranks):
+    rank, remaining = 0, sorted(ranks)
+    for value in ranks:
+        position = remaining.index(value)
+        rank = rank * len(remaining) + position
+        remaining.pop(position)
+    return rank
+
+
+def _permutation_unrank(rank, size):
+    positions = []
+    for base in range(1, size + 1):
+        positions.append(rank % base)
+        rank //= base
+    remaining = list(range(1, size + 1))
+    return [remaining.pop(position) for position in reversed(positions)]
+
+
+def profile_index(data):
+    """Table index of a set of answers, or None for answers the table does not cover."""
+    try:
+        ranks = [data[zone] for zone in RANKED_ZONES]
+        if sorted(ranks) != list(range(1, len(RANKED_ZONES) + 1)):
+            return None
+        flags = sum(1 << i for i, flag in enumerate(PRIORITY_FLAGS) if flag in data["priorities"])
+        digits = []
+        for key, options in answer_options():
+            if key == "age":
+                digits.append(next(i for i, ages in enumerate(options) if data["age"] in ages))
+            elif key == "priorities":
+                digits.append(flags)
+            elif key == "ranking":
+                digits.append(_permutation_rank(ranks))
+            else:
+                digits.append(options.index(data[key]))
+    except (KeyError, ValueError, TypeError, StopIteration):
+        return None
+
+    index = 0
+    for (_, options), digit in zip(answer_options(), digits):
+        index = index * len(options) + digit
+    return index
+
+
+def profile_for_index(index):
+    """Representative answers for a table index (the inverse of profile_index())."""
+    digits = []
+    for _, options in reversed(answer_options()):
+        index, digit = divmod(index, len(options))
+        digits.append(digit)
+    data = {"accessibility": "No"}
+    for (key, options), digit in zip(answer_options(), reversed(digits)):
+        if key == "age":
+            data["age"] = options[digit][0]
+        elif key == "priorities":
+            data["priorities"] = [flag for i, flag in enumerate(PRIORITY_FLAGS) if digit & (1 << i)]
+        elif key == "ranking":
+            data.update(zip(RANKED_ZONES, _permutation_unrank(digit, len(RANKED_ZONES))))
+        else:
+            data[key] = options[digit]
+    return data
+
+
+# Plan encoding
+
+def stop_names():
+    import planner
+
+    return sorted(planner.attraction_coordinates) + [f"[Clothing Change] {planner.change_location}"]
+
+
+@lru_cache(maxsize=1)
+def loss_values():
+    """Every energy loss the tabulated energy-loss controller can output, sorted."""
+    import planner
+    from fast_engines import compiled_system
+    from fuzzy_tables import table_axes
+
+    control_system = planner.energy_loss_ctrl
+    grid = compiled_system(control_system).evaluate_grid(table_axes(control_system))["energy_loss"]
+    return np.unique(grid[~np.isnan(grid)])
+
+
+class RecordingSimulation:
+    """Wraps an energy-loss simulation and records the output of every compute()."""
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.input = simulation.input
+        self.outputs = []
+
+    @property
+    def output(self):
+        return self.simulation.output
+
+    def compute(self):
+        try:
+            self.simulation.compute()
+        finally:
+            self.outputs.append(self.simulation.output.get("energy_loss"))
+
+
+class ReplaySimulation:
+    """Stands in for an energy-loss simulation, returning recorded outputs in order."""
+
+    def __init__(self, outputs):
+        self.input = {}
+        self.output = {}
+        self._outputs = iter(outputs)
+
+    def compute(self):
+        value = next(self._outputs)
+        self.output = {} if value is None else {"energy_loss": value}
+
+
+def encode_plan(final_plan, outputs, stop_ids, loss_codes):
+    """Table row for a plan, or a LIVE_ONLY row when it does not fit the encoding."""
+    row = np.full(PLAN_TABLE_STOPS + 1, LOSS_UNUSED, dtype=np.uint16)
+    row[0] = LIVE_ONLY
+    if len(final_plan) > PLAN_TABLE_STOPS or len(outputs) > PLAN_TABLE_STOPS:
+        return row
+    try:
+        stops = [stop_ids[stop] for stop in final_plan]
+        codes = [LOSS_MISSING if value is None else loss_codes[float(value)] for value in outputs]
+    except KeyError:
+        return row
+    for i in range(PLAN_TABLE_STOPS):
+        stop = stops[i] if i < len(stops) else 0
+        code = codes[i] if i < len(codes) else LOSS_UNUSED
+        row[i + 1] = (stop << 10) | code
+    row[0] = len(final_plan) + 1
+    return row
+
+
+def build_rows(start, stop, engine=None):
+    """Plan indices start..stop-1 and return their table rows."""
+    import contextlib
+    import io
+
+    from planner import plan_stops, simulate_energy
+
+    stop_ids = {name: i for i, name in enumerate(stop_names())}
+    loss_codes = {float(value): i + 1 for i, value in enumerate(loss_values())}
+    rows = np.zeros((stop - start, PLAN_TABLE_STOPS + 1), dtype=np.uint16)
+    # The planner prints a line for every energy-loss fallback
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, index in enumerate(range(start, stop)):
+            profile, final_plan, energy_loss_sim = plan_stops(profile_for_index(index), engine=engine)
+            recorder = RecordingSimulation(energy_loss_sim)
+            simulate_energy(final_plan, profile["energy_settings"], recorder)
+            rows[i] = encode_plan(final_plan, recorder.outputs, stop_ids, loss_codes)
+    return rows
+
+
+# Table files
+
+def plan_table_version():
+    import planner
+    from fuzzy_tables import tables_version
+
+    h = hashlib.sha256()
+    with open(planner.__file__, "rb") as f:
+        h.update(f.read())
+    h.update(json.dumps(
+        [PLAN_TABLE_FORMAT, PLAN_TABLE_STOPS, PRIORITY_FLAGS, answer_options(), stop_names(), tables_version()],
+        ensure_ascii=False,
+    ).encode())
+    return h.hexdigest()[:16]
+
+
+def create_plan_table(root=PLAN_TABLE_DIR, version=None):
+    """Create the (sparse, unbuilt) table for this version unless it exists; returns its directory."""
+    version = version or plan_table_version()
+    directory = os.path.join(root, version)
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        return directory
+
+    os.makedirs(root, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=root, prefix=".build-")
+    np.lib.format.open_memmap(
+        os.path.join(build_dir, "plans.npy"), mode="w+", dtype=np.uint16, shape=(table_size(), PLAN_TABLE_STOPS + 1)
+    ).flush()
+    np.save(os.path.join(build_dir, "losses.npy"), loss_values(), allow_pickle=False)
+    manifest = {
+        "version": version,
+        "format": PLAN_TABLE_FORMAT,
+        "dimensions": [[key, len(options)] for key, options in answer_options()],
+        "stops": stop_names(),
+    }
+    with open(os.path.join(build_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    try:
+        os.rename(build_dir, directory)
+    except OSError:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return directory
+
+
+class PlanTable:
+    def __init__(self, directory, writable=False):
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.plans = np.load(os.path.join(directory, "plans.npy"), mmap_mode="r+" if writable else "r")
+        if not writable:
+            self.plans = self.plans.view(np.ndarray)
+        self.losses = np.load(os.path.join(directory, "losses.npy")).tolist()
+        self.stops = self.manifest["stops"]
+
+    def write(self, start, rows):
+        # Stops first, status last, so a reader never sees a row half written
+        self.plans[start:start + len(rows), 1:] = rows[:, 1:]
+        self.plans[start:start + len(rows), 0] = rows[:, 0]
+
+    def built(self, start, stop):
+        return int(np.count_nonzero(self.plans[start:stop, 0]))
+
+    def decode(self, data, row):
+        from planner import simulate_energy, visitor_profile
+
+        length = int(row[0]) - 1
+        final_plan = [self.stops[int(code) >> 10] for code in row[1:length + 1]]
+        outputs = []
+        for code in row[1:]:
+            code = int(code) & 1023
+            if code == LOSS_UNUSED:
+                break
+            outputs.append(None if code == LOSS_MISSING else self.losses[code - 1])
+
+        profile = visitor_profile(data)
+        time_timeline, energy_timeline, stop_label_points = simulate_energy(
+            final_plan, profile["energy_settings"], ReplaySimulation(outputs)
+        )
+        return {
+            "final_plan": final_plan,
+            "visit_duration": profile["visit_duration"],
+            "energy_settings": profile["energy_settings"],
+            "time_timeline": time_timeline,
+            "energy_timeline": energy_timeline,
+            "stop_label_points": stop_label_points,
+        }
+
+    def lookup(self, data):
+        """The stored plan for these answers, or None when the live planner has to run."""
+        index = profile_index(data)
+        if index is None:
+            return None
+        row = self.plans[index]
+        if int(row[0]) in (NOT_BUILT, LIVE_ONLY):
+            return None
+        return self.decode(data, row)
+
+
+@st.cache_resource
+def get_plan_table():
+    version = plan_table_version()
+    directory = os.path.join(PLAN_TABLE_DIR, version)
+    if not os.path.exists(os.path.join(directory, "manifest.json")):
+        logger.warning("No plan table for version %s in %s; every plan goes to the planner", version, PLAN_TABLE_DIR)
+        return None
+    return PlanTable(directory)
+
+
+def table_plan(data):
+    """plan_tour(data) from the plan table, or None when it has no plan for these answers."""
+    table = get_plan_table()
+    plan = table.lookup(data) if table is not None else None
+    count("plan_table_hits" if plan is not None else "plan_table_misses")
+    return plan
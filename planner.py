@@ -0,0 +1,1221 @@
+# Tour planning pipeline: fuzzy zone weighting, attraction scoring and
+# selection, routing, wet-ride scheduling, break/meal insertion, trimming to
+# the visit length and the energy simulation behind the graph.
+#
+# The park data and fuzzy control systems are built once per process and
+# shared by every session; plan_tour() runs the pipeline for one set of
+# questionnaire answers. The energy, wet-ride and food simulations keep their
+# last output between calls (a rule set that does not fire returns the previous
+# value), so each plan gets fresh ones, exactly like a fresh run of the page did.
+# The weight simulations always fire and are shared, driven under a lock.
+#
+# PLANNER_FUZZY_ENGINE=numpy swaps every simulation for fast_engines.FastSimulation,
+# and =table reads it from the lookup tables built by scripts/build_fuzzy_tables.py;
+# check either with scripts/diff_engines.py before switching.
+
+import copy
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta, datetime
+from functools import lru_cache
+
+import numpy as np
+import skfuzzy as fuzz
+from skfuzzy import control as ctrl
+
+from fast_engines import FastSimulation
+from telemetry import TELEMETRY_ENABLED, record
+
+FUZZY_ENGINES = ("skfuzzy", "numpy", "table")
+FUZZY_ENGINE = os.environ.get("PLANNER_FUZZY_ENGINE", "skfuzzy")
+
+
+def new_simulation(control_system, engine=None):
+    engine = engine or FUZZY_ENGINE
+    if engine == "skfuzzy":
+        return ctrl.ControlSystemSimulation(control_system)
+    if engine == "numpy":
+        return FastSimulation(control_system)
+    if engine == "table":
+        from fuzzy_tables import tabulated_system
+
+        return FastSimulation(control_system, system=tabulated_system(control_system))
+    raise ValueError(f"Unknown fuzzy engine: {engine!r} (expected one of {FUZZY_ENGINES})")
+
+# 3. Define zones and coordinates
+
+SCALE_FACTOR_METERS_PER_UNIT = 2.0  # Each grid unit is 2 meters
+
+zones = {
+    "thrill": ["Roller Coaster", "Drop Tower", "Haunted Mine Train", "Spinning Vortex", "Freefall Cannon"],
+    "water": ["Water Slide", "Lazy River", "Log Flume", "Splash Battle", "Wave Pool"],
+    "family": ["Bumper Cars", "Mini Ferris Wheel", "Animal Safari Ride", "Ball Pit Dome", "Train Adventure"],
+    "entertainment": ["Live Stage", "Street Parade", "Magic Show", "Circus Tent", "Musical Fountain"],
+    "food": ["Food Court", "Snack Bar", "Ice Cream Kiosk", "Pizza Plaza", "Smoothie Station"],
+    "shopping": ["Souvenir Shop", "Candy Store", "Photo Booth", "Gift Emporium", "Toy World"],
+    "relaxation": ["Relaxation Garden", "Shaded Benches", "Quiet Lake View", "Zen Courtyard", "Sky Deck"]
+}
+
+zone_coordinates = {
+    "thrill": (100, 400), "water": (400, 400), "family": (100, 100),
+    "entertainment": (400, 100), "food": (250, 250), "shopping": (300, 300), "relaxation": (200, 200)
+}
+
+attraction_coordinates = {}
+for zone, attractions in zones.items():
+    for idx, attraction in enumerate(attractions):
+        angle = idx * (2 * np.pi / len(attractions))  # even angle distribution
+        radius = 80  # increase for more spacing
+        offset_x = int(radius * np.cos(angle))
+        offset_y = int(radius * np.sin(angle))
+        zone_x, zone_y = zone_coordinates[zone]
+        attraction_coordinates[attraction] = (zone_x + offset_x, zone_y + offset_y)
+
+change_location = "Shower & Changing Room"
+change_coordinates = (450, 250)  
+attraction_coordinates[change_location] = change_coordinates
+
+# 4. Ride durations, wait times, and accessibility levels
+
+accessibility_factors = {
+    "thrill": 0.7, "water": 0.8, "family": 1.0,
+    "entertainment": 0.9, "food": 1.0, "shopping": 1.0, "relaxation": 1.0
+}
+
+
+CLOTHING_CHANGE_DURATION = 10 
+
+attraction_durations = {
+    # Thrill (longer ride time)
+    "Roller Coaster": 5, "Drop Tower": 3, "Haunted Mine Train": 4, "Spinning Vortex": 4, "Freefall Cannon": 3,
+
+    # Water (medium–long experience)
+    "Water Slide": 4, "Lazy River": 10, "Log Flume": 6, "Splash Battle": 5, "Wave Pool": 10,
+
+    # Family (shorter ride time)
+    "Bumper Cars": 3, "Mini Ferris Wheel": 4, "Animal Safari Ride": 6, "Ball Pit Dome": 6, "Train Adventure": 8,
+
+    # Entertainment (long shows)
+    "Live Stage": 20, "Street Parade": 15, "Magic Show": 25, "Circus Tent": 25, "Musical Fountain": 15,
+
+    # Food (time to eat)
+    "Food Court": 25, "Snack Bar": 15, "Ice Cream Kiosk": 10, "Pizza Plaza": 20, "Smoothie Station": 10,
+
+    # Shopping (quick)
+    "Souvenir Shop": 10, "Candy Store": 8, "Photo Booth": 5, "Gift Emporium": 10, "Toy World": 10,
+
+    # Relaxation (fixed)
+    "Relaxation Garden": 15, "Shaded Benches": 10, "Quiet Lake View": 10, "Zen Courtyard": 10, "Sky Deck": 10
+}
+
+attraction_wait_times = {
+    # Thrill (very popular)
+    "Roller Coaster": 30, "Drop Tower": 25, "Haunted Mine Train": 20, "Spinning Vortex": 18, "Freefall Cannon": 20,
+
+    # Water (popular on hot days)
+    "Water Slide": 15, "Lazy River": 10, "Log Flume": 20, "Splash Battle": 12, "Wave Pool": 15,
+
+    # Family (shorter queues)
+    "Bumper Cars": 5, "Mini Ferris Wheel": 5, "Animal Safari Ride": 8, "Ball Pit Dome": 6, "Train Adventure": 8,
+
+    # Entertainment (seating based, fixed wait)
+    "Live Stage": 10, "Street Parade": 5, "Magic Show": 10, "Circus Tent": 10, "Musical Fountain": 5,
+
+    # Food (variable)
+    "Food Court": 10, "Snack Bar": 5, "Ice Cream Kiosk": 4, "Pizza Plaza": 8, "Smoothie Station": 4,
+
+    # Shopping (minimal)
+    "Souvenir Shop": 3, "Candy Store": 2, "Photo Booth": 1, "Gift Emporium": 3, "Toy World": 3,
+
+    # Relaxation (no wait)
+    "Relaxation Garden": 0, "Shaded Benches": 0, "Quiet Lake View": 0, "Zen Courtyard": 0, "Sky Deck": 0
+}
+
+# Intensity used later for energy logic and pacing
+zone_intensity = {
+    "thrill": 0.95,         # High energy demand (e.g. roller coasters)
+    "water": 0.75,          # Swimming or flume-based attractions
+    "family": 0.55,         # Interactive but moderate exertion
+    "entertainment": 0.35,  # Low exertion, seated shows
+    "food": 0.15,           # Resting and eating
+    "shopping": 0.25,       # Low walking activity
+    "relaxation": 0.1       # Passive resting (benches, gardens)
+}
+
+wet_ride_names = {"Water Slide", "Wave Pool", "Splash Battle"}
+
+# Questionnaire answers -> planner inputs
+
+duration_map = {"<2 hrs": 90, "2–4 hrs": 180, "4–6 hrs": 300, "All day": 420}
+
+# Map walking preference to value
+walking_map = {
+    "Very short distances": 0.0,
+    "Moderate walking": 0.5,
+    "Don’t mind walking": 1.0
+}
+
+# Map wait tolerance to value
+wait_map = {
+    "<10 min": 0.0,
+    "10–20 min": 0.3,
+    "20–30 min": 0.6,
+    "30+ min": 1.0
+}
+
+age_energy_scaling = {
+    "Child":        {"loss_factor": 0.8, "rest_boost": 35, "food_boost": 20},
+    "Teen":         {"loss_factor": 1.0, "rest_boost": 30, "food_boost": 18},
+    "Young Adult":  {"loss_factor": 1.2, "rest_boost": 25, "food_boost": 15},
+    "Middle-aged":  {"loss_factor": 1.0, "rest_boost": 30, "food_boost": 18},
+    "Older Adult":  {"loss_factor": 1.3, "rest_boost": 40, "food_boost": 25},
+    "Adult":        {"loss_factor": 1.1, "rest_boost": 30, "food_boost": 18}, 
+}
+
+age_group_map = {
+    "Under 12": "Child",
+    "13–17": "Teen",
+    "18–30": "Young Adult",
+    "31–45": "Middle-aged",
+    "46–60": "Middle-aged",
+    "60+":    "Older Adult"
+}
+
+intense_rides = {"Roller Coaster", "Drop Tower", "Freefall Cannon", "Spinning Vortex"}
+
+WAIT_PENALTY_FACTOR = 0.02     
+INTENSITY_COMFORT_FACTOR = 0.2
+
+walking_speed = 67  # meters/min
+
+# 5A. Fuzzy inputs (user traits and ride traits)
+
+preference_input     = ctrl.Antecedent(np.arange(0, 11, 1), 'preference')        # 0–10: how much user likes the zone
+accessibility_input  = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'accessibility') # 0–1: ease of access
+wait_tolerance       = ctrl.Antecedent(np.arange(0, 1.1, 0.1), 'wait_tolerance')  # 0–1: patience for waiting
+walking_input        = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'walking')       # 0–1: walking comfort
+
+priority_thrill      = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_thrill')
+priority_food        = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_food')
+priority_comfort     = ctrl.Antecedent(np.arange(0, 2, 1), 'priority_comfort')
+
+intensity_input      = ctrl.Antecedent(np.arange(0.0, 1.1, 0.1), 'intensity')
+
+weight_output        = ctrl.Consequent(np.arange(0, 11, 1), 'weight')
+
+zone_repeat_count = ctrl.Antecedent(np.arange(0, 4, 1), 'zone_repeat_count') 
+
+food_interval = ctrl.Consequent(np.arange(60, 241, 1), 'food_interval')
+
+
+# 5B. Membership functions
+
+# Preference score from 0–10
+preference_input['low'] = fuzz.trimf(preference_input.universe, [0, 0, 5])
+preference_input['medium'] = fuzz.trimf(preference_input.universe, [2, 5, 8])
+preference_input['high'] = fuzz.trimf(preference_input.universe, [5, 10, 10])
+
+# Accessibility of the zone (0 = difficult, 1 = easy)
+accessibility_input['poor'] = fuzz.trimf(accessibility_input.universe, [0.0, 0.0, 0.5])
+accessibility_input['moderate'] = fuzz.trimf(accessibility_input.universe, [0.2, 0.5, 0.8])
+accessibility_input['good'] = fuzz.trimf(accessibility_input.universe, [0.5, 1.0, 1.0])
+
+# User’s wait tolerance
+wait_tolerance['low'] = fuzz.trimf(wait_tolerance.universe, [0.0, 0.0, 0.4])
+wait_tolerance['medium'] = fuzz.trimf(wait_tolerance.universe, [0.2, 0.5, 0.8])
+wait_tolerance['high'] = fuzz.trimf(wait_tolerance.universe, [0.6, 1.0, 1.0])
+
+# User’s walking tolerance
+walking_input['short'] = fuzz.trimf(walking_input.universe, [0.0, 0.0, 0.4])
+walking_input['medium'] = fuzz.trimf(walking_input.universe, [0.2, 0.5, 0.8])
+walking_input['long'] = fuzz.trimf(walking_input.universe, [0.6, 1.0, 1.0])
+
+# User priorities: thrill, food, comfort
+for priority in [priority_thrill, priority_food, priority_comfort]:
+    priority['no'] = fuzz.trimf(priority.universe, [0, 0, 1])
+    priority['yes'] = fuzz.trimf(priority.universe, [0, 1, 1])
+
+# Ride intensity (by zone)
+intensity_input['low'] = fuzz.trimf(intensity_input.universe, [0.0, 0.0, 0.4])
+intensity_input['medium'] = fuzz.trimf(intensity_input.universe, [0.3, 0.5, 0.7])
+intensity_input['high'] = fuzz.trimf(intensity_input.universe, [0.6, 1.0, 1.0])
+
+# Final weight score for each zone (0–10)
+weight_output['low'] = fuzz.trimf(weight_output.universe, [0, 0, 4])
+weight_output['medium'] = fuzz.trimf(weight_output.universe, [3, 5, 7])
+weight_output['high'] = fuzz.trimf(weight_output.universe, [6, 10, 10])
+
+food_interval['short'] = fuzz.trimf(food_interval.universe, [60, 90, 120])
+food_interval['medium'] = fuzz.trimf(food_interval.universe, [100, 135, 170])
+food_interval['long'] = fuzz.trimf(food_interval.universe, [160, 240, 240])
+
+zone_repeat_count['none'] = fuzz.trimf(zone_repeat_count.universe, [0, 0, 1])
+zone_repeat_count['few'] = fuzz.trimf(zone_repeat_count.universe, [0, 1, 2])
+zone_repeat_count['many'] = fuzz.trimf(zone_repeat_count.universe, [1, 3, 3])
+
+_weight_lock = threading.Lock()
+
+
+# 5C. Fuzzy Rules: Inputs → Weight Output
+
+def weight_simulation(top_zone, engine=None):
+    """Weight controller for visitors whose favourite zone is top_zone (the reinforcement rules differ)."""
+    return _weight_simulation(top_zone, engine or FUZZY_ENGINE)
+
+
+@lru_cache(maxsize=None)
+def _weight_simulation(top_zone, engine):
+    rules = []
+
+    # I. Core Logic: Preference × Accessibility
+    rules += [
+        ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high']),
+        ctrl.Rule(preference_input['high'] & accessibility_input['moderate'], weight_output['medium']),
+        ctrl.Rule(preference_input['high'] & accessibility_input['poor'], weight_output['medium']),
+
+        ctrl.Rule(preference_input['medium'] & accessibility_input['good'], weight_output['medium']),
+        ctrl.Rule(preference_input['medium'] & accessibility_input['moderate'], weight_output['medium']),
+        ctrl.Rule(preference_input['medium'] & accessibility_input['poor'], weight_output['low']),
+
+        ctrl.Rule(preference_input['low'], weight_output['low']),
+    ]
+
+    # II. User Profile Traits: Walk & Wait Tolerance
+    rules += [
+        ctrl.Rule(wait_tolerance['low'], weight_output['low']),
+        ctrl.Rule(wait_tolerance['high'], weight_output['high']),
+        ctrl.Rule(walking_input['short'], weight_output['low']),
+        ctrl.Rule(walking_input['long'], weight_output['high']),
+    ]
+
+    # III. User Declared Priorities
+    rules += [
+        ctrl.Rule(priority_thrill['yes'], weight_output['high']),
+        ctrl.Rule(priority_food['yes'], weight_output['medium']),
+        ctrl.Rule(priority_comfort['yes'], weight_output['medium']),
+    ]
+
+    # IV. Intensity Adjustment
+    rules += [
+        ctrl.Rule(intensity_input['high'] & preference_input['high'], weight_output['medium']),
+        ctrl.Rule(intensity_input['high'] & preference_input['low'], weight_output['low']),
+        ctrl.Rule(intensity_input['low'], weight_output['medium']),
+    ]
+
+    rules += [
+        ctrl.Rule(zone_repeat_count['many'], weight_output['low']),
+        ctrl.Rule(zone_repeat_count['few'], weight_output['medium']),
+        ctrl.Rule(zone_repeat_count['none'], weight_output['high']),
+    ]
+
+    # V. Top-Zone Reinforcement
+
+    reinforcement_rules = []
+    if top_zone == "thrill":
+        reinforcement_rules += [
+            ctrl.Rule(preference_input['high'] & priority_thrill['yes'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & wait_tolerance['medium'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & walking_input['medium'], weight_output['high'])
+        ]
+    elif top_zone == "family":
+        reinforcement_rules += [
+            ctrl.Rule(preference_input['high'] & walking_input['short'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
+        ]
+    elif top_zone == "water":
+        reinforcement_rules += [
+            ctrl.Rule(preference_input['high'] & wait_tolerance['high'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & walking_input['medium'], weight_output['high'])
+        ]
+    elif top_zone == "entertainment":
+        reinforcement_rules += [
+            ctrl.Rule(preference_input['high'] & wait_tolerance['medium'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
+        ]
+    elif top_zone == "shopping":
+        reinforcement_rules += [
+            ctrl.Rule(preference_input['high'] & walking_input['short'], weight_output['high']),
+            ctrl.Rule(preference_input['high'] & accessibility_input['good'], weight_output['high'])
+        ]
+
+    rules += reinforcement_rules
+
+    weight_ctrl = ctrl.ControlSystem(rules)
+    return new_simulation(weight_ctrl, engine)
+
+
+def compute_weight(top_zone, preference, accessibility, wait_tol, walking, priority_thrill, priority_food, priority_comfort, intensity, repeat_count, engine=None):
+    weight_sim = weight_simulation(top_zone, engine)
+    with _weight_lock:
+        weight_sim.input['preference'] = preference
+        weight_sim.input['accessibility'] = accessibility
+        weight_sim.input['wait_tolerance'] = wait_tol
+        weight_sim.input['walking'] = walking
+        weight_sim.input['priority_thrill'] = priority_thrill
+        weight_sim.input['priority_food'] = priority_food
+        weight_sim.input['priority_comfort'] = priority_comfort
+        weight_sim.input['intensity'] = intensity
+        weight_sim.input['zone_repeat_count'] = repeat_count
+        weight_sim.compute()
+        return weight_sim.output['weight']
+
+
+@lru_cache(maxsize=None)
+def get_fuzzy_weight(top_zone, preference, accessibility, wait_tol, walking, priority_thrill, priority_food, priority_comfort, intensity, repeat_count, engine=None):
+    return compute_weight(top_zone, preference, accessibility, wait_tol, walking, priority_thrill, priority_food, priority_comfort, intensity, repeat_count, engine)
+
+
+# 5D. Fuzzy Subsystem: Food Interval Estimation
+
+food_interval_rules = [
+    ctrl.Rule(preference_input['high'] & priority_food['yes'], food_interval['short']),
+    ctrl.Rule(preference_input['medium'] & priority_food['yes'], food_interval['medium']),
+    ctrl.Rule(preference_input['low'] | priority_food['no'], food_interval['long']),
+]
+
+food_interval_ctrl = ctrl.ControlSystem(food_interval_rules)
+
+# 5E. Fuzzy Rules: Energy Loss Estimation
+
+# Input: Ride intensity, walking time, age sensitivity
+intensity_input_energy = ctrl.Antecedent(np.arange(0, 1.1, 0.1), 'intensity')
+walk_time_input = ctrl.Antecedent(np.arange(0, 16, 1), 'walk_time')  # up to 15 minutes walk
+age_sensitivity_input = ctrl.Antecedent(np.arange(0.8, 1.4, 0.1), 'age_sensitivity')
+
+# Output: Energy lost per stop
+energy_loss_output = ctrl.Consequent(np.arange(0, 21, 1), 'energy_loss')  # 0–20 points per stop
+
+# Membership functions
+intensity_input_energy['low'] = fuzz.trimf(intensity_input_energy.universe, [0.0, 0.0, 0.4])
+intensity_input_energy['medium'] = fuzz.trimf(intensity_input_energy.universe, [0.3, 0.5, 0.7])
+intensity_input_energy['high'] = fuzz.trimf(intensity_input_energy.universe, [0.6, 1.0, 1.0])
+
+walk_time_input['short'] = fuzz.trimf(walk_time_input.universe, [0, 0, 5])
+walk_time_input['medium'] = fuzz.trimf(walk_time_input.universe, [3, 7, 11])
+walk_time_input['long'] = fuzz.trimf(walk_time_input.universe, [10, 15, 15])
+
+age_sensitivity_input['low'] = fuzz.trimf(age_sensitivity_input.universe, [0.8, 0.8, 1.0])
+age_sensitivity_input['medium'] = fuzz.trimf(age_sensitivity_input.universe, [0.9, 1.1, 1.2])
+age_sensitivity_input['high'] = fuzz.trimf(age_sensitivity_input.universe, [1.1, 1.3, 1.4])
+
+energy_loss_output['low'] = fuzz.trimf(energy_loss_output.universe, [0, 0, 8])
+energy_loss_output['medium'] = fuzz.trimf(energy_loss_output.universe, [5, 10, 15])
+energy_loss_output['high'] = fuzz.trimf(energy_loss_output.universe, [12, 20, 20])
+
+# Rules
+energy_loss_rules = [
+    ctrl.Rule(intensity_input_energy['high'] & walk_time_input['long'] & age_sensitivity_input['high'], energy_loss_output['high']),
+    ctrl.Rule(intensity_input_energy['high'] & walk_time_input['medium'], energy_loss_output['medium']),
+    ctrl.Rule(intensity_input_energy['medium'] & walk_time_input['medium'], energy_loss_output['medium']),
+    ctrl.Rule(intensity_input_energy['low'] & walk_time_input['short'], energy_loss_output['low']),
+    ctrl.Rule(age_sensitivity_input['low'] & intensity_input_energy['low'], energy_loss_output['low']),
+    ctrl.Rule(intensity_input_energy['medium'] & walk_time_input['long'], energy_loss_output['high']),
+    ctrl.Rule(walk_time_input['long'] & age_sensitivity_input['high'], energy_loss_output['high']),
+    ctrl.Rule(intensity_input_energy['high'] & age_sensitivity_input['low'], energy_loss_output['medium']),
+]
+
+energy_loss_ctrl = ctrl.ControlSystem(energy_loss_rules)
+
+
+def compute_energy_loss(intensity, walk_time, age_factor, energy_loss_sim):
+    try:
+        # Clamp to valid fuzzy input ranges
+        intensity = min(max(intensity, 0.0), 1.0)
+        walk_time = min(max(walk_time, 0), 15)
+        age_factor = min(max(age_factor, 0.8), 1.4)
+
+        energy_loss_sim.input['intensity'] = intensity
+        energy_loss_sim.input['walk_time'] = walk_time
+        energy_loss_sim.input['age_sensitivity'] = age_factor
+        energy_loss_sim.compute()
+
+        return energy_loss_sim.output['energy_loss']
+    except Exception as e:
+        print(f" Energy loss fallback due to: {e}")
+        return 8  # Safe default
+
+
+# 9B. Wet Ride Timing: Fuzzy Control Setup (robust to missing outputs)
+
+wet_ride_pref = ctrl.Antecedent(np.arange(0, 11, 1), 'wet_ride_pref')  
+comfort_priority = ctrl.Antecedent(np.arange(0, 2, 1), 'comfort_priority') 
+
+wet_time_position = ctrl.Consequent(np.arange(0, 101, 1), 'wet_time_position')  
+
+wet_ride_pref['low'] = fuzz.trimf(wet_ride_pref.universe, [0, 0, 5])
+wet_ride_pref['medium'] = fuzz.trimf(wet_ride_pref.universe, [3, 5, 7])
+wet_ride_pref['high'] = fuzz.trimf(wet_ride_pref.universe, [5, 10, 10])
+
+comfort_priority['no'] = fuzz.trimf(comfort_priority.universe, [0, 0, 1])
+comfort_priority['yes'] = fuzz.trimf(comfort_priority.universe, [0, 1, 1])
+
+wet_time_position['early'] = fuzz.trimf(wet_time_position.universe, [0, 0, 30])
+wet_time_position['mid']   = fuzz.trimf(wet_time_position.universe, [25, 50, 75])
+wet_time_position['late']  = fuzz.trimf(wet_time_position.universe, [70, 100, 100])
+
+wet_ride_rules = [
+    ctrl.Rule(wet_ride_pref['high'] & comfort_priority['no'], wet_time_position['early']),
+    ctrl.Rule(wet_ride_pref['medium'],                         wet_time_position['mid']),
+    ctrl.Rule(comfort_priority['yes'],                         wet_time_position['late']),
+]
+
+wet_time_ctrl = ctrl.ControlSystem(wet_ride_rules)
+
+def safe_compute_wet_time_pct(wet_pref_val: float, comfort_flag: bool, default_pct: float = 50.0, engine=None) -> float:
+
+    try:
+        wet_val = float(np.clip(wet_pref_val, wet_ride_pref.universe.min(), wet_ride_pref.universe.max()))
+        comfort_val = 1.0 if comfort_flag else 0.0
+
+        wet_time_sim = new_simulation(wet_time_ctrl, engine)
+        wet_time_sim.input['wet_ride_pref'] = wet_val
+        wet_time_sim.input['comfort_priority'] = comfort_val
+        wet_time_sim.compute()
+
+        pct = float(wet_time_sim.output.get('wet_time_position', default_pct))
+        if math.isnan(pct):
+            return default_pct
+        return float(np.clip(pct, 0.0, 100.0))
+    except Exception as e:
+
+        return default_pct
+
+
+# 10. Food Timing Estimation (Fuzzy)
+
+def preferred_food_gap(food_pref, priority_food_val, engine=None):
+    food_interval_sim = new_simulation(food_interval_ctrl, engine)
+    food_interval_sim.input['preference'] = food_pref
+    food_interval_sim.input['priority_food'] = priority_food_val
+    food_interval_sim.compute()
+
+    return int(np.clip(food_interval_sim.output['food_interval'], 60, 240))  # cap between 1h and 4h
+
+
+# 2. Questionnaire answers -> visitor profile
+
+def visitor_profile(data):
+    preference_ranks = {
+        "thrill": data["thrill"], "family": data["family"], "water": data["water"],
+        "entertainment": data["entertainment"], "food": data["food"],
+        "shopping": data["shopping"], "relaxation": data["relaxation"]
+    }
+    preferences = {k: 8 - v for k, v in preference_ranks.items()}
+    priorities = data["priorities"]
+
+    # Priority flags
+    priority_thrill_val = 1.0 if "Enjoying high-intensity rides" in priorities else 0.0
+    priority_food_val = 1.0 if "Having regular food and rest breaks" in priorities else 0.0
+    priority_comfort_val = 1.0 if "Staying comfortable throughout the visit" in priorities else 0.0
+
+    raw_age = data.get("age", "Adult")
+    user_age_group = age_group_map.get(raw_age, "Adult")
+
+    return {
+        "preferences": preferences,
+        "top_zone": max(preferences, key=preferences.get),
+        "priority_thrill_val": priority_thrill_val,
+        "priority_food_val": priority_food_val,
+        "priority_comfort_val": priority_comfort_val,
+        "walking_val": walking_map.get(data["walking"], 0.5),
+        "wait_val": wait_map.get(data["wait_time"], 0.5),
+        "break_pref": data["break"],
+        "visit_duration": duration_map.get(data["duration"], 180),
+        "energy_settings": age_energy_scaling[user_age_group],
+        "is_child": data["age"] == "Under 12",
+    }
+
+
+def zones_for(profile):
+    """Zones open to this visitor: intense rides are removed for children."""
+    if not profile["is_child"]:
+        return zones
+    available = copy.deepcopy(zones)
+    for ride in intense_rides:
+        for zone_list in available.values():
+            if ride in zone_list:
+                zone_list.remove(ride)
+    return available
+
+
+# 6. Fuzzy Weight Evaluation and Zone Scoring
+
+def zone_weights(profile, engine=None):
+    weights = {}
+
+    for zone in zones:
+        pref = profile["preferences"][zone]
+        acc = accessibility_factors[zone]
+        intensity = zone_intensity[zone]
+
+        repeat_count = 0  # Fallback for now unless using real sequencing context
+
+        weights[zone] = compute_weight(
+            profile["top_zone"], pref, acc, profile["wait_val"], profile["walking_val"],
+            1.0 if zone == "thrill" and profile["priority_thrill_val"] else 0.0,
+            1.0 if zone == "food" and profile["priority_food_val"] else 0.0,
+            1.0 if zone == "relaxation" and profile["priority_comfort_val"] else 0.0,
+            intensity, repeat_count, engine
+        )
+
+    for zone in ["food", "relaxation"]:
+        if zone in weights:
+            weights[zone] = min(weights[zone], 4.5)  # limit to moderate level
+
+    total_weight = sum(weights.values())
+    if total_weight > 0:
+        return {z: w / total_weight for z, w in weights.items()}
+    return {z: 1 / len(weights) for z in weights}
+
+
+# 7. Attraction Scoring Based on Zone Weights + Rhythm
+
+def score_attractions(profile, available_zones, engine=None):
+    attraction_scores = {}
+    recent_zones = []
+    preferences = profile["preferences"]
+
+    # Scoring runs before the wet-ride position is estimated, so it always sees the midday default
+    wet_time_pct = 50
+
+    for zone in ["thrill", "water", "family", "entertainment", "shopping"]:
+        attractions = available_zones[zone]
+        for attraction in attractions:
+            wait_time = attraction_wait_times.get(attraction, 0)
+            duration = attraction_durations.get(attraction, 5)
+            intensity = zone_intensity.get(zone, 0.5)
+            acc = accessibility_factors.get(zone, 1.0)
+            pref = preferences.get(zone, 5)
+            user_pref = pref / 10.0
+            is_wet = attraction in wet_ride_names
+
+            wet_time_threshold = wet_time_pct
+            comfort_penalty = 1.0
+            if is_wet and profile["priority_comfort_val"] and wet_time_threshold < 35:
+                comfort_penalty = 0.7
+
+            repeat_count = recent_zones.count(zone)
+            repeat_count = min(repeat_count, 3)
+
+            fuzzy_weight = get_fuzzy_weight(
+                profile["top_zone"], pref, acc, profile["wait_val"], profile["walking_val"],
+                1.0 if zone == "thrill" and profile["priority_thrill_val"] else 0.0,
+                1.0 if zone == "food" and profile["priority_food_val"] else 0.0,
+                1.0 if zone == "relaxation" and profile["priority_comfort_val"] else 0.0,
+                intensity, repeat_count, engine
+            )
+
+            score = (
+                fuzzy_weight *
+                user_pref *
+                (1 - WAIT_PENALTY_FACTOR * wait_time) *
+                (1 + INTENSITY_COMFORT_FACTOR * (1 - intensity)) *
+                comfort_penalty
+            )
+
+            attraction_scores[attraction] = score
+            recent_zones.append(zone)
+            if len(recent_zones) > 4:
+                recent_zones.pop(0)
+
+    return attraction_scores
+
+
+# 8. Smart Initial Attraction Selection with Rhythm
+
+def select_attractions(attraction_scores, available_zones, visit_duration):
+    initial_attractions = []
+    time_budget = visit_duration + 15
+    current_time_used = 0
+    recent_zones = []
+
+    # Sort attractions by fuzzy-enhanced score (high to low)
+    ranked_attractions = sorted(attraction_scores, key=lambda a: attraction_scores[a], reverse=True)
+
+    for attraction in ranked_attractions:
+        zone = next((z for z, a_list in available_zones.items() if attraction in a_list), None)
+        if not zone:
+            continue
+
+        ride_time = attraction_durations.get(attraction, 0)
+        wait_time = attraction_wait_times.get(attraction, 0)
+        time_required = ride_time + wait_time
+
+        if current_time_used + time_required > time_budget:
+            continue
+
+        if recent_zones[-2:] == [zone, zone]:
+            continue
+
+        initial_attractions.append(attraction)
+        current_time_used += time_required
+        recent_zones.append(zone)
+
+        if len(recent_zones) > 4:
+            recent_zones.pop(0)
+
+    return initial_attractions
+
+
+# 9. Route Optimization and Wet Ride Scheduling
+
+def nearest_relaxation_spot(from_attraction):
+    last_loc = attraction_coordinates[from_attraction]
+    return min(
+        zones["relaxation"],
+        key=lambda spot: calculate_distance(last_loc, attraction_coordinates[spot])
+    )
+
+# 9A. Route Distance Functions
+
+def calculate_distance(point_a, point_b):
+    if isinstance(point_a, str):
+        point_a = attraction_coordinates[point_a]
+    if isinstance(point_b, str):
+        point_b = attraction_coordinates[point_b]
+    x1, y1 = point_a
+    x2, y2 = point_b
+    return math.hypot(x2 - x1, y2 - y1)
+
+def reorder_by_distance(route, start_location=(0, 0)):
+    reordered = []
+    current = start_location
+    remaining = [r for r in route if r in attraction_coordinates]
+
+    while remaining:
+        next_stop = min(remaining, key=lambda r: calculate_distance(current, attraction_coordinates[r]))
+        reordered.append(next_stop)
+        current = attraction_coordinates[next_stop]
+        remaining.remove(next_stop)
+
+    return reordered
+
+def greedy_route(attractions, start_with=None):
+    route = []
+    pool = attractions.copy()
+
+    if start_with and start_with in pool:
+        route.append(start_with)
+        current = attraction_coordinates[start_with]
+        pool.remove(start_with)
+    else:
+        current = (0, 0)  # Default: Entrance
+
+    while pool:
+        next_attraction = min(pool, key=lambda a: calculate_distance(current, attraction_coordinates[a]))
+        route.append(next_attraction)
+        current = attraction_coordinates[next_attraction]
+        pool.remove(next_attraction)
+
+    return route
+
+
+def schedule_wet_rides_midday(route, wet_rides, zones, wet_time_pct):
+
+    wet_block = [a for a in route if a in wet_rides]
+    dry_block = [a for a in route if a not in wet_rides and not a.startswith("[Clothing Change]")]
+
+    if not wet_block:
+        return route
+
+    # Insert clothing change after wet rides
+    change_stop = "[Clothing Change] Shower & Changing Room"
+    if change_stop not in wet_block and change_stop not in dry_block:
+        wet_block.append(change_stop)
+
+    # Insert wet block into middle of dry block
+    insert_pos = int((wet_time_pct / 100) * len(dry_block))
+    insert_pos = min(max(1, insert_pos), len(dry_block)-1)
+    merged = dry_block[:insert_pos] + wet_block + dry_block[insert_pos:]
+
+    last_wet_idx = merged.index(wet_block[-1])
+    after_wet = merged[last_wet_idx + 1:]
+
+    fillers = [a for a in after_wet if any(a in zones[z] for z in ["family", "entertainment"])]
+    filler_count = 2 if len(fillers) >= 2 else 1 if fillers else 0
+    selected_fillers = fillers[:filler_count]
+
+    merged = [a for a in merged if a not in selected_fillers]
+
+    insert_pos = merged.index(wet_block[-1]) + 1
+    merged = merged[:insert_pos] + selected_fillers + merged[insert_pos:]
+
+    return merged
+
+
+# 11. Final Route Cleanup (No Consecutive Breaks)
+
+def no_consecutive_food_or_break(route, zones):
+
+    def is_soft(stop):
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        return zone in {"food", "relaxation"}
+
+    result = []
+    i = 0
+    while i < len(route):
+        current_stop = route[i]
+        result.append(current_stop)
+
+        # Check next stop
+        if i + 1 < len(route):
+            next_stop = route[i + 1]
+
+            if is_soft(current_stop) and is_soft(next_stop):
+                # Look ahead for next non-soft to swap
+                swap_idx = i + 2
+                while swap_idx < len(route):
+                    if not is_soft(route[swap_idx]):
+                        # Swap next_stop with this
+                        route[i + 1], route[swap_idx] = route[swap_idx], route[i + 1]
+                        break
+                    swap_idx += 1
+
+        i += 1
+
+    return route
+
+
+# 12. Break and Meal Insertion Logic
+
+def reorder_medium_intensity(route):
+    medium_stops = []
+    other_stops = []
+
+    for stop in route:
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        if zone is None:
+            other_stops.append(stop)
+            continue
+
+        intensity = zone_intensity.get(zone, 0)
+        if 0.3 <= intensity <= 0.7:
+            medium_stops.append(stop)
+        else:
+            other_stops.append(stop)
+
+    reordered = []
+    m_idx = 0
+    for i, stop in enumerate(other_stops):
+        reordered.append(stop)
+        if i % 2 == 1 and m_idx < len(medium_stops):
+            reordered.append(medium_stops[m_idx])
+            m_idx += 1
+    reordered += medium_stops[m_idx:]
+    return reordered
+
+
+
+def insert_breaks(route, break_pref, energy_settings, energy_loss_sim):
+    updated = []
+    elapsed_since_break = 0
+    elapsed_since_food = 0
+    meal_activity_counter = 0
+    last_break_time = -999
+    last_meal_time = -999
+    total_elapsed_time = 0
+    energy_level = 100
+    current_location = (0, 0)
+
+    used_break_spots = set()
+    used_food_spots = set()
+    meal_break_count = 0
+    max_meals = 2
+
+    MIN_FOOD_GAP_MINUTES = 180
+    MIN_FOOD_GAP_ACTIVITIES = 3
+    MIN_BREAK_FOOD_SPACING = 30
+    WALKING_SPEED = 50
+
+    start_time_clock = datetime.strptime("10:00", "%H:%M")
+
+    activities_since_last_meal = 0
+
+    wet_start = None
+    wet_end = None
+    for i, stop in enumerate(route):
+        if stop in wet_ride_names or stop.startswith("[Clothing Change]"):
+            if wet_start is None:
+                wet_start = i
+            wet_end = i
+
+    for i, stop in enumerate(route):
+        in_wet_block = wet_start is not None and wet_start <= i <= wet_end
+        updated.append(stop)
+
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        if zone is None:
+            continue
+
+        duration = attraction_durations.get(stop, 5)
+        wait = attraction_wait_times.get(stop, 0)
+        walk_dist_units = calculate_distance(current_location, attraction_coordinates[stop])
+        walk_dist_meters = walk_dist_units * SCALE_FACTOR_METERS_PER_UNIT
+        walk_time = max(2, round(walk_dist_meters / WALKING_SPEED))
+
+        total_this_stop = duration + wait + walk_time
+        current_clock = start_time_clock + timedelta(minutes=total_elapsed_time)
+
+        total_elapsed_time += total_this_stop
+        elapsed_since_break += total_this_stop
+        elapsed_since_food += total_this_stop
+        meal_activity_counter += 1
+
+        is_soft = zone in ["food", "relaxation"]
+        if not is_soft:
+            activities_since_last_meal += 1
+
+        intensity_val = zone_intensity.get(zone, 1.0)
+        age_sens = energy_settings['loss_factor']
+        energy_loss = compute_energy_loss(intensity_val, walk_time, age_sens, energy_loss_sim)
+        energy_level = max(0, energy_level - energy_loss)
+
+        if in_wet_block:
+            current_location = attraction_coordinates[stop]
+            continue
+
+        # REST INSERTION - Flexible 
+        if (
+            break_pref == "Flexible"
+            and energy_level < 20
+            and elapsed_since_break > 10
+            and (total_elapsed_time - last_break_time) > MIN_BREAK_FOOD_SPACING
+            and zone not in ["relaxation", "food"]
+        ):
+            relax_options = [s for s in zones["relaxation"] if s not in used_break_spots and s not in updated]
+            if relax_options:
+                best_relax = min(relax_options, key=lambda s: calculate_distance(attraction_coordinates[stop], attraction_coordinates[s]))
+                updated.append(best_relax)
+                used_break_spots.add(best_relax)
+                elapsed_since_break = 0
+                energy_level = min(100, energy_level + energy_settings['rest_boost'])
+                last_break_time = total_elapsed_time
+                activities_since_last_meal = 0
+
+
+        # REST INSERTION - Scheduled 
+        needs_break = (
+            (break_pref == "After 1 hour" and elapsed_since_break >= 60) or
+            (break_pref == "After 2 hours" and elapsed_since_break >= 120) or
+            (break_pref == "After every big ride" and stop in {"Roller Coaster", "Drop Tower", "Log Flume", "Water Slide"})
+        )
+
+        if (
+            needs_break
+            and energy_level >= 20
+            and (total_elapsed_time - last_break_time) > MIN_BREAK_FOOD_SPACING
+            and zone not in ["relaxation", "food"]
+            and activities_since_last_meal >= 2
+        ):
+            relax_options = [s for s in zones["relaxation"] if s not in used_break_spots and s not in updated]
+            if relax_options:
+                best_relax = min(relax_options, key=lambda s: calculate_distance(attraction_coordinates[stop], attraction_coordinates[s]))
+                updated.append(best_relax)
+                used_break_spots.add(best_relax)
+                elapsed_since_break = 0
+                energy_level = min(100, energy_level + energy_settings['rest_boost'])
+                last_break_time = total_elapsed_time
+                activities_since_last_meal = 0
+
+        # MEAL INSERTION
+        can_add_meal_now = (elapsed_since_food >= MIN_FOOD_GAP_MINUTES)
+        min_elapsed_to_allow_meal = 120
+        can_schedule_meal_time = total_elapsed_time >= min_elapsed_to_allow_meal
+
+        if (
+            can_schedule_meal_time
+            and can_add_meal_now
+            and meal_activity_counter >= MIN_FOOD_GAP_ACTIVITIES
+            and meal_break_count < max_meals
+            and zone not in ["relaxation", "food"]
+            and (last_break_time == -999 or total_elapsed_time - last_break_time >= MIN_BREAK_FOOD_SPACING)
+            and (last_meal_time == -999 or total_elapsed_time - last_meal_time >= MIN_BREAK_FOOD_SPACING)
+        ):
+            food_options = [f for f in zones["food"] if f not in used_food_spots and f not in updated]
+            if food_options:
+                best_food = min(food_options, key=lambda f: calculate_distance(attraction_coordinates[stop], attraction_coordinates[f]))
+                updated.append(best_food)
+                used_food_spots.add(best_food)
+                elapsed_since_food = 0
+                meal_activity_counter = 0
+                meal_break_count += 1
+                last_meal_time = total_elapsed_time
+                energy_level = min(100, energy_level + energy_settings['food_boost'])
+                activities_since_last_meal = 0
+
+        current_location = attraction_coordinates[stop]
+
+    while updated:
+        zone = next((z for z, a in zones.items() if updated[-1] in a), None)
+        if zone in ["food", "relaxation"]:
+            updated.pop()
+        else:
+            break
+    
+    return updated
+
+    
+def move_meals_after_two_hours(route, min_elapsed=120):
+
+    meals_to_shift = []
+    before_limit = []
+    after_limit = []
+
+    total_time = 0
+    previous_location = (0, 0)
+
+    for stop in route:
+        if stop.startswith("[Clothing Change]"):
+            total_time += CLOTHING_CHANGE_DURATION
+            target_list = after_limit if total_time >= min_elapsed else before_limit
+            target_list.append(stop)
+            continue
+
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        if zone is None:
+            total_time += 5
+            target_list = after_limit if total_time >= min_elapsed else before_limit
+            target_list.append(stop)
+            continue
+
+        duration = attraction_durations.get(stop, 5)
+        wait = attraction_wait_times.get(stop, 0)
+        walk_dist_units = calculate_distance(previous_location, attraction_coordinates[stop])
+        walk_dist_meters = walk_dist_units * SCALE_FACTOR_METERS_PER_UNIT
+        walk_time = max(2, round(walk_dist_meters / 50))
+
+        total_this_stop = duration + wait + walk_time
+
+        if zone == "food":
+            # Always shift meals out
+            meals_to_shift.append(stop)
+        else:
+            if total_time >= min_elapsed:
+                after_limit.append(stop)
+            else:
+                before_limit.append(stop)
+
+        total_time += total_this_stop
+        previous_location = attraction_coordinates[stop]
+
+    final_route = before_limit
+    final_route.extend(meals_to_shift)
+    final_route.extend(after_limit)
+
+    return final_route
+    
+
+def enforce_max_two_meals(route):
+    cleaned = []
+    food_count = 0
+    food_seen = set()
+
+    for stop in route:
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        if zone == "food":
+            if stop not in food_seen and food_count < 2:
+                cleaned.append(stop)
+                food_seen.add(stop)
+                food_count += 1
+            # else skip duplicate
+        else:
+            cleaned.append(stop)
+    return cleaned
+
+
+# 13. Final Route Optimization and Tweaks
+
+def remove_trailing_breaks(route):
+    while route:
+        zone = next((z for z, a in zones.items() if route[-1] in a), None)
+        if zone in ["food", "relaxation"]:
+            route.pop()
+        else:
+            break
+    return route
+
+
+def trim_to_duration(full_allocated_plan, visit_duration):
+    # Trim plan to fit within visit duration
+    trimmed_plan = []
+    time_used = 0
+    previous_location = (0, 0)
+
+    for stop in full_allocated_plan:
+        if stop.startswith("[Clothing Change]"):
+            stop_time = CLOTHING_CHANGE_DURATION
+        else:
+            ride_time = attraction_durations.get(stop, 5)
+            wait_time = attraction_wait_times.get(stop, 0)
+
+            if stop in attraction_coordinates:
+                walk_units = calculate_distance(previous_location, attraction_coordinates[stop])
+                previous_location = attraction_coordinates[stop]
+            else:
+                walk_units = 0  # Default to 0 if unknown
+
+            walk_meters = walk_units * SCALE_FACTOR_METERS_PER_UNIT
+            walk_time = max(1, round(walk_meters / walking_speed))
+            stop_time = ride_time + wait_time + walk_time
+
+        if time_used + stop_time > visit_duration + 15:
+            break
+
+        trimmed_plan.append(stop)
+        time_used += stop_time
+
+    return trimmed_plan
+
+
+# 14. Energy Simulation for final_plan
+
+SAMPLING_INTERVAL = 5
+
+def simulate_energy(final_plan, energy_settings, energy_loss_sim):
+    """Minute-by-minute energy level over the plan; returns (time_timeline, energy_timeline, stop_label_points)."""
+    energy = 100
+    energy_timeline = [energy]
+    time_timeline = [0]
+    stop_label_points = []
+
+    elapsed_time = 0
+    previous_location = (0, 0)
+
+    for stop in final_plan:
+        zone = next((z for z, a in zones.items() if stop in a), None)
+        if zone is None:
+            continue
+
+        intensity = zone_intensity.get(zone, 1.0)
+        duration = attraction_durations.get(stop, 5)
+        wait = attraction_wait_times.get(stop, 0)
+        walk_units = calculate_distance(previous_location, attraction_coordinates[stop])
+        walk_meters = walk_units * SCALE_FACTOR_METERS_PER_UNIT
+        walk_time = max(1, round(walk_meters / walking_speed))
+        total_this_stop = duration + wait + walk_time
+
+        adjusted_rest_boost = energy_settings['rest_boost'] * (2 - energy_settings['loss_factor'])
+        adjusted_food_boost = energy_settings['food_boost'] * (2 - energy_settings['loss_factor'])
+
+        if zone in ["relaxation", "food"]:
+            boost = adjusted_rest_boost if zone == "relaxation" else adjusted_food_boost
+            for minute in range(duration):
+                energy += boost / duration
+                energy = min(100, energy)
+                if minute % SAMPLING_INTERVAL == 0 or minute == duration - 1:
+                    energy_timeline.append(energy)
+                    time_timeline.append(elapsed_time)
+                elapsed_time += 1
+        else:
+            energy_loss = compute_energy_loss(intensity, walk_time, energy_settings['loss_factor'], energy_loss_sim)
+            loss_per_minute = energy_loss / max(1, total_this_stop)
+            for minute in range(total_this_stop):
+                energy -= loss_per_minute
+                if intensity < 0.3:
+                    energy += (adjusted_rest_boost * 0.2) / total_this_stop
+                energy = max(0, min(100, energy))
+                if minute % SAMPLING_INTERVAL == 0 or minute == total_this_stop - 1:
+                    energy_timeline.append(energy)
+                    time_timeline.append(elapsed_time)
+                elapsed_time += 1
+
+        previous_location = attraction_coordinates[stop]
+        stop_label_points.append((elapsed_time, energy, stop, zone))
+
+    if final_plan:
+        last_stop = final_plan[-1]
+        last_zone = next((z for z, a in zones.items() if last_stop in a), None)
+        if not stop_label_points or stop_label_points[-1][2] != last_stop:
+            stop_label_points.append((elapsed_time, energy, last_stop, last_zone))
+
+    return time_timeline, energy_timeline, stop_label_points
+
+
+PLAN_STAGES = [
+    "zone_weights", "scoring", "selection", "reorder_by_distance", "schedule_wet_rides_midday",
+    "insert_breaks", "trimming", "energy_simulation",
+]
+
+
+@contextmanager
+def _stage(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + elapsed
+        if TELEMETRY_ENABLED:
+            record(f"planner.{name}", elapsed)
+
+
+def plan_stops(data, timings=None, engine=None):
+    """Every stage of plan_tour() before the energy simulation.
+
+    Returns (profile, final_plan, energy_loss_sim); the simulation carries the
+    state insert_breaks() left it in, which simulate_energy() depends on.
+    """
+    engine = engine or FUZZY_ENGINE
+    profile = visitor_profile(data)
+    available_zones = zones_for(profile)
+
+    with _stage(timings, "zone_weights"):
+        zone_weights(profile, engine)
+    with _stage(timings, "scoring"):
+        attraction_scores = score_attractions(profile, available_zones, engine)
+    with _stage(timings, "selection"):
+        initial_attractions = select_attractions(attraction_scores, available_zones, profile["visit_duration"])
+
+    with _stage(timings, "reorder_by_distance"):
+        first_pref_attraction = next(
+            (a for a in zones[profile["top_zone"]] if a in initial_attractions),
+            None
+        )
+        optimized_initial = reorder_by_distance(
+            initial_attractions,
+            start_location=attraction_coordinates[first_pref_attraction] if first_pref_attraction else (0, 0)
+        )
+
+    with _stage(timings, "schedule_wet_rides_midday"):
+        wet_time_pct = safe_compute_wet_time_pct(
+            profile["preferences"].get("water", 5), bool(profile["priority_comfort_val"]), engine=engine
+        )
+        wet_scheduled = schedule_wet_rides_midday(optimized_initial, wet_ride_names, zones, wet_time_pct)
+
+    with _stage(timings, "insert_breaks"):
+        preferred_food_gap(profile["preferences"]["food"], profile["priority_food_val"], engine)
+
+        # One energy simulation for the whole plan: its carried-over state is part of the result
+        energy_loss_sim = new_simulation(energy_loss_ctrl, engine)
+
+        # Insert breaks and meals
+        full_allocated_plan = insert_breaks(wet_scheduled, profile["break_pref"], profile["energy_settings"], energy_loss_sim)
+        full_allocated_plan = list(dict.fromkeys(full_allocated_plan))  # Remove exact duplicates
+
+    with _stage(timings, "trimming"):
+        final_plan = remove_trailing_breaks(trim_to_duration(full_allocated_plan, profile["visit_duration"]))
+    return profile, final_plan, energy_loss_sim
+
+
+def plan_tour(data, timings=None, engine=None):
+    """Plan a visit for one set of questionnaire answers (st.session_state["questionnaire"]).
+
+    Pass a dict as timings to get the seconds spent in each of PLAN_STAGES, and
+    engine to override FUZZY_ENGINE.
+    """
+    profile, final_plan, energy_loss_sim = plan_stops(data, timings, engine)
+    with _stage(timings, "energy_simulation"):
+        time_timeline, energy_timeline, stop_label_points = simulate_energy(final_plan, profile["energy_settings"], energy_loss_sim)
+
+    return {
+        "final_plan": final_plan,
+        "visit_duration": profile["visit_duration"],
+        "energy_settings": profile["energy_settings"],
+        "time_timeline": time_timeline,
+        "energy_timeline": energy_timeline,
+        "stop_label_points": stop_label_points,
+    }
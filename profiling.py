@@ -0,0 +1,132 @@
+# On-demand cProfile capture of page runs, for reproducing a slow visitor profile.
+#
+# Open any page with ?profile=<token> to arm profiling for that session (the
+# token is PROFILE_TOKEN, or profile_token under [admin] in secrets.toml);
+# ?profile=off disarms it. While armed, every page run is executed under
+# cProfile and written to PROFILE_DIR as
+#   <page>_<unique_id>_<profile hash>_<time>.pstats     (pstats / snakeviz)
+#   <page>_<unique_id>_<profile hash>_<time>.collapsed  (flamegraph.pl, speedscope)
+# where the profile hash is content_key() of the questionnaire answers.
+#
+# Without a configured token the check returns before touching the session, so
+# normal visitors pay nothing.
+
+import contextvars
+import cProfile
+import hmac
+import os
+import pstats
+import runpy
+import time
+from functools import lru_cache
+
+import streamlit as st
+
+from cache import content_key
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+ARMED_KEY = "_profiling_armed"
+
+_inside_profile = contextvars.ContextVar("inside_profile", default=False)
+
+
+@lru_cache(maxsize=1)
+def _profile_token():
+    token = os.environ.get("PROFILE_TOKEN")
+    if token is None:
+        try:
+            token = st.secrets.get("admin", {}).get("profile_token")
+        except FileNotFoundError:
+            token = None
+    return token or None
+
+
+def _armed():
+    value = st.query_params.get("profile")
+    if value == "off":
+        st.session_state.pop(ARMED_KEY, None)
+    elif value is not None and hmac.compare_digest(value.encode(), _profile_token().encode()):
+        st.session_state[ARMED_KEY] = True
+    return st.session_state.get(ARMED_KEY, False)
+
+
+def profile_page(script_path, page):
+    """Call at the top of a page: when the session is armed, runs the page under cProfile and stops."""
+    if _profile_token() is None or _inside_profile.get() or not _armed():
+        return
+
+    profiler = cProfile.Profile()
+    token = _inside_profile.set(True)
+    try:
+        profiler.enable()
+        runpy.run_path(script_path, run_name="__main__")
+    finally:
+        # st.stop() and st.switch_page() end the run with an exception; the
+        # profile is still written before it propagates
+        profiler.disable()
+        _inside_profile.reset(token)
+        write_profile(profiler, page)
+    st.stop()
+
+
+def profile_name(page):
+    unique_id = st.session_state.get("unique_id") or "anonymous"
+    answers = st.session_state.get("questionnaire")
+    profile_hash = content_key(answers)[:12] if answers else "noprofile"
+    return f"{page}_{unique_id}_{profile_hash}_{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+def write_profile(profiler, page):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, profile_name(page))
+        profiler.dump_stats(base + ".pstats")
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {weight}\n" for stack, weight in collapsed_stacks(pstats.Stats(profiler)))
+        print(f" Profile written to {base}.pstats")
+    except Exception as e:
+        print(f" Profile capture failed due to: {e}")
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == "~":
+        return name  # built-ins, e.g. <built-in method time.sleep>
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats, min_us=1):
+    """Approximate collapsed stacks ("a;b;c <microseconds>") from a cProfile call graph.
+
+    cProfile only records caller -> callee edges, so a function's own time is
+    split across its call paths in proportion to the time each caller spent in it.
+    """
+    callees = {}
+    roots = []
+    for func, (_, _, _, cumulative, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    totals = {}
+
+    def walk(func, path, share):
+        _, _, own, cumulative, _ = stats.stats[func]
+        path = path + [_label(func)]
+        key = ";".join(path)
+        totals[key] = totals.get(key, 0.0) + own * share
+        for callee, edge_cumulative in callees.get(func, ()):
+            callee_cumulative = stats.stats[callee][3]
+            callee_share = share * edge_cumulative / callee_cumulative if callee_cumulative else 0.0
+            # Skip recursion back into a frame already on the path and negligible branches
+            if _label(callee) in path or callee_share * callee_cumulative * 1e6 < min_us:
+                continue
+            walk(callee, path, callee_share)
+
+    for root in roots:
+        walk(root, [], 1.0)
+
+    return sorted(
+        (stack, round(seconds * 1e6)) for stack, seconds in totals.items() if seconds * 1e6 >= min_us
+    )
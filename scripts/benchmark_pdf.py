@@ -0,0 +1,49 @@
+# Per-document latency of the participant summary PDF engines.
+#
+# Usage: python -m scripts.benchmark_pdf [--docs 50]
+
+import argparse
+import statistics
+import time
+
+from documents import PDF_ENGINES, generate_pdf, merge_with_consent
+from plan_format import PlanStop, encode_plan
+
+SAMPLE_PLAN = encode_plan([
+    PlanStop(name, kind, i * 35, 5, 20, 10)
+    for i, (name, kind) in enumerate(
+        [("Roller Coaster", "ride"), ("Log Flume", "ride"), ("Food Court", "meal"), ("Magic Show", "ride"), ("Sky Deck", "rest")] * 3
+    )
+])
+SAMPLE_ARGS = ("a1b2c3", SAMPLE_PLAN, "412", "8", "4", "5", "3", "4", "2", "The plan felt well paced — thank you!", True)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark summary PDF rendering engines")
+    parser.add_argument("--docs", type=int, default=50, help="Documents rendered per engine")
+    parser.add_argument("--merge", action="store_true", help="Include the merge with the consent form")
+    args = parser.parse_args()
+
+    for engine in PDF_ENGINES:
+        generate_pdf(*SAMPLE_ARGS, engine=engine)  # warm up fonts and imports
+        timings = []
+        for _ in range(args.docs):
+            start = time.perf_counter()
+            pdf = generate_pdf(*SAMPLE_ARGS, engine=engine)
+            if args.merge:
+                pdf = merge_with_consent(pdf)
+            timings.append(1000 * (time.perf_counter() - start))
+        size = len(pdf) if isinstance(pdf, bytes) else len(pdf.getvalue())
+        print(
+            f"{engine:>10}: mean {statistics.mean(timings):7.2f} ms  p50 {percentile(timings, 50):7.2f} ms  "
+            f"p95 {percentile(timings, 95):7.2f} ms  size {size / 1024:6.1f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# Per-stage latency of the tour planner over synthetic visitor profiles.
+#
+# Profiles are reproducible for a given --seed: --all plans one profile for each
+# of the 5,040 preference orderings; otherwise --profiles orderings are sampled.
+# Every other answer (age group, duration, priority combination, wait bucket,
+# walking and break option) is drawn from the same seeded generator.
+#
+# Usage: python -m scripts.benchmark_planner [--profiles 500 | --all] [--json out.json] [--baseline base.json]
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+
+from constants import AGE_GROUPS, DURATIONS, PRIORITY_OPTIONS, WALKING_OPTIONS, BREAK_OPTIONS
+from planner import PLAN_STAGES, plan_tour, weight_simulation
+from scripts.benchmark_pdf import percentile
+from warmup import PREFERENCE_ZONES, WAIT_CATEGORIES
+
+ORDERINGS = list(itertools.permutations(PREFERENCE_ZONES))
+# The questionnaire accepts up to three priorities
+PRIORITY_SETS = [list(combo) for size in range(4) for combo in itertools.combinations(PRIORITY_OPTIONS, size)]
+
+PERCENTILES = (50, 95, 99)
+
+
+def synthetic_profiles(count=None, seed=0):
+    rng = random.Random(seed)
+    orderings = ORDERINGS if count is None else rng.sample(ORDERINGS, min(count, len(ORDERINGS)))
+    profiles = []
+    for order in orderings:
+        profile = {zone: order.index(zone) + 1 for zone in PREFERENCE_ZONES}
+        profile.update({
+            "age": rng.choice(AGE_GROUPS),
+            "duration": rng.choice(DURATIONS),
+            "accessibility": "No",
+            "priorities": rng.choice(PRIORITY_SETS),
+            "wait_time": rng.choice(WAIT_CATEGORIES),
+            "walking": rng.choice(WALKING_OPTIONS),
+            "break": rng.choice(BREAK_OPTIONS),
+        })
+        profiles.append(profile)
+    return profiles
+
+
+def run(profiles):
+    samples = {stage: [] for stage in PLAN_STAGES + ["total"]}
+    # The planner prints a line for every energy-loss fallback; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for profile in profiles:
+            timings = {}
+            start = time.perf_counter()
+            plan_tour(profile, timings=timings)
+            samples["total"].append(1000 * (time.perf_counter() - start))
+            for stage in PLAN_STAGES:
+                samples[stage].append(1000 * timings.get(stage, 0.0))
+    return {
+        stage: {f"p{pct}_ms": round(percentile(values, pct), 3) for pct in PERCENTILES}
+        for stage, values in samples.items()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Print the change against a baseline report; returns the stages whose p50 regressed beyond tolerance (%)."""
+    regressions = []
+    print(f"\n{'stage':<28}" + "".join(f"{f'p{pct} change':>14}" for pct in PERCENTILES))
+    for stage, stats in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if not base:
+            continue
+        changes = []
+        for pct in PERCENTILES:
+            key = f"p{pct}_ms"
+            changes.append(100 * (stats[key] - base[key]) / base[key] if base[key] else 0.0)
+        print(f"{stage:<28}" + "".join(f"{change:>+13.1f}%" for change in changes))
+        if changes[0] > tolerance:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tour planner stage by stage")
+    parser.add_argument("--profiles", type=int, default=500, help="Preference orderings sampled")
+    parser.add_argument("--all", action="store_true", help="Plan every one of the 5,040 preference orderings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against results written with --json")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed p50 increase per stage, in percent")
+    args = parser.parse_args()
+
+    profiles = synthetic_profiles(None if args.all else args.profiles, args.seed)
+    for zone in PREFERENCE_ZONES:
+        weight_simulation(zone)  # build the controllers outside the timed runs
+
+    results = {
+        "profiles": len(profiles),
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "stages": run(profiles),
+    }
+
+    print(f"{len(profiles)} profiles (seed {args.seed})")
+    print(f"{'stage':<28}" + "".join(f"{f'p{pct}':>11}" for pct in PERCENTILES))
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<28}" + "".join(f"{stats[f'p{pct}_ms']:>8.3f} ms" for pct in PERCENTILES))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if (baseline["profiles"], baseline["seed"]) != (results["profiles"], results["seed"]):
+            print("Note: the baseline was run on a different profile set")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"p50 regressed by more than {args.tolerance:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
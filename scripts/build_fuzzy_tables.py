@@ -0,0 +1,35 @@
+# Build the fuzzy lookup tables read by PLANNER_FUZZY_ENGINE=table.
+#
+# Evaluates every planner control system over the values the planner can feed
+# it and writes the tables as .npy files under --dir/<version>/, with a
+# manifest describing each table's axes, universes and rule-set hash. Run it
+# after changing the fuzzy rules or park data, before deploying; processes
+# whose rule sets have no tables fall back to live evaluation.
+#
+# Usage: python -m scripts.build_fuzzy_tables [--dir fuzzy_tables]
+
+import argparse
+import time
+
+from fuzzy_tables import FUZZY_TABLES_DIR, build_tables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the planner's fuzzy lookup tables")
+    parser.add_argument("--dir", default=FUZZY_TABLES_DIR, help="Directory to publish the tables under")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    version, header = build_tables(root=args.dir)
+
+    print(f"{'system':<36}{'cells':>10}{'axes':>6}{'seconds':>10}")
+    for table in header["tables"].values():
+        cells = 1
+        for _, values in table["axes"]:
+            cells *= len(values)
+        print(f"{', '.join(table['systems']):<36}{cells:>10}{len(table['axes']):>6}{table['build_seconds']:>10.2f}")
+    print(f"Published version {version} to {args.dir} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# Fill the plan table (see plan_table.py) for the current planner.
+#
+# Plans the index range --start..--stop in chunks across --workers processes and
+# writes each chunk's rows as it finishes. Chunks already built are skipped, so
+# an interrupted build resumes where it stopped and the range can be split over
+# several runs. The full table is about 31 million plans (roughly 1.5 GB), a few
+# CPU-hours with the default --engine table (numpy when no fuzzy tables are
+# built). --verify N then compares N random built rows with plan_tour() on the
+# serving engine.
+#
+# Usage: python -m scripts.build_plan_table [--start 0] [--stop N] [--workers 4] [--chunk 2520] [--engine table] [--verify 200]
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import planner
+from plan_table import (
+    LIVE_ONLY, NOT_BUILT, PLAN_TABLE_DIR, PlanTable, build_rows, create_plan_table, profile_for_index, table_size
+)
+
+
+def verify(table, start, stop, samples, seed=0):
+    """Compare random built rows with the live planner; returns the indices that differ."""
+    built = start + np.flatnonzero(np.isin(table.plans[start:stop, 0], (NOT_BUILT, LIVE_ONLY), invert=True))
+    rng = random.Random(seed)
+    differing = []
+    for index in rng.sample(list(built), min(samples, len(built))):
+        data = profile_for_index(int(index))
+        with contextlib.redirect_stdout(io.StringIO()):
+            expected = planner.plan_tour(data)
+            actual = table.decode(data, table.plans[index])
+        stops_match = [(t, name) for t, _, name, _ in expected["stop_label_points"]] == [
+            (t, name) for t, _, name, _ in actual["stop_label_points"]
+        ]
+        energy_match = len(expected["energy_timeline"]) == len(actual["energy_timeline"]) and np.allclose(
+            expected["energy_timeline"], actual["energy_timeline"], rtol=0, atol=1e-9
+        )
+        if expected["final_plan"] != actual["final_plan"] or not stops_match or not energy_match:
+            differing.append(int(index))
+    return differing, min(samples, len(built))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute plans for the questionnaire profile space")
+    parser.add_argument("--dir", default=PLAN_TABLE_DIR)
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--stop", type=int, default=None, help=f"End of the index range (default {table_size()})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=2520, help="Plans per task")
+    parser.add_argument("--engine", default="table", choices=planner.FUZZY_ENGINES)
+    parser.add_argument("--verify", type=int, default=0, help="Random built rows to check against the live planner")
+    args = parser.parse_args()
+
+    stop = min(args.stop if args.stop is not None else table_size(), table_size())
+    directory = create_plan_table(args.dir)
+    table = PlanTable(directory, writable=True)
+    print(f"Plan table {directory}: indices {args.start}..{stop} of {table_size()}")
+
+    chunks = [
+        (begin, min(begin + args.chunk, stop))
+        for begin in range(args.start, stop, args.chunk)
+        if table.built(begin, min(begin + args.chunk, stop)) < min(begin + args.chunk, stop) - begin
+    ]
+    total = sum(end - begin for begin, end in chunks)
+    done, live_only, started = 0, 0, time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(build_rows, begin, end, args.engine): begin for begin, end in chunks}
+        for future in as_completed(futures):
+            rows = future.result()
+            table.write(futures[future], rows)
+            done += len(rows)
+            live_only += int(np.count_nonzero(rows[:, 0] == LIVE_ONLY))
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / done * (total - done)
+            print(f"  {done}/{total} plans, {done / elapsed:.0f}/s, {remaining / 3600:.1f} h left", end="\r", flush=True)
+    table.plans.flush()
+    print(f"\nPlanned {done} profiles in {time.perf_counter() - started:.1f}s ({live_only} left to the live planner)")
+
+    if args.verify:
+        differing, checked = verify(PlanTable(directory), args.start, stop, args.verify)
+        print(f"Verified {checked} rows against plan_tour() ({planner.FUZZY_ENGINE}): {len(differing)} differ")
+        if differing:
+            print(f"Differing indices: {differing[:20]}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Check of the plan encoding in plan_format.py against the text plans it replaced.
+#
+# Three checks:
+#   round trip  encode_plan() then decode a plan with every stop kind (ride, meal,
+#               rest, clothing change) under both sources and two start times:
+#               the same start, source and stops come back
+#   fixed text  render_text() of that plan against the lines written out by hand
+#               in the original page's format, crossing noon; render_html() and
+#               parse_plan_stops() against the same plan stored as text
+#   planner     synthetic questionnaires through plan_tour(): the text the
+#               original page wrote against render_text() of the encoded plan
+#
+# Exits with status 1 on any difference.
+#
+# Usage: python -m scripts.check_plan_format [--profiles 50] [--seed 1]
+
+import argparse
+import contextlib
+import io
+import sys
+from datetime import datetime, timedelta
+
+import planner
+from analytics import parse_plan_stops
+from plan_format import (
+    DEFAULT_START_MINUTES, PLAN_SOURCES, PlanStop, decode_plan, encode_plan, plan_source, render_html, render_text
+)
+from scripts.benchmark_planner import synthetic_profiles
+
+SAMPLE_STOPS = [
+    PlanStop("Roller Coaster", "ride", 0, 5, 20, 10),
+    PlanStop("Water Slide", "ride", 35, 4, 10, 4),
+    PlanStop("Shower & Changing Room", "change", 53, 10, 0, 0),
+    PlanStop("Food Court", "meal", 63, 30, 10, 5),
+    PlanStop("Relaxation Garden", "rest", 108, 15, 2, 3),
+    PlanStop("Magic Show", "ride", 128, 15, 8, 2),
+]
+
+# SAMPLE_STOPS as the tour plan page wrote them before the encoding
+SAMPLE_TEXT = "\n".join([
+    "Entrance",
+    "10:00 AM — Roller Coaster — 35 minutes",
+    "Includes: 5m ride, 20m wait, 10m walk",
+    "10:35 AM — Water Slide — 18 minutes",
+    "Includes: 4m ride, 10m wait, 4m walk",
+    "10:53 AM — [Clothing Change] Shower & Changing Room — 10 minutes",
+    "Includes: 10m clothing change time",
+    "11:03 AM — [Meal Break] Food Court — 45 minutes",
+    "Includes: 30m ride, 10m wait, 5m walk",
+    "11:48 AM — [Rest Stop] Relaxation Garden — 20 minutes",
+    "Includes: 15m ride, 2m wait, 3m walk",
+    "12:08 PM — Magic Show — 25 minutes",
+    "Includes: 15m ride, 8m wait, 2m walk",
+    "Exit",
+])
+
+
+def original_plan(final_plan, visit_duration):
+    """(text, [PlanStop]) for a planner route: the text as the original page's loop wrote it, and its stops."""
+    lines, stops = ["Entrance"], []
+    total_time_used = 0
+    previous_location = (250, 250)
+    start_time = datetime.strptime("10:00", "%H:%M")
+    for stop in final_plan:
+        formatted_time = (start_time + timedelta(minutes=total_time_used)).strftime("%I:%M %p")
+        if stop.startswith("[Clothing Change]"):
+            lines.append(f"{formatted_time} — {stop} — {planner.CLOTHING_CHANGE_DURATION} minutes")
+            lines.append("Includes: 10m clothing change time")
+            stops.append(PlanStop(
+                stop.removeprefix("[Clothing Change] "), "change", total_time_used, planner.CLOTHING_CHANGE_DURATION, 0, 0
+            ))
+            total_time_used += planner.CLOTHING_CHANGE_DURATION
+            continue
+
+        zone = next((z for z, a in planner.zones.items() if stop in a), None)
+        if zone is None:
+            continue
+        ride_time = planner.attraction_durations[stop]
+        wait_time = planner.attraction_wait_times[stop]
+        walk_dist = planner.calculate_distance(previous_location, planner.attraction_coordinates[stop])
+        walk_time = max(1, round(walk_dist * planner.SCALE_FACTOR_METERS_PER_UNIT / 67))
+        total_duration = ride_time + wait_time + walk_time
+        if total_time_used + total_duration > visit_duration + 15:
+            break
+
+        save_name = {"relaxation": f"[Rest Stop] {stop}", "food": f"[Meal Break] {stop}"}.get(zone, stop)
+        kind = {"relaxation": "rest", "food": "meal"}.get(zone, "ride")
+        lines.append(f"{formatted_time} — {save_name} — {total_duration} minutes")
+        lines.append(f"Includes: {ride_time}m ride, {wait_time}m wait, {walk_time}m walk")
+        stops.append(PlanStop(stop, kind, total_time_used, ride_time, wait_time, walk_time))
+        total_time_used += total_duration
+        previous_location = planner.attraction_coordinates[stop]
+    lines.append("Exit")
+    return "\n".join(lines), stops
+
+
+def check_round_trip():
+    failures = []
+    for source in PLAN_SOURCES:
+        for start_minutes in (DEFAULT_START_MINUTES, 13 * 60 + 45):
+            value = encode_plan(SAMPLE_STOPS, start_minutes, source=source)
+            if decode_plan(value) != (start_minutes, SAMPLE_STOPS) or plan_source(value) != source:
+                failures.append(f"round trip ({source}, start {start_minutes})")
+    return failures
+
+
+def check_fixed_text():
+    value = encode_plan(SAMPLE_STOPS)
+    failures = []
+    if render_text(value) != SAMPLE_TEXT:
+        failures.append("render_text")
+    if render_html(value) != render_html(SAMPLE_TEXT):
+        failures.append("render_html")
+    if parse_plan_stops(value) != parse_plan_stops(SAMPLE_TEXT):
+        failures.append("parse_plan_stops")
+    return failures
+
+
+def check_planner(profiles, seed):
+    differing = 0
+    for data in synthetic_profiles(profiles, seed):
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan = planner.plan_tour(data)
+        text, stops = original_plan(plan["final_plan"], plan["visit_duration"])
+        if render_text(encode_plan(stops)) != text:
+            differing += 1
+    return differing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the plan encoding against the original text plans")
+    parser.add_argument("--profiles", type=int, default=50, help="Synthetic questionnaires planned and compared")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures = check_round_trip()
+    print(f"round trip: {'ok' if not failures else ', '.join(failures)}")
+    fixed = check_fixed_text()
+    print(f"fixed text: {'ok' if not fixed else ', '.join(fixed) + ' differ'}")
+    failures += fixed
+    differing = check_planner(args.profiles, args.seed)
+    print(f"planner: {differing}/{args.profiles} plans differ")
+    if differing:
+        failures.append("planner")
+
+    if failures:
+        print(f"Differences: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
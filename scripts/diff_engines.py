@@ -0,0 +1,218 @@
+# Differential check of the fast planner engines against the scikit-fuzzy reference.
+#
+# Three comparisons, each timed on both sides:
+#   fuzzy    random inputs through every controller (the seven weight systems,
+#            energy loss, food interval, wet-ride position): max absolute error
+#            per output, and inputs where only one side produced an output.
+#            With --engine table the inputs are drawn from the table axes
+#   routing  random attraction sets through reorder_by_distance/greedy_route and
+#            their distance-matrix versions: share of routes that differ
+#   plans    synthetic questionnaires through plan_tour() with skfuzzy and --engine:
+#            share of plans that differ, and max energy-timeline error
+#
+# Exits with status 1 if any error exceeds --tolerance or any route or plan differs.
+#
+# Usage: python -m scripts.diff_engines [--engine numpy|table] [--samples 1000] [--routes 1000] [--profiles 50] [--json out.json]
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+
+import numpy as np
+from skfuzzy import control as ctrl
+
+import planner
+from fast_engines import (
+    DistanceMatrix, FastSimulation, greedy_route_matrix, reorder_by_distance_matrix
+)
+from fuzzy_tables import table_axes, tabulated_system
+from scripts.benchmark_planner import synthetic_profiles
+from warmup import PREFERENCE_ZONES
+
+
+def random_inputs(control_system, rng, axes=None):
+    """Mostly uniform draws (a little past each end, to exercise clipping), some exact universe points.
+
+    With axes, one of the tabulated values for every input instead.
+    """
+    if axes:
+        return {label: rng.choice(values) for label, values in axes}
+    inputs = {}
+    for var in control_system.antecedents:
+        low, high = float(var.universe.min()), float(var.universe.max())
+        if rng.random() < 0.3:
+            inputs[var.label] = float(rng.choice(list(var.universe)))
+        else:
+            margin = 0.05 * (high - low)
+            inputs[var.label] = rng.uniform(low - margin, high + margin)
+    return inputs
+
+
+def fuzzy_systems():
+    """(output label, control system) pairs; the weight output has one system per favourite zone."""
+    systems = [("weight", planner.weight_simulation(zone, "skfuzzy").ctrl) for zone in PREFERENCE_ZONES]
+    systems += [
+        ("energy_loss", planner.energy_loss_ctrl),
+        ("food_interval", planner.food_interval_ctrl),
+        ("wet_time_position", planner.wet_time_ctrl),
+    ]
+    return systems
+
+
+def _timed_compute(sim, inputs):
+    for label, value in inputs.items():
+        sim.input[label] = value
+    start = time.perf_counter()
+    sim.compute()
+    return time.perf_counter() - start
+
+
+def diff_fuzzy(samples, rng, engine="numpy"):
+    results = {}
+    systems = fuzzy_systems()
+    for output, control_system in systems:
+        # No caching on either side: every sample is a fresh evaluation
+        reference = ctrl.ControlSystemSimulation(control_system, cache=False)
+        system = tabulated_system(control_system) if engine == "table" else None
+        fast = FastSimulation(control_system, cache=False, system=system)
+        axes = table_axes(control_system) if engine == "table" else None
+        stats = results.setdefault(output, {
+            "samples": 0, "max_abs_error": 0.0, "missing_mismatches": 0, "reference_s": 0.0, "fast_s": 0.0,
+        })
+        per_system = samples // sum(1 for label, _ in systems if label == output)
+        for _ in range(per_system):
+            inputs = random_inputs(control_system, rng, axes)
+            stats["reference_s"] += _timed_compute(reference, inputs)
+            stats["fast_s"] += _timed_compute(fast, inputs)
+            expected, actual = reference.output.get(output), fast.output.get(output)
+            stats["samples"] += 1
+            if (expected is None) != (actual is None):
+                stats["missing_mismatches"] += 1
+            elif expected is not None:
+                stats["max_abs_error"] = max(stats["max_abs_error"], abs(float(expected) - float(actual)))
+    return results
+
+
+def diff_routing(count, rng):
+    matrix = DistanceMatrix(planner.attraction_coordinates)
+    names = list(planner.attraction_coordinates)
+    results = {}
+    for name, reference, fast in [
+        ("reorder_by_distance", planner.reorder_by_distance, reorder_by_distance_matrix),
+        ("greedy_route", planner.greedy_route, greedy_route_matrix),
+    ]:
+        stats = results[name] = {"samples": count, "differing": 0, "reference_s": 0.0, "fast_s": 0.0}
+        for _ in range(count):
+            stops = rng.sample(names, rng.randint(2, min(20, len(names))))
+            if name == "reorder_by_distance":
+                start = rng.choice([(0, 0), planner.attraction_coordinates[rng.choice(names)]])
+                args = (stops, start)
+            else:
+                args = (stops, rng.choice(stops + [None]))
+
+            begin = time.perf_counter()
+            expected = reference(*args)
+            stats["reference_s"] += time.perf_counter() - begin
+            begin = time.perf_counter()
+            actual = fast(matrix, *args)
+            stats["fast_s"] += time.perf_counter() - begin
+            if expected != actual:
+                stats["differing"] += 1
+    return results
+
+
+def diff_plans(profiles, engine="numpy"):
+    stats = {"samples": len(profiles), "differing": 0, "max_energy_error": 0.0, "reference_s": 0.0, "fast_s": 0.0}
+    # Both engines print the same energy-loss fallback lines; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for profile in profiles:
+            start = time.perf_counter()
+            expected = planner.plan_tour(profile, engine="skfuzzy")
+            stats["reference_s"] += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = planner.plan_tour(profile, engine=engine)
+            stats["fast_s"] += time.perf_counter() - start
+
+            # Stop labels carry the energy level too; like the timeline it is compared within tolerance
+            expected_stops = [(t, name, zone) for t, _, name, zone in expected["stop_label_points"]]
+            actual_stops = [(t, name, zone) for t, _, name, zone in actual["stop_label_points"]]
+            if expected["final_plan"] != actual["final_plan"] or expected_stops != actual_stops:
+                stats["differing"] += 1
+            elif len(expected["energy_timeline"]) != len(actual["energy_timeline"]):
+                stats["differing"] += 1
+            else:
+                expected_energy = list(expected["energy_timeline"]) + [e for _, e, _, _ in expected["stop_label_points"]]
+                actual_energy = list(actual["energy_timeline"]) + [e for _, e, _, _ in actual["stop_label_points"]]
+                error = np.max(np.abs(np.subtract(expected_energy, actual_energy)), initial=0.0)
+                stats["max_energy_error"] = max(stats["max_energy_error"], float(error))
+    return stats
+
+
+def _speedup(stats):
+    return stats["reference_s"] / stats["fast_s"] if stats["fast_s"] else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast fuzzy and routing engines with the reference")
+    parser.add_argument("--engine", choices=["numpy", "table"], default="numpy", help="Fuzzy engine to check")
+    parser.add_argument("--samples", type=int, default=1000, help="Random inputs per fuzzy output")
+    parser.add_argument("--routes", type=int, default=1000, help="Random attraction sets per routing function")
+    parser.add_argument("--profiles", type=int, default=50, help="Synthetic questionnaires planned with each engine")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="Largest acceptable absolute error")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    for zone in PREFERENCE_ZONES:
+        planner.weight_simulation(zone, "skfuzzy")
+        planner.weight_simulation(zone, args.engine)
+
+    results = {
+        "seed": args.seed,
+        "engine": args.engine,
+        "fuzzy": diff_fuzzy(args.samples, rng, args.engine),
+        "routing": diff_routing(args.routes, rng),
+        "plans": diff_plans(synthetic_profiles(args.profiles, args.seed), args.engine),
+    }
+
+    failures = []
+    print(f"{'fuzzy output':<22}{'samples':>9}{'max abs error':>15}{'missing':>9}{'speedup':>10}")
+    for output, stats in results["fuzzy"].items():
+        print(
+            f"{output:<22}{stats['samples']:>9}{stats['max_abs_error']:>15.3g}"
+            f"{stats['missing_mismatches']:>9}{_speedup(stats):>9.1f}x"
+        )
+        if stats["max_abs_error"] > args.tolerance or stats["missing_mismatches"]:
+            failures.append(output)
+
+    print(f"\n{'routing':<22}{'samples':>9}{'differing':>15}{'':>9}{'speedup':>10}")
+    for name, stats in results["routing"].items():
+        print(f"{name:<22}{stats['samples']:>9}{stats['differing']:>15}{'':>9}{_speedup(stats):>9.1f}x")
+        if stats["differing"]:
+            failures.append(name)
+
+    plans = results["plans"]
+    print(
+        f"\nplans: {plans['differing']}/{plans['samples']} differ, max energy error {plans['max_energy_error']:.3g}, "
+        f"{1000 * plans['reference_s'] / max(plans['samples'], 1):.1f} ms -> "
+        f"{1000 * plans['fast_s'] / max(plans['samples'], 1):.1f} ms per plan ({_speedup(plans):.1f}x)"
+    )
+    if plans["differing"] or plans["max_energy_error"] > args.tolerance:
+        failures.append("plans")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if failures:
+        print(f"Differences beyond tolerance: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
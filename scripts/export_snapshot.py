@@ -0,0 +1,56 @@
+# Export survey responses to a compressed columnar snapshot and print summary aggregations.
+#
+# Usage: python -m scripts.export_snapshot [--source sheets|sqlite] [--full] [--report]
+
+import argparse
+import os
+import time
+
+import analytics
+from constants import LIKERT_OPTIONS
+from storage import SQLiteResponseStore, get_worksheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the survey response snapshot")
+    parser.add_argument("--source", choices=["sheets", "sqlite"], default="sheets")
+    parser.add_argument("--db", default="responses.db", help="SQLite file when --source sqlite")
+    parser.add_argument("--out", default="snapshots/responses.npz")
+    parser.add_argument("--full", action="store_true", help="Rebuild instead of refreshing the existing snapshot")
+    parser.add_argument("--report", action="store_true", help="Print aggregations with their timings")
+    args = parser.parse_args()
+
+    if args.source == "sqlite":
+        local_store = SQLiteResponseStore(args.db)
+        fetch_rows = lambda first_row: analytics.fetch_store_rows(local_store, first_row)
+    else:
+        worksheet = get_worksheet()
+        fetch_rows = lambda first_row: analytics.fetch_sheet_rows(worksheet, first_row)
+
+    start = time.perf_counter()
+    if args.full or not os.path.exists(args.out):
+        snapshot = analytics.build_snapshot(fetch_rows(1))
+    else:
+        snapshot = analytics.refresh_snapshot(analytics.load_snapshot(args.out), fetch_rows)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    analytics.save_snapshot(snapshot, args.out)
+    print(f"Wrote {len(snapshot['row'])} rows to {args.out} in {time.perf_counter() - start:.2f}s")
+
+    if args.report:
+        start = time.perf_counter()
+        distribution = analytics.likert_distribution_by_age(snapshot, question=3)
+        top = analytics.most_planned_attractions(snapshot)
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+
+        print("\nOverall satisfaction by age group:")
+        print(f"{'':>10} " + " ".join(f"{label[:8]:>8}" for label in LIKERT_OPTIONS))
+        for age, counts in zip(snapshot["age_labels"], distribution):
+            print(f"{age:>10} " + " ".join(f"{count:>8}" for count in counts))
+        print("\nMost planned attractions:")
+        for name, count in top:
+            print(f"  {count:>6}  {name}")
+        print(f"\nAggregations took {elapsed_ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
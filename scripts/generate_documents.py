@@ -0,0 +1,78 @@
+# Regenerate every participant's FinalDocument.pdf across a process pool.
+#
+# The response sheet has no consent column (the download page takes consent from
+# the session), so --consent yes|no is required and applies to every document.
+#
+# Usage: python -m scripts.generate_documents --consent yes|no [--source sheets|sqlite] [--out documents] [--workers N]
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analytics import fetch_sheet_rows, fetch_store_rows, parse_timestamp
+from documents import final_document_from_row, load_consent_pdf, register_fonts
+from storage import RESPONSE_COLUMNS, SQLiteResponseStore, get_worksheet
+
+_out_dir = None
+_engine = None
+_consent = None
+
+
+def _init_worker(out_dir, engine, consent):
+    global _out_dir, _engine, _consent
+    _out_dir, _engine, _consent = out_dir, engine, consent
+    # Parse the consent PDF and register fonts once per worker, not per document
+    load_consent_pdf()
+    register_fonts()
+
+
+def _write_document(row):
+    # Workers write straight to disk and return only the size, so the parent never holds PDF bytes
+    pdf_bytes = final_document_from_row(row, consent=_consent, engine=_engine)
+    path = os.path.join(_out_dir, f"{row[1]}_FinalDocument.pdf")
+    with open(path, "wb") as f:
+        f.write(pdf_bytes)
+    return len(pdf_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render every participant's final document")
+    parser.add_argument("--source", choices=["sheets", "sqlite"], default="sheets")
+    parser.add_argument("--db", default="responses.db", help="SQLite file when --source sqlite")
+    parser.add_argument("--out", default="documents", help="Output directory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", default=None, help="PDF engine (defaults to PDF_ENGINE)")
+    parser.add_argument(
+        "--consent", choices=["yes", "no"], required=True,
+        help="Whether every summary carries the consent line",
+    )
+    args = parser.parse_args()
+
+    if args.source == "sqlite":
+        rows = fetch_store_rows(SQLiteResponseStore(args.db))
+    else:
+        rows = fetch_sheet_rows(get_worksheet())
+
+    # Only participants who reached the tour plan have a document; the header row has no valid timestamp
+    rows = [values + [""] * (len(RESPONSE_COLUMNS) - len(values)) for _, values in rows]
+    rows = [values for values in rows if values[1] and values[16] and parse_timestamp(values[0]) is not None]
+    os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    written = 0
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.out, args.engine, args.consent == "yes")) as pool:
+        for size in pool.map(_write_document, rows, chunksize=16):
+            written += 1
+            total_bytes += size
+            if written % 500 == 0:
+                print(f"  {written}/{len(rows)} documents")
+    elapsed = time.perf_counter() - start
+
+    rate = written / elapsed if elapsed else 0.0
+    print(f"Wrote {written} documents ({total_bytes / 1e6:.1f} MB) to {args.out} in {elapsed:.1f}s — {rate:.1f} docs/sec")
+
+
+if __name__ == "__main__":
+    main()
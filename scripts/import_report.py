@@ -0,0 +1,137 @@
+# Import-time report for each page, built from `python -X importtime`.
+#
+# Every page's module-level imports are replayed in a fresh interpreter after
+# streamlit (which a running server has already loaded), so only the time the
+# app adds is counted. "bounce" is what a visitor pays before the page's first
+# st.stop() guard; "full" is every module-level import. Lazily imported
+# renderers are reported on their own.
+#
+# Usage: python -m scripts.import_report [--repeat 3] [--json report.json] [--baseline report.json]
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PAGES = ["main.py", "pages/1_questionnaire.py", "pages/2_tour_plan.py", "pages/3_final_download.py"]
+
+# Imported inside functions, only when that code path runs
+LAZY_TARGETS = {
+    "lazy: matplotlib energy graph": ["import matplotlib.pyplot"],
+    "lazy: altair energy graph": ["import altair"],
+    "lazy: xhtml2pdf engine": ["from xhtml2pdf import pisa"],
+    "lazy: sheet credentials": ["from oauth2client.service_account import ServiceAccountCredentials"],
+}
+
+
+def _is_stop_guard(node):
+    return isinstance(node, ast.If) and any(
+        isinstance(call, ast.Call) and ast.unparse(call.func) == "st.stop"
+        for stmt in node.body for call in ast.walk(stmt)
+    )
+
+
+def page_imports(path):
+    """(imports before the first st.stop() guard, all module-level imports) as source lines."""
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    bounce, full = None, []
+    for node in tree.body:
+        if bounce is None and _is_stop_guard(node):
+            bounce = list(full)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            full.append(ast.unparse(node))
+    return (full if bounce is None else bounce), full
+
+
+def targets():
+    result = {}
+    for path in PAGES:
+        name = os.path.splitext(os.path.basename(path))[0]
+        bounce, full = page_imports(path)
+        if bounce != full:
+            result[f"{name}: bounce"] = bounce
+        result[f"{name}: full"] = full
+    result.update(LAZY_TARGETS)
+    return result
+
+
+def measure(statements):
+    """Milliseconds of self time per top-level package, for modules first imported by statements."""
+    code = "\n".join(["import streamlit"] + statements)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    packages = defaultdict(float)
+    after_streamlit = False
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, module = line[len("import time:"):].split("|")
+        if not after_streamlit:
+            after_streamlit = module.strip() == "streamlit" and not module.startswith("  ")
+            continue
+        packages[module.strip().split(".")[0]] += int(self_us) / 1000
+    return packages
+
+
+def report(repeat):
+    results = {}
+    for name, statements in targets().items():
+        runs = [measure(statements) for _ in range(repeat)]
+        totals = [sum(run.values()) for run in runs]
+        # Break down the median run
+        median_run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+        top = sorted(median_run.items(), key=lambda item: item[1], reverse=True)[:5]
+        results[name] = {
+            "total_ms": round(statistics.median(totals), 1),
+            "top_packages": {package: round(ms, 1) for package, ms in top},
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report per-page import time on top of streamlit")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the median is reported")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Compare against a report written with --json")
+    parser.add_argument("--tolerance-ms", type=float, default=50, help="Allowed increase before a target counts as a regression")
+    args = parser.parse_args()
+
+    results = report(args.repeat)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for name, result in results.items():
+        line = f"{name:<40} {result['total_ms']:>8.1f} ms"
+        if name in baseline:
+            delta = result["total_ms"] - baseline[name]["total_ms"]
+            line += f"  ({delta:+.1f} ms)"
+            if delta > args.tolerance_ms:
+                regressions.append(name)
+        top = ", ".join(f"{package} {ms:.0f}" for package, ms in result["top_packages"].items())
+        print(f"{line}  {top}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print(f"Import time regressed by more than {args.tolerance_ms:.0f} ms: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# Multi-user load test of the full participant flow against a stand-in sheet.
+#
+# Each simulated participant goes through consent (main.py), the questionnaire,
+# the tour plan and its feedback form, and the final download, driven by
+# Streamlit's AppTest. AppTest keeps per-run state in module globals, so the
+# --concurrency participants in the flow at once each run in a worker process
+# (warmed up first, like a serving process). The sheet, its quota and the app's
+# token bucket live in this process and are shared through a multiprocessing
+# manager, so Sheets behaviour matches one server. CPU work (planning, PDFs)
+# runs in parallel across workers rather than under one GIL, so compare runs
+# at the same --concurrency instead of reading the numbers as absolute capacity.
+#
+# Storage is the real GSheetResponseStore, token bucket and backoff wrapped
+# around FakeWorksheet, an in-memory worksheet that adds --latency-ms (+/-
+# --jitter-ms) to every call, fails a fraction --error-rate with 429, and
+# returns 429 once more than --quota-per-minute calls arrive within a minute
+# (Google's per-user Sheets quota is 60).
+#
+# AppTest runs one page at a time, so st.switch_page() errors are expected and
+# ignored; each page is started with the session state the previous one left.
+# The preference ranking is a drag-and-drop component AppTest cannot drive, so
+# every user's synthetic ranking is applied to the session before the tour plan.
+#
+# Usage: python -m scripts.load_test [--users 20] [--concurrency 4] [--latency-ms 300] [--error-rate 0.02] [--json out.json]
+
+import argparse
+import collections
+import contextlib
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.managers import BaseManager
+
+import requests
+from gspread.exceptions import APIError
+
+import storage
+from scripts.benchmark_pdf import percentile
+from scripts.benchmark_planner import synthetic_profiles
+from warmup import PREFERENCE_ZONES
+
+STEPS = [
+    "consent", "consent_submit",
+    "questionnaire", "questionnaire_submit",
+    "tour_plan", "feedback_submit",
+    "final_download",
+]
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PERCENTILES = (50, 95, 99)
+WAIT_SLIDER_VALUES = {"<10 min": 5, "10–20 min": 15, "20–30 min": 25, "30+ min": 35}
+
+
+def column_number(letters):
+    # Inverse of storage.column_letter: "A" -> 1, "AA" -> 27
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+
+class Cell:
+    def __init__(self, row):
+        self.row = row
+
+
+def quota_error():
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({
+        "error": {"code": 429, "message": "Quota exceeded (load test)", "status": "RESOURCE_EXHAUSTED"}
+    }).encode("utf-8")
+    return APIError(response)
+
+
+class FakeWorksheet:
+    """In-memory stand-in for the gspread worksheet calls the response store makes."""
+
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, error_rate=0.0, quota_per_minute=60, seed=0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.quota_per_minute = quota_per_minute
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.rows = []
+        self.recent_calls = collections.deque()
+        self.calls = collections.Counter()
+        self.rejected = collections.Counter()
+
+    def call(self, method, args=(), kwargs=None):
+        """Run one sheet call with the configured latency; returns (status, result)."""
+        with self.lock:
+            now = time.monotonic()
+            self.calls[method] += 1
+            while self.recent_calls and now - self.recent_calls[0] > 60:
+                self.recent_calls.popleft()
+            over_quota = self.quota_per_minute and len(self.recent_calls) >= self.quota_per_minute
+            self.recent_calls.append(now)
+            injected = self.rng.random() < self.error_rate
+            delay = max(0.0, self.rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+        time.sleep(delay)
+        if over_quota or injected:
+            with self.lock:
+                self.rejected[method] += 1
+            return 429, None
+        return 200, getattr(self, f"_{method}")(*args, **(kwargs or {}))
+
+    def counts(self):
+        with self.lock:
+            return dict(self.calls), dict(self.rejected)
+
+    def _append_row(self, row):
+        with self.lock:
+            self.rows.append([str(value) for value in row])
+            row_num = len(self.rows)
+        return {"updates": {"updatedRange": f"Sheet1!A{row_num}:R{row_num}"}}
+
+    def _find(self, value, in_column=None):
+        with self.lock:
+            for row_num, row in enumerate(self.rows, start=1):
+                if len(row) >= in_column and row[in_column - 1] == value:
+                    return row_num
+        return None
+
+    def _update(self, range_name, values):
+        first_col, row_num, last_col = re.match(r"([A-Z]+)(\d+):([A-Z]+)\d+", range_name).groups()
+        first = column_number(first_col) - 1
+        with self.lock:
+            row = self.rows[int(row_num) - 1]
+            row.extend([""] * (first + len(values[0]) - len(row)))
+            row[first:first + len(values[0])] = [str(value) for value in values[0]]
+
+    def _row_values(self, row_num):
+        with self.lock:
+            return list(self.rows[row_num - 1])
+
+
+class SheetClient:
+    """Worker-side handle on the shared FakeWorksheet, with the gspread method signatures."""
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def _call(self, method, *args, **kwargs):
+        # gspread's APIError does not survive pickling, so the 429 is raised on this side
+        status, result = self.shared.call(method, args, kwargs)
+        if status == 429:
+            raise quota_error()
+        return result
+
+    def append_row(self, row):
+        return self._call("append_row", row)
+
+    def find(self, value, in_column=None):
+        row_num = self._call("find", value, in_column=in_column)
+        return Cell(row_num) if row_num else None
+
+    def update(self, range_name, values):
+        return self._call("update", range_name=range_name, values=values)
+
+    def row_values(self, row_num):
+        return self._call("row_values", row_num)
+
+
+class SharedObjects(BaseManager):
+    pass
+
+
+for _name in ("sheet", "limiter", "metrics"):
+    SharedObjects.register(_name)
+
+
+def serve_shared(sheet, limiter, metrics, authkey):
+    """Serve the sheet, token bucket and metrics to the workers from a thread of this process."""
+
+    class Server(BaseManager):
+        pass
+
+    Server.register("sheet", callable=lambda: sheet)
+    Server.register("limiter", callable=lambda: limiter)
+    Server.register("metrics", callable=lambda: metrics)
+    server = Server(address=("127.0.0.1", 0), authkey=authkey).get_server()
+    threading.Thread(target=server.serve_forever, name="load-test-manager", daemon=True).start()
+    return server.address
+
+
+def init_worker(address, authkey):
+    """Point every page's get_response_store() at the shared sheet, behind the real limiter and backoff."""
+    shared = SharedObjects(address=address, authkey=authkey)
+    shared.connect()
+    store = storage.TracedResponseStore(
+        storage.GSheetResponseStore(
+            storage.RateLimitedWorksheet(SheetClient(shared.sheet()), shared.limiter(), shared.metrics())
+        )
+    )
+    storage.get_response_store = lambda: store
+
+    # Pages print a JSON trace per run, and Streamlit logs every empty widget
+    # label and every (expected) st.switch_page() failure
+    logging.disable(logging.ERROR)
+    # Each worker already is one serving process planning in parallel; a plan
+    # pool per worker would only add idle processes (PLANNER_WORKERS overrides)
+    os.environ.setdefault("PLANNER_WORKERS", "0")
+    from warmup import run_warmup
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_warmup()
+
+
+def _is_navigation_artifact(message):
+    # AppTest only knows the page it was started with
+    return "Could not find page" in message
+
+
+def page_errors(at):
+    messages = [e.message for e in at.exception] + [e.value for e in at.error]
+    return [m for m in messages if not _is_navigation_artifact(m)]
+
+
+class UserRun:
+    def __init__(self):
+        self.timings = {}
+        self.errors = {}
+
+    def result(self):
+        return {"timings": self.timings, "errors": self.errors}
+
+    def step(self, name, at):
+        start = time.perf_counter()
+        at.run()
+        self.timings[name] = time.perf_counter() - start
+        errors = page_errors(at)
+        if errors:
+            self.errors[name] = errors[0]
+        return not errors
+
+
+def run_user(profile, timeout, run):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "main.py"), default_timeout=timeout)
+    if not run.step("consent", at):
+        return run
+    at.checkbox[0].check()
+    at.button[0].click()
+    if not run.step("consent_submit", at):
+        return run
+    unique_id = at.session_state["unique_id"]
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "pages/1_questionnaire.py"), default_timeout=timeout)
+    at.session_state["consent_submitted"] = True
+    at.session_state["unique_id"] = unique_id
+    if not run.step("questionnaire", at):
+        return run
+    at.selectbox(key="age").set_value(profile["age"])
+    at.selectbox(key="duration").set_value(profile["duration"])
+    at.radio(key="accessibility_radio").set_value("No")
+    at.multiselect(key="priorities").set_value(profile["priorities"])
+    at.slider(key="wait_time").set_value(WAIT_SLIDER_VALUES[profile["wait_time"]])
+    at.radio(key="walking").set_value(profile["walking"])
+    at.radio(key="break_time").set_value(profile["break"])
+    at.button[0].click()
+    if not run.step("questionnaire_submit", at):
+        return run
+    questionnaire = dict(at.session_state["questionnaire"])
+    questionnaire.update({zone: profile[zone] for zone in PREFERENCE_ZONES})
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "pages/2_tour_plan.py"), default_timeout=timeout)
+    at.session_state["questionnaire"] = questionnaire
+    at.session_state["unique_id"] = unique_id
+    if not run.step("tour_plan", at):
+        return run
+    at.text_area[0].input("Load test feedback")
+    at.button[0].click()
+    if not run.step("feedback_submit", at):
+        return run
+
+    at = AppTest.from_file(os.path.join(APP_DIR, "pages/3_final_download.py"), default_timeout=timeout)
+    at.session_state["unique_id"] = unique_id
+    at.session_state["consent_agreed"] = True
+    run.step("final_download", at)
+    return run
+
+
+def run_one(profile, timeout):
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = UserRun()
+        try:
+            run_user(profile, timeout, run)
+        except Exception as e:
+            run.errors["harness"] = f"{type(e).__name__}: {e}"
+    return run.result()
+
+
+def summarise(runs, wall_seconds):
+    report = {}
+    for name in STEPS:
+        timings = [1000 * run["timings"][name] for run in runs if name in run["timings"]]
+        errors = sum(1 for run in runs if name in run["errors"])
+        if not timings:
+            continue
+        report[name] = {
+            "runs": len(timings),
+            "error_rate": round(errors / len(timings), 4),
+            **{f"p{pct}_ms": round(percentile(timings, pct), 1) for pct in PERCENTILES},
+        }
+    completed = sum(1 for run in runs if not run["errors"] and len(run["timings"]) == len(STEPS))
+    return {
+        "users": len(runs),
+        "completed": completed,
+        "wall_seconds": round(wall_seconds, 2),
+        "users_per_minute": round(60 * completed / wall_seconds, 2) if wall_seconds else 0.0,
+        "page_runs_per_second": round(sum(len(run["timings"]) for run in runs) / wall_seconds, 2) if wall_seconds else 0.0,
+        "steps": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the participant flow against a fake Google Sheet")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4, help="Participants in the flow at the same time (worker processes)")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="Mean latency of each sheet call")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sheet calls failing with 429")
+    parser.add_argument("--quota-per-minute", type=int, default=60, help="Sheet calls per minute before 429s (0 = unlimited)")
+    parser.add_argument("--client-rpm", type=int, default=storage.REQUESTS_PER_MINUTE, help="Token bucket rate in the app")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds allowed per page run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Write the report to this file")
+    args = parser.parse_args()
+
+    worksheet = FakeWorksheet(args.latency_ms, args.jitter_ms, args.error_rate, args.quota_per_minute, args.seed)
+    limiter = storage.TokenBucket(args.client_rpm / 60.0, storage.BURST_SIZE)
+    sheet_metrics = storage.SheetMetrics()
+    authkey = secrets.token_bytes(16)
+    address = serve_shared(worksheet, limiter, sheet_metrics, authkey)
+    profiles = synthetic_profiles(args.users, args.seed)
+
+    # AppTest replaces the workers' __main__ with the page it runs, so hand them
+    # functions by their importable module name
+    worker = importlib.import_module("scripts.load_test")
+    pool = ProcessPoolExecutor(
+        max_workers=args.concurrency,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=worker.init_worker,
+        initargs=(address, authkey),
+    )
+    with pool:
+        # Start and warm every worker before the clock starts
+        list(pool.map(time.sleep, [0.5] * args.concurrency))
+        start = time.perf_counter()
+        runs = list(pool.map(worker.run_one, profiles, [args.timeout] * len(profiles)))
+        wall_seconds = time.perf_counter() - start
+
+    calls, rejected = worksheet.counts()
+    report = summarise(runs, wall_seconds)
+    report["sheet"] = {"calls": calls, "rejected_429": rejected, "client": sheet_metrics.snapshot()}
+
+    print(
+        f"{report['completed']}/{report['users']} users completed in {report['wall_seconds']:.1f}s "
+        f"({report['users_per_minute']:.1f} users/min, {report['page_runs_per_second']:.2f} page runs/s, "
+        f"concurrency {args.concurrency})"
+    )
+    print(f"{'step':<22}{'runs':>6}{'errors':>9}" + "".join(f"{f'p{pct}':>12}" for pct in PERCENTILES))
+    for name, stats in report["steps"].items():
+        print(
+            f"{name:<22}{stats['runs']:>6}{stats['error_rate']:>8.1%} "
+            + "".join(f"{stats[f'p{pct}_ms']:>9.0f} ms" for pct in PERCENTILES)
+        )
+    client = report["sheet"]["client"]
+    print(
+        f"sheet: {sum(calls.values())} calls, {sum(rejected.values())} rejected with 429, "
+        f"{client['retries']} retries, {client['failures']} failures, {client['throttle_seconds']:.1f}s throttled"
+    )
+    first_errors = collections.Counter(
+        f"{name}: {message}" for run in runs for name, message in run["errors"].items()
+    )
+    for message, count in first_errors.most_common(5):
+        print(f"  {count} x {message[:160]}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Start the app with warm-up and a readiness endpoint for the load balancer.
+#
+# Caches are filled in this process before or while Streamlit starts, and a
+# small HTTP server answers on --health-port:
+#   GET /ready         -> 200 once warm-up has finished, 503 before (body: warm-up status JSON)
+#   GET /live          -> 200 while the process is up
+#   GET /metrics       -> span latency histograms, gauges and counters, Prometheus text format
+#   GET /metrics.json  -> the same metrics as JSON
+#
+# Usage: python -m scripts.serve [--health-port 8502] [--wait] [-- streamlit flags...]
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telemetry import metrics_json, metrics_text
+from warmup import run_warmup, start_warmup, warmup_status
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/live":
+            self._send(200, {"live": True})
+        elif self.path == "/ready":
+            status = warmup_status()
+            self._send(200 if status["ready"] else 503, status)
+        elif self.path == "/metrics":
+            self._send(200, metrics_text(), content_type="text/plain; version=0.0.4")
+        elif self.path == "/metrics.json":
+            self._send(200, metrics_json())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _send(self, code, payload, content_type="application/json"):
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Health checks arrive every few seconds; keep them out of the app log
+        pass
+
+
+def start_health_server(port):
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthHandler)
+    threading.Thread(target=server.serve_forever, name="health", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app with warm-up and a /ready endpoint")
+    parser.add_argument("--health-port", type=int, default=8502)
+    parser.add_argument("--wait", action="store_true", help="Finish warm-up before the app starts listening")
+    parser.add_argument("--script", default="main.py")
+    parser.add_argument("streamlit_args", nargs="*", help="Flags passed to streamlit, e.g. -- --server.port 8501")
+    args = parser.parse_args()
+
+    start_health_server(args.health_port)
+    if args.wait:
+        run_warmup()
+    else:
+        start_warmup()
+
+    from streamlit.web import cli
+
+    cli.main(["run", args.script, *args.streamlit_args], standalone_mode=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# Bulk-sync the local SQLite response store to the "Survey Responses" sheet.
+#
+# Usage: python -m scripts.sync_sqlite_to_sheets [--db responses.db] [--every 60]
+
+import argparse
+import time
+
+from storage import SQLiteResponseStore, get_worksheet, sync_to_sheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Push pending SQLite responses to the Google Sheet")
+    parser.add_argument("--db", default="responses.db", help="SQLite file written by the app")
+    parser.add_argument("--every", type=float, default=0, help="Repeat every N seconds (0 = run once)")
+    args = parser.parse_args()
+
+    local_store = SQLiteResponseStore(args.db)
+    worksheet = get_worksheet()
+
+    while True:
+        result = sync_to_sheet(local_store, worksheet)
+        print(f"Synced {result['appended']} new and {result['updated']} changed rows")
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+
+if __name__ == "__main__":
+    main()
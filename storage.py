@@ -0,0 +1,454 @@
+# Shared response storage for every page.
+#
+# One authorized gspread session per process, a token bucket sized to the
+# Sheets per-user quota, and exponential backoff with jitter on 429/5xx.
+# Appends are only retried on 429: a 5xx may arrive after the row was written,
+# and appending it again would duplicate the participant. Call counts, retries,
+# failures and throttling go to telemetry (sheets_* on /metrics).
+# Pages talk to a ResponseStore, backed either by the live sheet or by a
+# local SQLite file that can be bulk-synced to the sheet later.
+
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import streamlit as st
+import gspread
+from gspread.exceptions import APIError
+
+from telemetry import TELEMETRY_ENABLED, count, record, span
+
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+SPREADSHEET_NAME = "Survey Responses"
+WORKSHEET_NAME = "Sheet1"
+
+# Sheets API allows 60 requests per minute per user (the service account)
+REQUESTS_PER_MINUTE = 60
+BURST_SIZE = 10
+
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 1.0
+MAX_BACKOFF_SECONDS = 32.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# A 429 is rejected before anything is written, so it is the only safe retry for appends
+APPEND_RETRYABLE_STATUS_CODES = {429}
+APPEND_METHODS = {"append_row", "append_rows"}
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SheetMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttle_seconds = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record_call(self, latency):
+        with self.lock:
+            self.calls += 1
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+        if TELEMETRY_ENABLED:
+            record("sheets.call", latency)
+
+    def record_retry(self):
+        with self.lock:
+            self.retries += 1
+        count("sheets_retries")
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+        count("sheets_failures")
+
+    def record_throttle(self, seconds):
+        with self.lock:
+            self.throttle_seconds += seconds
+        count("sheets_throttle_seconds", seconds)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttle_seconds": round(self.throttle_seconds, 3),
+                "latency_avg_ms": round(1000 * self.latency_total / self.calls, 1) if self.calls else 0.0,
+                "latency_max_ms": round(1000 * self.latency_max, 1),
+            }
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) or getattr(error, "code", None)
+
+
+def call_with_backoff(fn, *args, limiter=None, metrics=None, retry_statuses=RETRYABLE_STATUS_CODES, **kwargs):
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            waited = limiter.acquire()
+            if metrics is not None and waited:
+                metrics.record_throttle(waited)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except APIError as e:
+            if _status_code(e) not in retry_statuses or attempt == MAX_RETRIES:
+                if metrics is not None:
+                    metrics.record_failure()
+                raise
+            if metrics is not None:
+                metrics.record_retry()
+            # Full jitter: sleep a random amount up to the exponential cap
+            cap = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt)
+            time.sleep(random.uniform(0, cap))
+            continue
+        if metrics is not None:
+            metrics.record_call(time.perf_counter() - start)
+        return result
+
+
+class RateLimitedWorksheet:
+    """Proxy around a gspread worksheet that routes every method call through the limiter.
+
+    Appends are retried on 429 only (APPEND_RETRYABLE_STATUS_CODES).
+    """
+
+    def __init__(self, worksheet, limiter, metrics):
+        self._worksheet = worksheet
+        self._limiter = limiter
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._worksheet, name)
+        if not callable(attr):
+            return attr
+
+        retry_statuses = APPEND_RETRYABLE_STATUS_CODES if name in APPEND_METHODS else RETRYABLE_STATUS_CODES
+
+        def wrapped(*args, **kwargs):
+            return call_with_backoff(
+                attr, *args, limiter=self._limiter, metrics=self._metrics, retry_statuses=retry_statuses, **kwargs
+            )
+
+        return wrapped
+
+
+class TracedResponseStore:
+    """Proxy around a ResponseStore that times every method call as a storage.<method> span."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name):
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def wrapped(*args, **kwargs):
+            with span(f"storage.{name}"):
+                return attr(*args, **kwargs)
+
+        return wrapped
+
+
+@st.cache_resource
+def get_sheet_metrics():
+    return SheetMetrics()
+
+
+@st.cache_resource
+def get_rate_limiter():
+    return TokenBucket(REQUESTS_PER_MINUTE / 60.0, BURST_SIZE)
+
+
+@st.cache_resource
+def get_worksheet():
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    creds_dict = st.secrets["gcp_service_account"]
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+    client = gspread.authorize(creds)
+
+    limiter = get_rate_limiter()
+    metrics = get_sheet_metrics()
+    spreadsheet = call_with_backoff(client.open, SPREADSHEET_NAME, limiter=limiter, metrics=metrics)
+    sheet = call_with_backoff(spreadsheet.worksheet, WORKSHEET_NAME, limiter=limiter, metrics=metrics)
+    return RateLimitedWorksheet(sheet, limiter, metrics)
+
+
+# Response store: the row operations the pages actually perform
+
+# Sheet layout, one entry per column (A = timestamp, B = unique_id, ...)
+RESPONSE_COLUMNS = [
+    "timestamp", "unique_id",
+    "age", "duration", "accessibility",
+    "rank_thrill", "rank_family", "rank_water", "rank_entertainment",
+    "rank_food", "rank_shopping", "rank_relaxation",
+    "priorities", "wait_time", "walking", "break_time",
+    "plan_text", "total_time_used", "leftover_time",
+    "q_spacing", "q_variety", "q_meal_timing", "q_overall", "q_energy_graph", "feedback",
+]
+QUESTIONNAIRE_COLUMNS = (3, 16)   # C–P
+PLAN_COLUMNS = (17, 19)           # Q–S
+FEEDBACK_COLUMNS = (20, 25)       # T–Y
+CONSENT_ROW_WIDTH = 18
+
+
+def column_letter(index):
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _check_width(values, columns):
+    first, last = columns
+    if len(values) != last - first + 1:
+        raise ValueError(f"Expected {last - first + 1} values for columns {first}–{last}, got {len(values)}")
+
+
+class ResponseStore(ABC):
+    @abstractmethod
+    def append_consent(self, timestamp, unique_id):
+        ...
+
+    @abstractmethod
+    def update_questionnaire(self, unique_id, values):
+        """Write the 14 questionnaire answers (columns C–P). Returns False if the ID is unknown."""
+
+    @abstractmethod
+    def write_plan(self, unique_id, plan_text, total_time_used, leftover_time):
+        """Write columns 17–19. Returns False if the ID is unknown."""
+
+    @abstractmethod
+    def write_feedback(self, unique_id, values):
+        """Write the five Likert answers and the comment (columns 20–25). Returns False if the ID is unknown."""
+
+    @abstractmethod
+    def read_row(self, unique_id):
+        """Return the full row as a list of len(RESPONSE_COLUMNS) strings, or None."""
+
+
+class GSheetResponseStore(ResponseStore):
+    def __init__(self, worksheet):
+        self.sheet = worksheet
+        # The sheet is append-only during the study, so a participant's row never moves
+        self.row_cache = {}
+        self.lock = threading.Lock()
+
+    def _row_number(self, unique_id):
+        with self.lock:
+            row_num = self.row_cache.get(unique_id)
+        if row_num is None:
+            cell = self.sheet.find(unique_id, in_column=2)
+            if not cell:
+                return None
+            row_num = cell.row
+            with self.lock:
+                self.row_cache[unique_id] = row_num
+        return row_num
+
+    def _write_range(self, unique_id, columns, values):
+        _check_width(values, columns)
+        row_num = self._row_number(unique_id)
+        if row_num is None:
+            return False
+        first, last = columns
+        self.sheet.update(
+            range_name=f"{column_letter(first)}{row_num}:{column_letter(last)}{row_num}",
+            values=[list(values)],
+        )
+        return True
+
+    def append_consent(self, timestamp, unique_id):
+        row = [timestamp, unique_id] + [""] * (CONSENT_ROW_WIDTH - 2)
+        response = self.sheet.append_row(row)
+        # e.g. "Sheet1!A42:R42" — remember the row so later writes skip the find()
+        updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        if match:
+            with self.lock:
+                self.row_cache[unique_id] = int(match.group(1))
+
+    def update_questionnaire(self, unique_id, values):
+        return self._write_range(unique_id, QUESTIONNAIRE_COLUMNS, values)
+
+    def write_plan(self, unique_id, plan_text, total_time_used, leftover_time):
+        return self._write_range(unique_id, PLAN_COLUMNS, [plan_text, str(total_time_used), str(leftover_time)])
+
+    def write_feedback(self, unique_id, values):
+        return self._write_range(unique_id, FEEDBACK_COLUMNS, values)
+
+    def read_row(self, unique_id):
+        row_num = self._row_number(unique_id)
+        if row_num is None:
+            return None
+        values = self.sheet.row_values(row_num)
+        return values + [""] * (len(RESPONSE_COLUMNS) - len(values))
+
+
+class SQLiteResponseStore(ResponseStore):
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{name} TEXT NOT NULL DEFAULT ''" for name in RESPONSE_COLUMNS if name != "unique_id")
+        self.conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                unique_id TEXT NOT NULL UNIQUE,
+                {columns},
+                sheet_row INTEGER,
+                updated_at REAL NOT NULL,
+                synced_at REAL
+            )"""
+        )
+
+    def _write_columns(self, unique_id, columns, values):
+        _check_width(values, columns)
+        first, last = columns
+        names = RESPONSE_COLUMNS[first - 1:last]
+        assignments = ", ".join(f"{name} = ?" for name in names)
+        with self.lock:
+            cursor = self.conn.execute(
+                f"UPDATE responses SET {assignments}, updated_at = ? WHERE unique_id = ?",
+                [str(v) for v in values] + [time.time(), unique_id],
+            )
+        return cursor.rowcount > 0
+
+    def append_consent(self, timestamp, unique_id):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO responses (timestamp, unique_id, updated_at) VALUES (?, ?, ?)",
+                (timestamp, unique_id, time.time()),
+            )
+
+    def update_questionnaire(self, unique_id, values):
+        return self._write_columns(unique_id, QUESTIONNAIRE_COLUMNS, values)
+
+    def write_plan(self, unique_id, plan_text, total_time_used, leftover_time):
+        return self._write_columns(unique_id, PLAN_COLUMNS, [plan_text, total_time_used, leftover_time])
+
+    def write_feedback(self, unique_id, values):
+        return self._write_columns(unique_id, FEEDBACK_COLUMNS, values)
+
+    def read_row(self, unique_id):
+        with self.lock:
+            row = self.conn.execute(
+                f"SELECT {', '.join(RESPONSE_COLUMNS)} FROM responses WHERE unique_id = ?", (unique_id,)
+            ).fetchone()
+        return list(row) if row else None
+
+    def rows(self, first_id=1):
+        """(local id, row values) pairs from first_id onwards, for bulk export."""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, {', '.join(RESPONSE_COLUMNS)} FROM responses WHERE id >= ? ORDER BY id", (first_id,)
+            ).fetchall()
+        return [(row[0], list(row[1:])) for row in rows]
+
+    def pending_rows(self):
+        """Rows never pushed to the sheet, and rows changed since their last push."""
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT id, sheet_row, {', '.join(RESPONSE_COLUMNS)} FROM responses "
+                "WHERE synced_at IS NULL OR updated_at > synced_at ORDER BY id"
+            ).fetchall()
+
+    def mark_synced(self, sheet_rows, synced_at):
+        """sheet_rows maps local id -> sheet row number."""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE responses SET sheet_row = ?, synced_at = ? WHERE id = ?",
+                [(sheet_row, synced_at, local_id) for local_id, sheet_row in sheet_rows.items()],
+            )
+
+
+def sync_to_sheet(local_store, worksheet):
+    """Push pending SQLite rows to the sheet: one append_rows for new rows, one batch_update for edits."""
+    # Taken before reading so a write that lands during the sync stays newer than synced_at
+    started = time.time()
+    pending = local_store.pending_rows()
+    if not pending:
+        return {"appended": 0, "updated": 0}
+
+    new_rows = [row for row in pending if row[1] is None]
+    changed_rows = [row for row in pending if row[1] is not None]
+    sheet_rows = {}
+
+    if changed_rows:
+        worksheet.batch_update([
+            {"range": f"A{row[1]}:{column_letter(len(RESPONSE_COLUMNS))}{row[1]}", "values": [list(row[2:])]}
+            for row in changed_rows
+        ])
+        sheet_rows.update({row[0]: row[1] for row in changed_rows})
+
+    if new_rows:
+        response = worksheet.append_rows([list(row[2:]) for row in new_rows])
+        updated_range = response.get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        if not match:
+            raise RuntimeError(f"Could not read appended range from Sheets response: {updated_range!r}")
+        first_row = int(match.group(1))
+        sheet_rows.update({row[0]: first_row + offset for offset, row in enumerate(new_rows)})
+
+    local_store.mark_synced(sheet_rows, started)
+    return {"appended": len(new_rows), "updated": len(changed_rows)}
+
+
+def _store_config():
+    # Environment variables win so the app can run offline without a secrets file
+    backend = os.environ.get("RESPONSE_STORE")
+    path = os.environ.get("RESPONSE_DB_PATH")
+    if backend is None:
+        try:
+            config = st.secrets.get("storage", {})
+        except FileNotFoundError:
+            config = {}
+        backend = config.get("backend", "gsheets")
+        path = path or config.get("sqlite_path")
+    return backend, path or "responses.db"
+
+
+@st.cache_resource
+def get_response_store():
+    backend, path = _store_config()
+    if backend == "sqlite":
+        return TracedResponseStore(SQLiteResponseStore(path))
+    if backend == "gsheets":
+        return TracedResponseStore(GSheetResponseStore(get_worksheet()))
+    raise ValueError(f"Unknown storage backend: {backend!r} (expected 'gsheets' or 'sqlite')")
@@ -0,0 +1,209 @@
+# Lightweight timing spans for page runs, the planner and storage calls.
+#
+# Every span is folded into a per-name latency histogram shared by the process
+# (exposed by scripts/serve.py as Prometheus text at /metrics and JSON at
+# /metrics.json). Spans recorded during a page run are also collected into that
+# run's trace, which finish_request() prints as one JSON log line. Gauges and
+# counters (set_gauge, count) carry the few values that are not durations, such
+# as the planner pool's queue depth.
+#
+# Pages are flat scripts, so section() marks where the next numbered section
+# starts instead of wrapping it in a block. Set TELEMETRY=off to disable; spans
+# then cost a single flag check.
+
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+TELEMETRY_ENABLED = os.environ.get("TELEMETRY", "on").lower() not in ("0", "off", "false", "no")
+
+# Upper bounds in seconds, as in Prometheus' default histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_disabled = nullcontext()
+
+
+class SpanHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+
+class SpanRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.gauges = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = SpanHistogram()
+            histogram.observe(seconds)
+
+    def set_gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def count(self, name, amount):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def values(self):
+        with self.lock:
+            return dict(sorted(self.gauges.items())), dict(sorted(self.counters.items()))
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "sum_seconds": round(h.total, 6),
+                    "buckets": dict(zip([str(b) for b in BUCKETS] + ["+Inf"], h.counts)),
+                }
+                for name, h in sorted(self.histograms.items())
+            }
+
+
+@st.cache_resource
+def get_span_registry():
+    return SpanRegistry()
+
+
+class RequestTrace:
+    def __init__(self, page):
+        self.page = page
+        self.start = time.perf_counter()
+        self.spans = {}
+        self.section_name = None
+        self.section_start = None
+        self.finished = False
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+def record(name, seconds):
+    get_span_registry().observe(name, seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+def set_gauge(name, value):
+    if TELEMETRY_ENABLED:
+        get_span_registry().set_gauge(name, value)
+
+
+def count(name, amount=1):
+    if TELEMETRY_ENABLED:
+        get_span_registry().count(name, amount)
+
+
+def span(name):
+    """Context manager timing one block under name."""
+    if not TELEMETRY_ENABLED:
+        return _disabled
+    return _timed(name)
+
+
+@contextmanager
+def _timed(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def begin_request(page):
+    """Start the trace for one run of a page script."""
+    if not TELEMETRY_ENABLED:
+        return None
+    trace = RequestTrace(page)
+    _current_trace.set(trace)
+    return trace
+
+
+def _close_section(trace, now):
+    if trace.section_name is not None:
+        record(f"{trace.page}.{trace.section_name}", now - trace.section_start)
+        trace.section_name = None
+
+
+def section(name):
+    """Mark the start of a page section; the previous one ends here."""
+    trace = _current_trace.get() if TELEMETRY_ENABLED else None
+    if trace is None:
+        return
+    now = time.perf_counter()
+    _close_section(trace, now)
+    trace.section_name, trace.section_start = name, now
+
+
+def finish_request(**fields):
+    """Close the open section, record the whole run and print it as one JSON line.
+
+    Runs that end early (st.stop, st.switch_page) are not logged unless the
+    page calls this first.
+    """
+    trace = _current_trace.get() if TELEMETRY_ENABLED else None
+    if trace is None or trace.finished:
+        return
+    now = time.perf_counter()
+    _close_section(trace, now)
+    total = now - trace.start
+    get_span_registry().observe(f"{trace.page}.request", total)
+    trace.finished = True
+    _current_trace.set(None)
+
+    line = {
+        "event": "request",
+        "page": trace.page,
+        "total_ms": round(1000 * total, 2),
+        "spans_ms": {name: round(1000 * seconds, 2) for name, seconds in trace.spans.items()},
+    }
+    line.update(fields)
+    print(json.dumps(line, ensure_ascii=False, default=str))
+
+
+def metrics_json():
+    registry = get_span_registry()
+    gauges, counters = registry.values()
+    return {"spans": registry.snapshot(), "gauges": gauges, "counters": counters}
+
+
+def metrics_text():
+    """Span histograms, gauges and counters in the Prometheus text exposition format."""
+    metrics = metrics_json()
+    lines = [
+        "# HELP app_span_seconds Time spent in instrumented page sections, planner stages and storage calls.",
+        "# TYPE app_span_seconds histogram",
+    ]
+    for name, data in metrics["spans"].items():
+        cumulative = 0
+        for bound, count in data["buckets"].items():
+            cumulative += count
+            lines.append(f'app_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'app_span_seconds_sum{{span="{name}"}} {data["sum_seconds"]}')
+        lines.append(f'app_span_seconds_count{{span="{name}"}} {data["count"]}')
+    for name, value in metrics["gauges"].items():
+        lines += [f"# TYPE app_{name} gauge", f"app_{name} {value}"]
+    for name, value in metrics["counters"].items():
+        lines += [f"# TYPE app_{name}_total counter", f"app_{name}_total {value}"]
+    return "\n".join(lines) + "\n"
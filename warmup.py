@@ -0,0 +1,185 @@
+# Process warm-up: build everything the first visitor would otherwise wait for.
+#
+# start_warmup() runs the steps once per process in a background thread. The
+# readiness flag only turns true once every step has succeeded, so a load
+# balancer polling it (see scripts/serve.py) never routes to a cold worker.
+
+import threading
+import time
+import traceback
+
+import streamlit as st
+
+from constants import AGE_GROUPS, DURATIONS, PRIORITY_OPTIONS, WALKING_OPTIONS, BREAK_OPTIONS
+
+PREFERENCE_ZONES = ["thrill", "family", "water", "entertainment", "food", "shopping", "relaxation"]
+WAIT_CATEGORIES = ["<10 min", "10–20 min", "20–30 min", "30+ min"]
+
+
+def representative_profiles():
+    """One questionnaire answer set per favourite zone (each has its own weight controller), varying everything else."""
+    profiles = []
+    for i, top_zone in enumerate(PREFERENCE_ZONES):
+        order = [top_zone] + [zone for zone in PREFERENCE_ZONES if zone != top_zone]
+        profile = {zone: order.index(zone) + 1 for zone in PREFERENCE_ZONES}
+        profile.update({
+            "age": AGE_GROUPS[i % len(AGE_GROUPS)],
+            "duration": DURATIONS[i % len(DURATIONS)],
+            "accessibility": "No",
+            "priorities": PRIORITY_OPTIONS[i % len(PRIORITY_OPTIONS):][:3],
+            "wait_time": WAIT_CATEGORIES[i % len(WAIT_CATEGORIES)],
+            "walking": WALKING_OPTIONS[i % len(WALKING_OPTIONS)],
+            "break": BREAK_OPTIONS[i % len(BREAK_OPTIONS)],
+        })
+        profiles.append(profile)
+    return profiles
+
+
+class WarmupState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = False
+        self.ready = False
+        self.current = None
+        self.steps = {}
+        self.errors = {}
+        self.started_at = None
+        self.finished_at = None
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "started": self.started,
+                "current": self.current,
+                "steps": dict(self.steps),
+                "errors": dict(self.errors),
+                "seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else 0.0,
+            }
+
+
+@st.cache_resource
+def get_warmup_state():
+    return WarmupState()
+
+
+# Steps
+
+def _warm_fuzzy_models():
+    import planner
+
+    for zone in PREFERENCE_ZONES:
+        planner.weight_simulation(zone)
+
+
+def _warm_storage():
+    from storage import get_response_store
+
+    get_response_store()
+
+
+def _warm_documents():
+    from documents import load_consent_pdf, register_fonts
+
+    load_consent_pdf()
+    register_fonts()
+
+
+def _warm_images():
+    from assets import IMAGE_VARIANTS, load_image
+
+    for name in IMAGE_VARIANTS:
+        load_image(name)
+
+
+def _warm_plans():
+    # Planning every profile fills the fuzzy weight cache; building the chart
+    # spec loads the configured graph renderer
+    from planner import plan_tour
+    from energy_chart import ENERGY_CHART_ENGINE, downsample_energy, energy_chart_altair, energy_png
+
+    for profile in representative_profiles():
+        plan = plan_tour(profile)
+        time_timeline, energy_timeline = downsample_energy(
+            plan["time_timeline"], plan["energy_timeline"], plan["stop_label_points"]
+        )
+        if ENERGY_CHART_ENGINE == "altair":
+            energy_chart_altair(time_timeline, energy_timeline, plan["stop_label_points"]).to_dict()
+        else:
+            energy_png(time_timeline, energy_timeline, plan["stop_label_points"])
+
+
+def _warm_plan_table():
+    from plan_table import get_plan_table
+
+    get_plan_table()
+
+
+def _warm_plan_workers():
+    # Start the planner processes and the per-zone fallback plans
+    from plan_pool import PLANNER_WORKERS, default_plan, get_plan_pool
+
+    if PLANNER_WORKERS > 0:
+        get_plan_pool()
+        for zone in PREFERENCE_ZONES:
+            default_plan(zone)
+
+
+WARMUP_STEPS = [
+    ("fuzzy models", _warm_fuzzy_models),
+    ("storage", _warm_storage),
+    ("documents", _warm_documents),
+    ("images", _warm_images),
+    ("representative plans", _warm_plans),
+    ("plan table", _warm_plan_table),
+    ("plan workers", _warm_plan_workers),
+]
+
+
+def run_warmup(state=None):
+    """Run every warm-up step in order; returns the final status."""
+    state = state or get_warmup_state()
+    with state.lock:
+        state.started = True
+        state.started_at = time.time()
+
+    for name, step in WARMUP_STEPS:
+        with state.lock:
+            state.current = name
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            traceback.print_exc()
+            with state.lock:
+                state.errors[name] = f"{type(e).__name__}: {e}"
+            continue
+        with state.lock:
+            state.steps[name] = round(time.perf_counter() - start, 3)
+
+    with state.lock:
+        state.current = None
+        state.finished_at = time.time()
+        state.ready = not state.errors
+
+    status = state.snapshot()
+    timings = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in status["steps"].items())
+    print(f" Warm-up {'complete' if status['ready'] else 'FAILED'} in {status['seconds']:.2f}s ({timings})")
+    for name, error in status["errors"].items():
+        print(f" Warm-up step {name!r} failed: {error}")
+    return status
+
+
+def start_warmup():
+    """Start warm-up in a background thread, once per process."""
+    state = get_warmup_state()
+    with state.lock:
+        if state.started:
+            return state
+        state.started = True
+    threading.Thread(target=run_warmup, args=(state,), name="warmup", daemon=True).start()
+    return state
+
+
+def warmup_status():
+    return get_warmup_state().snapshot()